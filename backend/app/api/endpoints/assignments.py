@@ -7,13 +7,17 @@ from typing import List, Optional
 from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
 
 from app.core.config import settings
-from app.core.security import get_current_user, require_trainer_or_admin
+from app.core.security import (get_current_user, is_enrolled,
+                               require_trainer_or_admin)
 from app.db.session import db
 from app.models.assignment import (Assignment, AssignmentCreate,
                                    AssignmentSubmission, GradeSubmission,
                                    SubmissionCreate)
 from app.services.analytics import log_access
-from app.services.progress import check_and_issue_certificate
+from app.services.courses import course_repository
+from app.services.media import with_signed_file
+from app.services.progress import (check_and_issue_certificate,
+                                   get_course_totals, update_progress_counters)
 
 router = APIRouter()
 
@@ -24,6 +28,17 @@ router = APIRouter()
 UPLOAD_DIR = Path("uploads")
 
 
+async def _bump_graded_required(user_id: str, course_id: str, delta: int):
+    course = await course_repository.get_by_id(course_id)
+    if course:
+        await update_progress_counters(
+            user_id,
+            course_id,
+            {"$inc": {"graded_required_assignments": delta}},
+            await get_course_totals(course),
+        )
+
+
 @router.get("/courses/{course_id}/assignments")
 async def get_course_assignments(
     course_id: str, user: dict = Depends(get_current_user)
@@ -38,7 +53,7 @@ async def get_course_assignments(
         submission = await db.submissions.find_one(
             {"assignment_id": assignment["id"], "user_id": user["id"]}, {"_id": 0}
         )
-        assignment["submission"] = submission
+        assignment["submission"] = with_signed_file(submission)
 
     return assignments
 
@@ -48,7 +63,7 @@ async def create_assignment(
     data: AssignmentCreate, user: dict = Depends(require_trainer_or_admin)
 ):
     """Create a new assignment for a course"""
-    course = await db.courses.find_one({"id": data.course_id})
+    course = await course_repository.get_by_id(data.course_id)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
 
@@ -58,7 +73,7 @@ async def create_assignment(
             status_code=403, detail="You can only add assignments to your own courses"
         )
 
-    now = datetime.now(timezone.utc).isoformat()
+    now = datetime.now(timezone.utc)
     assignment_doc = {
         "id": str(uuid.uuid4()),
         **data.model_dump(),
@@ -104,7 +119,7 @@ async def submit_assignment(
         raise HTTPException(status_code=404, detail="Assignment not found")
 
     # Check if user is enrolled in the course
-    if assignment["course_id"] not in user.get("enrolled_courses", []):
+    if not await is_enrolled(user, assignment["course_id"]):
         raise HTTPException(status_code=403, detail="Not enrolled in this course")
 
     # Check for existing submission — allow resubmission
@@ -125,7 +140,7 @@ async def submit_assignment(
 
     file_url = f"/uploads/assignments/{unique_name}"
 
-    now = datetime.now(timezone.utc).isoformat()
+    now = datetime.now(timezone.utc)
 
     if existing:
         # Resubmission: update existing record, reset grade
@@ -145,8 +160,12 @@ async def submit_assignment(
                 }
             },
         )
+        # A graded required assignment no longer counts once resubmitted
+        if existing.get("grade") is not None and assignment.get("is_required", True):
+            await _bump_graded_required(user["id"], assignment["course_id"], -1)
+
         updated = await db.submissions.find_one({"id": existing["id"]}, {"_id": 0})
-        return updated
+        return with_signed_file(updated)
     else:
         # First submission
         submission_doc = {
@@ -167,7 +186,7 @@ async def submit_assignment(
         if "_id" in submission_doc:
             del submission_doc["_id"]
 
-        return submission_doc
+        return with_signed_file(submission_doc)
 
 
 @router.get("/assignments/{assignment_id}/submissions")
@@ -197,6 +216,7 @@ async def get_assignment_submissions(
         if sub_user:
             sub["user_name"] = f"{sub_user['first_name']} {sub_user['last_name']}"
             sub["user_email"] = sub_user["email"]
+        with_signed_file(sub)
 
     return submissions
 
@@ -228,25 +248,30 @@ async def grade_submission(
             detail=f"Grade must be between 0 and {assignment.get('max_score', 100)}",
         )
 
-    now = datetime.now(timezone.utc).isoformat()
-    await db.submissions.update_one(
-        {"id": submission_id},
-        {
-            "$set": {
-                "grade": data.grade,
-                "feedback": data.feedback,
-                "graded_at": now,
-                "graded_by": user["id"],
-            }
-        },
-    )
+    now = datetime.now(timezone.utc)
+    grade = {
+        "$set": {
+            "grade": data.grade,
+            "feedback": data.feedback,
+            "graded_at": now,
+            "graded_by": user["id"],
+        }
+    }
+    # Conditional, so of two concurrent first grades only one counts
+    first = await db.submissions.update_one({"id": submission_id, "grade": None}, grade)
+    if not first.matched_count:
+        await db.submissions.update_one({"id": submission_id}, grade)
 
-    # Check if student now qualifies for certificate
+    # First grade on a required assignment counts towards progress
     student_id = submission["user_id"]
     course_id = assignment["course_id"]
+    if assignment.get("is_required", True) and first.matched_count:
+        await _bump_graded_required(student_id, course_id, 1)
+
+    # Check if student now qualifies for certificate
     certificate = await check_and_issue_certificate(student_id, course_id)
 
     updated = await db.submissions.find_one({"id": submission_id}, {"_id": 0})
     updated["certificate_issued"] = certificate is not None
 
-    return updated
+    return with_signed_file(updated)
@@ -4,7 +4,9 @@ from datetime import datetime, timedelta, timezone
 from fastapi import APIRouter, Depends, HTTPException, status
 
 from app.core.security import (create_token, get_current_user, hash_password,
+                               invalidate_user, load_memberships,
                                verify_password)
+from app.core.timestamps import as_utc
 from app.db.session import db
 from app.models.user import UserCreate, UserLogin
 
@@ -18,8 +20,8 @@ async def register(user_in: UserCreate):
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_pw = hash_password(user_in.password)
-    now = datetime.now(timezone.utc).isoformat()
+    hashed_pw = await hash_password(user_in.password)
+    now = datetime.now(timezone.utc)
 
     user_doc = {
         "id": str(uuid.uuid4()),
@@ -54,7 +56,9 @@ async def register(user_in: UserCreate):
 @router.post("/login")
 async def login(login_data: UserLogin):
     user = await db.users.find_one({"email": login_data.email})
-    if not user or not verify_password(login_data.password, user["password_hash"]):
+    if not user or not await verify_password(
+        login_data.password, user["password_hash"]
+    ):
         raise HTTPException(status_code=401, detail="Incorrect email or password")
 
     jwt_token = create_token(user["id"], user["role"])
@@ -76,12 +80,9 @@ async def login(login_data: UserLogin):
 
 @router.get("/me")
 async def get_me(user: dict = Depends(get_current_user)):
-    user_data = await db.users.find_one(
-        {"id": user["id"]}, {"_id": 0, "password_hash": 0}
-    )
-    if not user_data:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user_data
+    # The principal may come from this worker's cache; memberships may not
+    user = {k: v for k, v in user.items() if k != "password_hash"}
+    return {**user, **await load_memberships(user["id"])}
 
 
 @router.post("/refresh")
@@ -113,7 +114,7 @@ async def forgot_password(data: dict):
         {
             "$set": {
                 "reset_token": reset_token,
-                "reset_token_expires": expires.isoformat(),
+                "reset_token_expires": expires,
             }
         },
     )
@@ -146,11 +147,11 @@ async def reset_password(data: dict):
         raise HTTPException(status_code=400, detail="Invalid or expired reset token")
 
     # Check expiry
-    expires = user.get("reset_token_expires", "")
-    if expires and datetime.fromisoformat(expires) < datetime.now(timezone.utc):
+    expires = as_utc(user.get("reset_token_expires"))
+    if expires and expires < datetime.now(timezone.utc):
         raise HTTPException(status_code=400, detail="Reset token has expired")
 
-    hashed_pw = hash_password(new_password)
+    hashed_pw = await hash_password(new_password)
     await db.users.update_one(
         {"id": user["id"]},
         {
@@ -158,5 +159,6 @@ async def reset_password(data: dict):
             "$unset": {"reset_token": "", "reset_token_expires": ""},
         },
     )
+    invalidate_user(user["id"])
 
     return {"message": "Password reset successful"}
@@ -4,14 +4,20 @@ from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException
 
+from app.core.pagination import KEYSET_SORT, find_page
 from app.core.security import (get_current_user, get_optional_user,
-                               require_admin)
+                               invalidate_user, is_enrolled, require_admin)
 from app.db.session import db
 from app.models.course import Course, CourseCreate, CourseUpdate
 from app.models.progress import CourseProgress, MarkModuleCompleteRequest
 from app.services.analytics import log_access
-from app.services.progress import (calculate_course_progress,
-                                   check_and_issue_certificate)
+from app.services.courses import (course_list_projection, course_repository,
+                                  get_course_module, get_course_outline)
+from app.services.images import attach_derivatives
+from app.services.progress import (check_and_issue_certificate,
+                                   complete_module, get_course_totals)
+from app.services.search import (SCORE_PROJECTION, SCORE_SORT, add_highlights,
+                                 text_query)
 
 router = APIRouter()
 
@@ -24,6 +30,10 @@ async def get_courses(
     level: Optional[str] = None,
     page: int = 1,
     limit: int = 12,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    view: str = "summary",
+    fields: Optional[str] = None,
     user: dict = Depends(get_optional_user),
 ):
     query = {}
@@ -34,28 +44,59 @@ async def get_courses(
     if level:
         query["level"] = level
     if search:
-        query["$or"] = [
-            {"title": {"$regex": search, "$options": "i"}},
-            {"description": {"$regex": search, "$options": "i"}},
-        ]
-
-    total = await db.courses.count_documents(query)
-    skip = (page - 1) * limit
-    courses = (
-        await db.courses.find(query, {"_id": 0}).skip(skip).limit(limit).to_list(limit)
+        query.update(text_query(search))
+
+    projection = course_list_projection(view, fields)
+    if search:
+        projection.update(SCORE_PROJECTION)
+    response = await find_page(
+        db.courses,
+        query,
+        projection,
+        sort=SCORE_SORT if search else KEYSET_SORT,
+        page=page,
+        limit=limit,
+        cursor=cursor,
+        include_total=include_total,
+    )
+    if search:
+        add_highlights(response["items"], search)
+    await attach_derivatives(
+        response["items"], "thumbnail_url", "thumbnail_derivatives"
     )
 
     if user:
         await log_access(user["id"], "course", "list", "view")
 
-    from app.core.responses import paginated_response
+    return response
+
+
+@router.get("/{course_id}/outline")
+async def get_course_outline_by_id(
+    course_id: str, user: dict = Depends(get_optional_user)
+):
+    """Course page data with module summaries only; load modules separately"""
+    course = await get_course_outline({"id": course_id})
+    if not course:
+        raise HTTPException(status_code=404, detail="Course not found")
+
+    if user:
+        await log_access(user["id"], "course", course_id, "view")
+
+    return course
+
 
-    return paginated_response(courses, total, page, limit)
+@router.get("/{course_id}/modules/{module_id}")
+async def get_course_module_detail(course_id: str, module_id: str):
+    module = await get_course_module(course_id, module_id)
+    if not module:
+        raise HTTPException(status_code=404, detail="Module not found")
+    return module
 
 
 @router.get("/{course_id}")
 async def get_course(course_id: str, user: dict = Depends(get_optional_user)):
-    course = await db.courses.find_one({"id": course_id}, {"_id": 0})
+    course = await course_repository.get_by_id(course_id)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
 
@@ -69,10 +110,11 @@ async def get_course(course_id: str, user: dict = Depends(get_optional_user)):
 async def create_course(course_in: CourseCreate, user: dict = Depends(require_admin)):
     course_doc = course_in.model_dump()
     course_doc["id"] = str(uuid.uuid4())
-    course_doc["created_at"] = datetime.now(timezone.utc).isoformat()
-    course_doc["updated_at"] = datetime.now(timezone.utc).isoformat()
+    course_doc["created_at"] = datetime.now(timezone.utc)
+    course_doc["updated_at"] = datetime.now(timezone.utc)
     course_doc["created_by"] = user["id"]
     course_doc["enrolled_count"] = 0
+    course_doc["version"] = 1
 
     await db.courses.insert_one(course_doc)
     return course_doc
@@ -80,26 +122,32 @@ async def create_course(course_in: CourseCreate, user: dict = Depends(require_ad
 
 @router.post("/{course_id}/enroll")
 async def enroll_course(course_id: str, user: dict = Depends(get_current_user)):
-    course = await db.courses.find_one({"id": course_id})
+    course = await course_repository.get_by_id(course_id)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
 
     # Check if already enrolled
-    if course_id in user.get("enrolled_courses", []):
+    if await is_enrolled(user, course_id):
         return {"message": "Already enrolled"}
 
-    # Add to user enrolled_courses
-    await db.users.update_one(
+    # Add to user enrolled_courses; a concurrent request may have won
+    enrolled = await db.users.update_one(
         {"id": user["id"]}, {"$addToSet": {"enrolled_courses": course_id}}
     )
+    if not enrolled.modified_count:
+        return {"message": "Already enrolled"}
+    invalidate_user(user["id"])
 
     # Initialize progress
-    now = datetime.now(timezone.utc).isoformat()
+    now = datetime.now(timezone.utc)
     progress_doc = {
         "id": str(uuid.uuid4()),
         "user_id": user["id"],
         "course_id": course_id,
-        "modules_progress": [],
+        "modules_progress": {},
+        "completed_modules": 0,
+        "quiz_passed": False,
+        "graded_required_assignments": 0,
         "overall_progress": 0,
         "started_at": now,
         "last_accessed": now,
@@ -108,7 +156,10 @@ async def enroll_course(course_id: str, user: dict = Depends(get_current_user)):
     await db.course_progress.insert_one(progress_doc)
 
     # Increment course enrolled count
-    await db.courses.update_one({"id": course_id}, {"$inc": {"enrolled_count": 1}})
+    await db.courses.update_one(
+        {"id": course_id}, {"$inc": {"enrolled_count": 1, "version": 1}}
+    )
+    course_repository.invalidate(course_id)
 
     await log_access(user["id"], "course", course_id, "enroll")
     return {"message": "Successfully enrolled"}
@@ -121,52 +172,32 @@ async def update_progress(
     user: dict = Depends(get_current_user),
 ):
     # Verify enrollment
-    if course_id not in user.get("enrolled_courses", []):
+    if not await is_enrolled(user, course_id):
         raise HTTPException(status_code=403, detail="Not enrolled in this course")
 
-    now = datetime.now(timezone.utc).isoformat()
-
-    # Update module progress
-    await db.course_progress.update_one(
-        {"user_id": user["id"], "course_id": course_id},
-        {
-            "$pull": {"modules_progress": {"module_id": progress_data.module_id}},
-            "$set": {"last_accessed": now},
-        },
-    )
-
-    await db.course_progress.update_one(
-        {"user_id": user["id"], "course_id": course_id},
-        {
-            "$push": {
-                "modules_progress": {
-                    "module_id": progress_data.module_id,
-                    "completed": True,
-                    "completed_at": now,
-                    "time_spent_minutes": progress_data.time_spent_minutes,
-                }
-            }
-        },
-    )
-
-    # Recalculate overall progress
-    stats = await calculate_course_progress(user["id"], course_id)
-
-    await db.course_progress.update_one(
-        {"user_id": user["id"], "course_id": course_id},
-        {
-            "$set": {
-                "overall_progress": stats["progress"],
-                "completed": stats["completed"],
-            }
-        },
+    course = await course_repository.get_by_id(course_id)
+    if not course:
+        raise HTTPException(status_code=404, detail="Course not found")
+    if not any(m["id"] == progress_data.module_id for m in course.get("modules", [])):
+        raise HTTPException(status_code=404, detail="Module not found")
+
+    counters = await complete_module(
+        user["id"],
+        course_id,
+        progress_data.module_id,
+        progress_data.time_spent_minutes,
+        await get_course_totals(course),
     )
+    if counters is None:
+        raise HTTPException(status_code=404, detail="Progress not found")
 
     # Check for certificate
-    cert_status = await check_and_issue_certificate(user["id"], course_id)
+    cert_status = None
+    if counters["completed"]:
+        cert_status = await check_and_issue_certificate(user["id"], course_id)
 
     return {
-        "progress": stats["progress"],
-        "completed": stats["completed"],
+        "progress": counters["overall_progress"],
+        "completed": counters["completed"],
         "certificate": cert_status,
     }
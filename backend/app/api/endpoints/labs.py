@@ -4,11 +4,14 @@ from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException
 
+from app.core.pagination import KEYSET_SORT, find_page
 from app.core.security import (get_current_user, get_optional_user,
                                require_admin)
 from app.db.session import db
 from app.models.course import Lab, LabCreate
 from app.services.analytics import log_access
+from app.services.search import (SCORE_PROJECTION, SCORE_SORT, add_highlights,
+                                 text_query)
 
 router = APIRouter()
 
@@ -20,6 +23,8 @@ async def get_labs(
     published_only: bool = True,
     page: int = 1,
     limit: int = 12,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
     user: dict = Depends(get_optional_user),
 ):
     query = {}
@@ -28,21 +33,25 @@ async def get_labs(
     if difficulty:
         query["difficulty"] = difficulty
     if search:
-        query["$or"] = [
-            {"title": {"$regex": search, "$options": "i"}},
-            {"description": {"$regex": search, "$options": "i"}},
-        ]
+        query.update(text_query(search))
 
-    total = await db.labs.count_documents(query)
-    skip = (page - 1) * limit
-    labs = await db.labs.find(query, {"_id": 0}).skip(skip).limit(limit).to_list(limit)
+    response = await find_page(
+        db.labs,
+        query,
+        {"_id": 0, **(SCORE_PROJECTION if search else {})},
+        sort=SCORE_SORT if search else KEYSET_SORT,
+        page=page,
+        limit=limit,
+        cursor=cursor,
+        include_total=include_total,
+    )
+    if search:
+        add_highlights(response["items"], search)
 
     if user:
         await log_access(user["id"], "lab", "list", "view")
 
-    from app.core.responses import paginated_response
-
-    return paginated_response(labs, total, page, limit)
+    return response
 
 
 @router.get("/labs/{slug}")
@@ -33,7 +33,7 @@ async def create_learning_path(
 
     path_data["id"] = str(uuid.uuid4())
     path_data["user_id"] = user["id"]
-    path_data["created_at"] = datetime.now(timezone.utc).isoformat()
+    path_data["created_at"] = datetime.now(timezone.utc)
     if "generated_by" not in path_data:
         path_data["generated_by"] = "gemini"
 
@@ -1,12 +1,18 @@
 import logging
 from pathlib import Path
-from typing import List
+from typing import Optional
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
 
-from app.core.config import settings
-from app.core.security import get_current_user, require_trainer_or_admin
-from app.services.storage import StorageService
+from app.core.security import require_admin, require_trainer_or_admin
+from app.models.upload import UploadIntentCreate, UploadSessionCreate
+from app.services import upload_sessions
+from app.services.images import image_derivatives
+from app.services.ingest import UPLOAD_RULES, ingest_upload
+from app.services.storage import StorageService, load_progress
+from app.services.transcode import get_transcode, video_transcoder
+from app.services.upload_gc import collect_orphans, last_report
+from app.services.upload_intents import complete_intent, create_intent
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -18,101 +24,208 @@ logger = logging.getLogger(__name__)
 UPLOAD_DIR = Path("uploads")
 storage_service = StorageService(upload_dir=UPLOAD_DIR)
 
-ALLOWED_IMAGE_TYPES = ["image/jpeg", "image/png", "image/webp", "image/gif"]
-ALLOWED_VIDEO_TYPES = ["video/mp4", "video/webm", "video/quicktime"]
-ALLOWED_DOC_TYPES = [
-    "application/pdf",
-    "application/vnd.openxmlformats-officedocument.presentationml.presentation",
-    "application/vnd.ms-powerpoint",
-    "application/msword",
-    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-]
 
+async def _with_transcode(result: dict) -> dict:
+    transcode = await video_transcoder.enqueue(
+        storage_service, result["url"], result["type"]
+    )
+    if transcode is not None:
+        result = {**result, "transcode": transcode}
+    return result
 
-@router.post("/upload/image")
-async def upload_image(
-    file: UploadFile = File(...), user: dict = Depends(require_trainer_or_admin)
-):
-    """Upload an image file for course/workshop banners"""
-    if file.content_type not in ALLOWED_IMAGE_TYPES:
-        raise HTTPException(
-            status_code=400, detail=f"Invalid file type. Allowed: JPEG, PNG, WebP, GIF"
-        )
 
-    # Check file size defined in settings? Or use raw value.
-    # settings.MAX_VIDEO_SIZE exists but not MAX_IMAGE_SIZE in extract.
-    # Let's use 10MB
-    MAX_IMAGE_SIZE = 10 * 1024 * 1024
+def _upload_key(user: dict, upload_id: Optional[str]) -> Optional[str]:
+    # Progress is looked up per user, so ids chosen by clients never collide
+    return f"{user['id']}:{upload_id}" if upload_id else None
+
 
-    file.file.seek(0, 2)
-    size = file.file.tell()
-    file.file.seek(0)
+@router.get("/upload/progress/{upload_id}")
+async def get_upload_progress(
+    upload_id: str, user: dict = Depends(require_trainer_or_admin)
+):
+    """Progress of an upload started with an X-Upload-Id header"""
+    progress = await load_progress(_upload_key(user, upload_id))
+    if not progress:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return {**progress, "upload_id": upload_id}
 
-    if size > MAX_IMAGE_SIZE:
-        raise HTTPException(status_code=400, detail=f"File too large. Max size: 10MB")
 
+async def _ingest(request: Request, kind: str, user: dict, upload_id: Optional[str]):
+    # Allowed types and size limits per kind live in UPLOAD_RULES
     try:
-        result = await storage_service.upload_file(file, "images")
-        logger.info(f"Image uploaded: {result['url']} by user {user['id']}")
-        return result
+        result = await ingest_upload(
+            request, storage_service, UPLOAD_RULES[kind], _upload_key(user, upload_id)
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Upload failed: {str(e)}")
         raise HTTPException(status_code=500, detail="File upload failed")
+    logger.info(f"{kind.title()} uploaded: {result['url']} by user {user['id']}")
+    return result
+
+
+@router.post("/upload/image")
+async def upload_image(
+    request: Request,
+    upload_id: Optional[str] = Header(None, alias="X-Upload-Id"),
+    user: dict = Depends(require_trainer_or_admin),
+):
+    """
+    Upload an image file for course/workshop banners. Resized renditions are
+    rendered in the background; `derivatives` lists them once they exist.
+    """
+    result = await _ingest(request, "image", user, upload_id)
+    result["derivatives"] = await image_derivatives.enqueue(
+        storage_service, result["url"]
+    )
+    return result
 
 
 @router.post("/upload/video")
 async def upload_video(
-    file: UploadFile = File(...), user: dict = Depends(require_trainer_or_admin)
+    request: Request,
+    upload_id: Optional[str] = Header(None, alias="X-Upload-Id"),
+    user: dict = Depends(require_trainer_or_admin),
 ):
-    """Upload a video file for course modules"""
-    if file.content_type not in ALLOWED_VIDEO_TYPES:
-        raise HTTPException(
-            status_code=400, detail=f"Invalid file type. Allowed: {ALLOWED_VIDEO_TYPES}"
-        )
-
-    file.file.seek(0, 2)
-    size = file.file.tell()
-    file.file.seek(0)
+    """
+    Upload a video file for course modules. HLS renditions are transcoded in
+    the background; `transcode` carries the job status.
+    """
+    return await _with_transcode(await _ingest(request, "video", user, upload_id))
 
-    if size > settings.MAX_VIDEO_SIZE:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File too large. Max size: {settings.MAX_VIDEO_SIZE // (1024*1024)}MB",
-        )
 
-    try:
-        result = await storage_service.upload_file(file, "videos")
-        logger.info(f"Video uploaded: {result['url']} by user {user['id']}")
-        return result
-    except Exception as e:
-        logger.error(f"Upload failed: {str(e)}")
-        raise HTTPException(status_code=500, detail="File upload failed")
+@router.get("/upload/video/transcode")
+async def get_video_transcode(
+    url: str = Query(...), user: dict = Depends(require_trainer_or_admin)
+):
+    """Status of a video's HLS transcode, with the manifest URL once done"""
+    job = await get_transcode(url)
+    if job is None:
+        raise HTTPException(status_code=404, detail="No transcode for this video")
+    return job
 
 
 @router.post("/upload/document")
 async def upload_document(
-    file: UploadFile = File(...), user: dict = Depends(require_trainer_or_admin)
+    request: Request,
+    upload_id: Optional[str] = Header(None, alias="X-Upload-Id"),
+    user: dict = Depends(require_trainer_or_admin),
 ):
     """Upload a document file for course materials"""
-    if file.content_type not in ALLOWED_DOC_TYPES:
-        raise HTTPException(
-            status_code=400, detail=f"Invalid file type. Allowed: PDF, PPTX, DOCX"
-        )
+    return await _ingest(request, "document", user, upload_id)
 
-    file.file.seek(0, 2)
-    size = file.file.tell()
-    file.file.seek(0)
 
-    if size > settings.MAX_DOC_SIZE:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File too large. Max size: {settings.MAX_DOC_SIZE // (1024*1024)}MB",
-        )
+# ─── Resumable uploads ────────────────────────────────────────
 
-    try:
-        result = await storage_service.upload_file(file, "documents")
-        logger.info(f"Document uploaded: {result['url']} by user {user['id']}")
-        return result
-    except Exception as e:
-        logger.error(f"Upload failed: {str(e)}")
-        raise HTTPException(status_code=500, detail="File upload failed")
+
+@router.post("/upload/sessions")
+async def create_upload_session(
+    data: UploadSessionCreate, user: dict = Depends(require_trainer_or_admin)
+):
+    """Start a resumable upload; the file is then PUT in chunk_size pieces"""
+    return await upload_sessions.create_session(
+        storage_service,
+        user,
+        data.kind,
+        data.filename,
+        data.content_type,
+        data.size,
+        data.sha256,
+    )
+
+
+@router.get("/upload/sessions/{session_id}")
+async def get_upload_session(
+    session_id: str, user: dict = Depends(require_trainer_or_admin)
+):
+    """Current offset of a resumable upload, to resume after a dropped chunk"""
+    return upload_sessions.session_status(
+        await upload_sessions.get_session(session_id, user)
+    )
+
+
+@router.put("/upload/sessions/{session_id}")
+async def put_upload_chunk(
+    session_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    user: dict = Depends(require_trainer_or_admin),
+):
+    """Store the chunk starting at `offset` (raw bytes in the request body)"""
+    session = await upload_sessions.get_session(session_id, user)
+    return await upload_sessions.write_chunk(
+        storage_service, session, offset, request.stream()
+    )
+
+
+@router.post("/upload/sessions/{session_id}/complete")
+async def complete_upload_session(
+    session_id: str, user: dict = Depends(require_trainer_or_admin)
+):
+    """Assemble the chunks; returns the same result as a single-request upload"""
+    session = await upload_sessions.get_session(session_id, user)
+    result = await upload_sessions.complete_session(storage_service, session)
+    logger.info(f"Chunked upload completed: {result['url']} by user {user['id']}")
+    return await _with_transcode(result)
+
+
+@router.delete("/upload/sessions/{session_id}")
+async def abort_upload_session(
+    session_id: str, user: dict = Depends(require_trainer_or_admin)
+):
+    """Abandon a resumable upload and discard its chunks"""
+    await upload_sessions.abort_session(
+        storage_service, await upload_sessions.get_session(session_id, user)
+    )
+    return {"message": "Upload aborted"}
+
+
+# ─── Direct-to-storage uploads ────────────────────────────────
+
+
+@router.post("/upload/intents")
+async def create_upload_intent(
+    data: UploadIntentCreate, user: dict = Depends(require_trainer_or_admin)
+):
+    """
+    Presigned POST and PUT targets to upload straight to the bucket, then
+    call complete. Without S3 the intent points at the regular upload route.
+    """
+    return await create_intent(
+        storage_service,
+        user,
+        data.kind,
+        data.filename,
+        data.content_type,
+        data.size,
+        data.sha256,
+    )
+
+
+@router.post("/upload/intents/{intent_id}/complete")
+async def complete_upload_intent(
+    intent_id: str, user: dict = Depends(require_trainer_or_admin)
+):
+    """Verify and register a direct upload; same result as a regular upload"""
+    result = await complete_intent(storage_service, user, intent_id)
+    logger.info(f"Direct upload completed: {result['url']} by user {user['id']}")
+    derivatives = await image_derivatives.enqueue(storage_service, result["url"])
+    if derivatives is not None:
+        result = {**result, "derivatives": derivatives}
+    return await _with_transcode(result)
+
+
+# ─── Orphaned uploads ─────────────────────────────────────────
+
+
+@router.get("/admin/uploads/orphans")
+async def get_orphaned_uploads(
+    grace_hours: Optional[float] = Query(None, ge=0),
+    admin: dict = Depends(require_admin),
+):
+    """Dry run of the orphaned-upload collector, with its last recorded run"""
+    return {
+        "report": await collect_orphans(storage_service, grace_hours, dry_run=True),
+        "last_run": await last_report(),
+    }
@@ -3,7 +3,7 @@ from datetime import datetime, timezone
 from fastapi import APIRouter, Depends, HTTPException
 
 from app.core.security import (  # We need to create security.py
-    get_current_user, get_password_hash)
+    get_current_user, get_password_hash, invalidate_user)
 from app.db.session import db
 from app.models.user import UserProfile, UserProfileUpdate
 
@@ -23,9 +23,10 @@ async def update_user_me(
     if not update_data:
         return current_user
 
-    update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
+    update_data["updated_at"] = datetime.now(timezone.utc)
 
     await db.users.update_one({"id": current_user["id"]}, {"$set": update_data})
+    invalidate_user(current_user["id"])
 
     updated_user = await db.users.find_one({"id": current_user["id"]})
     return updated_user
@@ -1,14 +1,18 @@
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException
 
+from app.core.pagination import KEYSET_SORT, find_page
 from app.core.security import (get_current_user, get_optional_user,
                                require_admin)
 from app.db.session import db
 from app.models.course import Workshop, WorkshopCreate
 from app.services.analytics import log_access
+from app.services.images import attach_derivatives
+from app.services.search import (SCORE_PROJECTION, SCORE_SORT, add_highlights,
+                                 text_query)
 
 router = APIRouter()
 
@@ -19,32 +23,34 @@ async def get_workshops(
     search: Optional[str] = None,
     page: int = 1,
     limit: int = 12,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
     user: dict = Depends(get_optional_user),
 ):
     query = {}
     if active_only:
         query["is_active"] = True
     if search:
-        query["$or"] = [
-            {"title": {"$regex": search, "$options": "i"}},
-            {"description": {"$regex": search, "$options": "i"}},
-        ]
-
-    total = await db.workshops.count_documents(query)
-    skip = (page - 1) * limit
-    workshops = (
-        await db.workshops.find(query, {"_id": 0})
-        .skip(skip)
-        .limit(limit)
-        .to_list(limit)
+        query.update(text_query(search))
+
+    response = await find_page(
+        db.workshops,
+        query,
+        {"_id": 0, **(SCORE_PROJECTION if search else {})},
+        sort=SCORE_SORT if search else KEYSET_SORT,
+        page=page,
+        limit=limit,
+        cursor=cursor,
+        include_total=include_total,
     )
+    if search:
+        add_highlights(response["items"], search)
+    await attach_derivatives(response["items"], "image_url", "image_derivatives")
 
     if user:
         await log_access(user["id"], "workshop", "list", "view")
 
-    from app.core.responses import paginated_response
-
-    return paginated_response(workshops, total, page, limit)
+    return response
 
 
 @router.post("/")
@@ -54,7 +60,7 @@ async def create_workshop(
     workshop_doc = workshop_in.model_dump()
     workshop_doc["id"] = str(uuid.uuid4())
     workshop_doc["registered_count"] = 0
-    workshop_doc["created_at"] = datetime.utcnow().isoformat()
+    workshop_doc["created_at"] = datetime.now(timezone.utc)
 
     await db.workshops.insert_one(workshop_doc)
     return workshop_doc
@@ -40,13 +40,99 @@ class Settings(BaseSettings):
     SENTRY_DSN: str = ""
     GUNICORN_WORKERS: int = 2
 
+    # Password hashing (bcrypt process pool, per worker)
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_DEPTH: int = 64
+
+    # Authenticated-user cache (per worker; TTL bounds cross-worker staleness)
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: int = 60
+
+    # Access-log pipeline (buffered, batched writes)
+    ACCESS_LOG_QUEUE_SIZE: int = 10000
+    ACCESS_LOG_BATCH_SIZE: int = 500
+    ACCESS_LOG_FLUSH_SECONDS: float = 2.0
+    ACCESS_LOG_HOURLY_ROLLUP_DAYS: int = 90
+
+    # Access-log retention: closed days are exported to Parquet under
+    # ARCHIVE_DIR, and raw events of exported days are deleted after
+    # RETENTION_DAYS (interval 0 disables the archiver, and with it deletion)
+    ACCESS_LOG_RETENTION_DAYS: int = 30
+    ACCESS_LOG_ARCHIVE_DIR: str = "archive/access_logs"
+    ACCESS_LOG_ARCHIVE_BATCH_SIZE: int = 50000
+    ACCESS_LOG_ARCHIVE_INTERVAL_SECONDS: int = 3600
+
+    # Course progress counter reconciliation, run by one worker per interval
+    # (0 disables)
+    PROGRESS_RECONCILE_SECONDS: int = 900
+
+    # Course document cache (per worker; every hit is checked against version)
+    COURSE_CACHE_SIZE: int = 500
+    COURSE_CACHE_TTL_SECONDS: int = 600
+
+    # Admin dashboard stats snapshot refresh interval
+    ADMIN_STATS_REFRESH_SECONDS: int = 60
+
+    # How long list endpoint totals (count_documents) are reused
+    LIST_COUNT_CACHE_SECONDS: int = 30
+
     # AWS S3 (future asset management)
     AWS_ACCESS_KEY_ID: str = ""
     AWS_SECRET_ACCESS_KEY: str = ""
     AWS_S3_BUCKET: str = ""
     AWS_REGION: str = "ap-south-1"
 
+    # Upload transfers (per worker). STORAGE_UPLOAD_WORKERS uploads run at
+    # once in a thread pool, the rest queue; S3_MAX_CONCURRENCY is the number
+    # of multipart parts in flight per upload. Progress of uploads started
+    # with an X-Upload-Id is kept in MongoDB for STORAGE_PROGRESS_TTL_SECONDS.
+    STORAGE_UPLOAD_WORKERS: int = 4
+    STORAGE_PROGRESS_TTL_SECONDS: int = 3600
+    S3_MULTIPART_THRESHOLD_MB: int = 16
+    S3_MULTIPART_CHUNK_MB: int = 16
+    S3_MAX_CONCURRENCY: int = 4
+
+    # Resumable (chunked) uploads; chunks double as S3 parts, so at least 5 MB
+    UPLOAD_CHUNK_SIZE_MB: int = 8
+    UPLOAD_SESSION_TTL_HOURS: int = 24
+
+    # Presigned direct-to-S3 uploads: how long the upload URLs stay valid
+    UPLOAD_PRESIGN_EXPIRES_SECONDS: int = 900
+
+    # Image derivatives: resized renditions of uploaded images, rendered in a
+    # process pool of IMAGE_WORKERS per worker; widths are never upscaled
+    IMAGE_DERIVATIVE_WIDTHS: List[int] = [320, 640, 1280]
+    IMAGE_DERIVATIVE_FORMATS: List[str] = ["webp", "avif"]
+    IMAGE_WORKERS: int = 2
+    IMAGE_QUEUE_SIZE: int = 100
+
+    # Video transcoding: uploaded videos get HLS renditions (one per height,
+    # never above the source) from ffmpeg; VIDEO_TRANSCODE_WORKERS jobs are
+    # taken per worker, and VIDEO_TRANSCODE_SLOTS ffmpeg runs happen at once
+    # across all workers
+    VIDEO_HLS_HEIGHTS: List[int] = [360, 720, 1080]
+    VIDEO_HLS_SEGMENT_SECONDS: int = 6
+    VIDEO_TRANSCODE_WORKERS: int = 1
+    VIDEO_TRANSCODE_SLOTS: int = 1
+    VIDEO_TRANSCODE_QUEUE_SIZE: int = 20
+    VIDEO_TRANSCODE_TIMEOUT_SECONDS: int = 3600
+    FFMPEG_PATH: str = "ffmpeg"
+    FFPROBE_PATH: str = "ffprobe"
+
+    # Orphaned-upload collector: files no document references are deleted
+    # once older than the grace period (interval 0 disables it; dry run only
+    # logs and records the report)
+    UPLOAD_GC_INTERVAL_SECONDS: int = 86400
+    UPLOAD_GC_GRACE_HOURS: int = 48
+    UPLOAD_GC_DRY_RUN: bool = False
+
+    # Serving /uploads. Behind frontend/nginx.conf set the accel prefix to
+    # "/_media/" so nginx sends the file bytes instead of the worker.
+    MEDIA_ACCEL_REDIRECT_PREFIX: str = ""
+    MEDIA_SIGNED_URL_TTL_SECONDS: int = 900
+
     # Files
+    MAX_IMAGE_SIZE: int = 10 * 1024 * 1024
     MAX_VIDEO_SIZE: int = 500 * 1024 * 1024
     MAX_DOC_SIZE: int = 50 * 1024 * 1024
 
@@ -0,0 +1,122 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import HTTPException
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.responses import cursor_response, paginated_response
+from app.core.timestamps import as_utc, isoformat
+
+# Newest first; id breaks ties between documents created in the same instant.
+# Backed by the (filter, created_at, id) indexes created in init_db.
+KEYSET_SORT = [("created_at", -1), ("id", -1)]
+
+_count_cache = TTLCache(maxsize=1000, ttl=settings.LIST_COUNT_CACHE_SECONDS)
+
+
+def encode_cursor(doc: dict) -> str:
+    """Opaque cursor pointing just past `doc` in KEYSET_SORT order"""
+    created_at = doc.get("created_at")
+    if isinstance(created_at, datetime):
+        created_at = {"$date": isoformat(created_at)}
+    raw = json.dumps([created_at, doc["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, doc_id = json.loads(base64.urlsafe_b64decode(padded))
+        if isinstance(created_at, dict):
+            created_at = as_utc(created_at["$date"])
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(doc_id, str):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return created_at, doc_id
+
+
+def keyset_filter(cursor: str) -> dict:
+    """Documents that come after `cursor` in KEYSET_SORT order"""
+    created_at, doc_id = decode_cursor(cursor)
+    if created_at is None:
+        # Documents without created_at sort last, ordered by id alone
+        return {"created_at": None, "id": {"$lt": doc_id}}
+    after = [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "id": {"$lt": doc_id}},
+        {"created_at": None},
+    ]
+    if isinstance(created_at, datetime):
+        # ISO strings not yet migrated to dates sort after every date
+        after.append({"created_at": {"$type": "string"}})
+    return {"$or": after}
+
+
+async def cached_count(collection, query: dict) -> int:
+    """
+    count_documents, cached for LIST_COUNT_CACHE_SECONDS per collection and
+    query. An unfiltered count uses the collection metadata instead.
+    """
+    if not query:
+        return await collection.estimated_document_count()
+
+    key = (collection.name, json.dumps(query, sort_keys=True, default=str))
+    total = _count_cache.get(key)
+    if total is None:
+        total = await collection.count_documents(query)
+        _count_cache.set(key, total)
+    return total
+
+
+async def find_page(
+    collection,
+    query: dict,
+    projection: dict,
+    *,
+    limit: int,
+    page: int = 1,
+    cursor: Optional[str] = None,
+    sort: Optional[List[tuple]] = None,
+    include_total: bool = True,
+) -> dict:
+    """
+    One page of a list endpoint, by page number or by keyset cursor.
+
+    Page numbers skip over earlier results; a cursor (the `next_cursor` of
+    the previous response) seeks straight to the next page through the
+    index, so infinite scroll costs O(limit) however deep it goes. Cursors
+    only exist for the default KEYSET_SORT order.
+
+    The total is optional and cached for a short time, as the one thing
+    that still scans every matching document.
+    """
+    sort = sort or KEYSET_SORT
+    keyset = sort == KEYSET_SORT
+    if cursor and not keyset:
+        raise HTTPException(
+            status_code=400, detail="Cursor pagination is not available here"
+        )
+
+    find_query = query
+    if cursor:
+        after = keyset_filter(cursor)
+        find_query = {"$and": [query, after]} if query else after
+
+    results = collection.find(find_query, projection).sort(sort)
+    if not cursor:
+        results = results.skip((page - 1) * limit)
+    items = await results.limit(limit).to_list(limit)
+
+    next_cursor = None
+    if keyset and len(items) == limit:
+        next_cursor = encode_cursor(items[-1])
+
+    total = await cached_count(collection, query) if include_total else None
+    if cursor:
+        return cursor_response(items, limit, next_cursor, total)
+    return paginated_response(items, total, page, limit, next_cursor)
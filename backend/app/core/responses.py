@@ -1,12 +1,35 @@
 import math
+from typing import Optional
 
 
-def paginated_response(items: list, total: int, page: int, limit: int):
+def paginated_response(
+    items: list,
+    total: Optional[int],
+    page: int,
+    limit: int,
+    next_cursor: Optional[str] = None,
+):
     """Standard paginated response wrapper"""
+    pages = None
+    if total is not None:
+        pages = math.ceil(total / limit) if limit > 0 else 1
     return {
         "items": items,
         "total": total,
         "page": page,
         "limit": limit,
-        "pages": math.ceil(total / limit) if limit > 0 else 1,
+        "pages": pages,
+        "next_cursor": next_cursor,
+    }
+
+
+def cursor_response(
+    items: list, limit: int, next_cursor: Optional[str], total: Optional[int] = None
+):
+    """Response wrapper for keyset (cursor) pagination"""
+    return {
+        "items": items,
+        "total": total,
+        "limit": limit,
+        "next_cursor": next_cursor,
     }
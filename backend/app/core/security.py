@@ -1,26 +1,32 @@
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
-import bcrypt
 import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
+from app.core.cache import TTLCache
 from app.core.config import settings
 from app.db.session import db
+from app.services.hashing import password_hasher
 
 security = HTTPBearer(auto_error=False)
 
+# Principal records keyed by user_id, so authenticated requests skip the users lookup
+user_cache = TTLCache(
+    maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL_SECONDS
+)
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+
+async def hash_password(password: str) -> str:
+    return await password_hasher.hash(password)
 
 
 get_password_hash = hash_password
 
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+async def verify_password(password: str, hashed: str) -> bool:
+    return await password_hasher.verify(password, hashed)
 
 
 def create_token(user_id: str, role: str) -> str:
@@ -44,6 +50,53 @@ def decode_token(token: str) -> dict:
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
+async def load_user(user_id: str, use_cache: bool = True) -> Optional[dict]:
+    """Fetch a user document (without _id), served from the worker cache when fresh"""
+    if use_cache:
+        cached = user_cache.get(user_id)
+        if cached is not None:
+            return dict(cached)
+
+    user = await db.users.find_one({"id": user_id}, {"_id": 0})
+    if user:
+        user_cache.set(user_id, user)
+        return dict(user)
+    return None
+
+
+def invalidate_user(user_id: str):
+    """Drop a cached principal after its profile, role, enrollments or labs change"""
+    user_cache.pop(user_id)
+
+
+async def load_memberships(user_id: str) -> dict:
+    """
+    enrolled_courses and completed_labs, read from Mongo. They change on any
+    worker while invalidate_user() only clears this one, so views never show
+    them from the cached principal.
+    """
+    user = await db.users.find_one(
+        {"id": user_id}, {"_id": 0, "enrolled_courses": 1, "completed_labs": 1}
+    )
+    user = user or {}
+    return {
+        "enrolled_courses": user.get("enrolled_courses", []),
+        "completed_labs": user.get("completed_labs", []),
+    }
+
+
+async def is_enrolled(user: dict, course_id: str) -> bool:
+    """
+    Enrollment check for a (possibly cached) principal. A miss is confirmed
+    against Mongo, since another worker may have enrolled the user since
+    this worker cached the record.
+    """
+    if course_id in user.get("enrolled_courses", []):
+        return True
+    memberships = await load_memberships(user["id"])
+    return course_id in memberships["enrolled_courses"]
+
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
 ):
@@ -52,7 +105,7 @@ async def get_current_user(
 
     try:
         payload = decode_token(credentials.credentials)
-        user = await db.users.find_one({"id": payload["user_id"]}, {"_id": 0})
+        user = await load_user(payload["user_id"])
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
         return user
@@ -67,7 +120,7 @@ async def get_optional_user(
         return None
     try:
         payload = decode_token(credentials.credentials)
-        user = await db.users.find_one({"id": payload["user_id"]}, {"_id": 0})
+        user = await load_user(payload["user_id"])
         return user
     except:
         return None
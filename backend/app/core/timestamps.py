@@ -0,0 +1,33 @@
+from datetime import datetime, timezone
+from typing import Annotated, Optional, Union
+
+from pydantic import PlainSerializer
+
+# Timestamps are stored as BSON dates and read back as aware UTC datetimes
+# (the client is tz_aware, see app.db.session). Responses keep the ISO 8601
+# strings clients have always received.
+
+
+def as_utc(value: Union[datetime, str, None]) -> Optional[datetime]:
+    """
+    Aware UTC datetime from a stored timestamp. Accepts BSON dates (naive
+    ones are UTC) and the ISO strings written before the date migration.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def isoformat(value: datetime) -> str:
+    return as_utc(value).isoformat()
+
+
+# Model field type: accepts datetimes or ISO strings. model_dump() keeps the
+# datetime for Mongo; JSON output is the same ISO string as before.
+Timestamp = Annotated[
+    datetime, PlainSerializer(isoformat, return_type=str, when_used="json")
+]
@@ -6,6 +6,15 @@ import bcrypt
 
 from app.core.config import settings
 from app.db.session import db
+from app.services.analytics import create_rollup_indexes
+from app.services.blobs import create_blob_indexes
+from app.services.images import create_image_indexes
+from app.services.log_archive import create_archive_indexes
+from app.services.search import create_text_indexes
+from app.services.storage import create_upload_progress_indexes
+from app.services.transcode import create_transcode_indexes
+from app.services.upload_intents import create_upload_intent_indexes
+from app.services.upload_sessions import create_upload_session_indexes
 
 logger = logging.getLogger(__name__)
 
@@ -25,15 +34,40 @@ async def init_db():
         await db.db.labs.create_index("difficulty")
         await db.db.workshops.create_index("id", unique=True)
         await db.db.workshops.create_index("is_active")
+        # Keyset pagination order (see app.core.pagination.KEYSET_SORT)
+        await db.db.courses.create_index(
+            [("is_published", 1), ("created_at", -1), ("id", -1)]
+        )
+        await db.db.labs.create_index(
+            [("is_published", 1), ("created_at", -1), ("id", -1)]
+        )
+        await db.db.workshops.create_index(
+            [("is_active", 1), ("created_at", -1), ("id", -1)]
+        )
         await db.db.course_progress.create_index(
             [("user_id", 1), ("course_id", 1)], unique=True
         )
+        await db.db.assignments.create_index([("course_id", 1), ("is_required", 1)])
+        await db.db.submissions.create_index([("assignment_id", 1), ("user_id", 1)])
         await db.db.certificates.create_index("user_id")
         await db.db.certificates.create_index(
             "certificate_number", unique=True, sparse=True
         )
         await db.db.learning_paths.create_index("user_id")
         await db.db.analytics.create_index([("user_id", 1), ("resource_type", 1)])
+        await create_rollup_indexes(db.db)
+        await create_archive_indexes(db.db)
+        await create_upload_progress_indexes(db.db)
+        await create_upload_session_indexes(db.db)
+        await create_upload_intent_indexes(db.db)
+        await create_blob_indexes(db.db)
+        await create_image_indexes(db.db)
+        await create_transcode_indexes(db.db)
+        try:
+            await create_text_indexes(db.db)
+        except Exception as e:
+            # e.g. an older text index with other fields; search needs it fixed
+            logger.error(f"Text index creation failed: {e}")
 
         # Check if admin exists
         admin = await db.db.users.find_one({"email": "admin@pluralskill.in"})
@@ -43,7 +77,7 @@ async def init_db():
             hashed_pw = bcrypt.hashpw(
                 password.encode("utf-8"), bcrypt.gensalt()
             ).decode("utf-8")
-            now = datetime.now(timezone.utc).isoformat()
+            now = datetime.now(timezone.utc)
 
             admin_doc = {
                 "id": str(uuid.uuid4()),
@@ -67,7 +101,7 @@ async def init_db():
             hashed_pw = bcrypt.hashpw(
                 password.encode("utf-8"), bcrypt.gensalt()
             ).decode("utf-8")
-            now = datetime.now(timezone.utc).isoformat()
+            now = datetime.now(timezone.utc)
 
             trainer_doc = {
                 "id": str(uuid.uuid4()),
@@ -91,7 +125,7 @@ async def init_db():
             logger.info("Seeding workshops...")
             admin = await db.db.users.find_one({"email": "admin@pluralskill.in"})
             admin_id = admin["id"] if admin else "system"
-            now = datetime.now(timezone.utc).isoformat()
+            now = datetime.now(timezone.utc)
 
             workshops = [
                 {
@@ -0,0 +1,147 @@
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from app.core.timestamps import as_utc
+
+logger = logging.getLogger(__name__)
+
+# Timestamp fields that used to be written as ISO 8601 strings, per
+# collection. Calendar fields picked by users (workshops.date,
+# assignments.due_date) stay strings.
+TIMESTAMP_FIELDS: Dict[str, List[str]] = {
+    "users": ["created_at", "updated_at", "reset_token_expires"],
+    "courses": ["created_at", "updated_at"],
+    "labs": ["created_at", "updated_at"],
+    "workshops": ["created_at", "updated_at"],
+    "learning_paths": ["created_at", "updated_at"],
+    "assignments": ["created_at", "updated_at"],
+    "submissions": ["submitted_at", "graded_at"],
+    "course_progress": ["started_at", "last_accessed", "completed_at"],
+    "lab_progress": ["started_at", "updated_at"],
+    "workshop_registrations": ["registered_at"],
+    "certificates": ["issued_at", "completion_date"],
+    "access_logs": ["timestamp"],
+}
+
+MIGRATION_ID = "timestamps_to_dates"
+
+
+def _parse(value):
+    """BSON date for an ISO string; None for anything else or unparseable"""
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        return as_utc(value)
+    except ValueError:
+        return None
+
+
+def _nested_updates(doc: dict) -> dict:
+    """course_progress keeps timestamps inside quiz attempts and modules"""
+    updates = {}
+    attempts = (doc.get("quiz_progress") or {}).get("attempts")
+    if isinstance(attempts, list):
+        for index, attempt in enumerate(attempts):
+            parsed = _parse(attempt.get("submitted_at"))
+            if parsed:
+                updates[f"quiz_progress.attempts.{index}.submitted_at"] = parsed
+    modules = doc.get("modules_progress")
+    if isinstance(modules, dict):
+        for module_id, entry in modules.items():
+            parsed = _parse((entry or {}).get("completed_at"))
+            if parsed:
+                updates[f"modules_progress.{module_id}.completed_at"] = parsed
+    return updates
+
+
+def timestamp_updates(collection: str, doc: dict) -> dict:
+    """$set document converting `doc`'s string timestamps; empty if none"""
+    updates = {}
+    for field in TIMESTAMP_FIELDS[collection]:
+        parsed = _parse(doc.get(field))
+        if parsed:
+            updates[field] = parsed
+    if collection == "course_progress":
+        updates.update(_nested_updates(doc))
+    return updates
+
+
+async def _checkpoint(database, update: dict):
+    await database.migrations.update_one({"_id": MIGRATION_ID}, update, upsert=True)
+
+
+async def migrate_timestamps(
+    database, batch_size: int = 500, collections: Optional[List[str]] = None
+) -> Dict[str, int]:
+    """
+    Convert ISO string timestamps to BSON dates, one batch of documents at a
+    time in _id order.
+
+    The last _id of every batch is checkpointed in the `migrations`
+    collection, so an interrupted run resumes where it stopped. Each write
+    is conditional on the string it replaces, so running a batch twice, or
+    racing a live write, changes nothing. Returns modified counts per
+    collection.
+    """
+    state = await database.migrations.find_one({"_id": MIGRATION_ID}) or {}
+    done = set(state.get("done", []))
+    converted = {}
+
+    for name in collections or list(TIMESTAMP_FIELDS):
+        if name in done:
+            continue
+        collection = database[name]
+        projection = {field: 1 for field in TIMESTAMP_FIELDS[name]}
+        if name == "course_progress":
+            projection.update({"quiz_progress.attempts": 1, "modules_progress": 1})
+        last_id = state.get("last_ids", {}).get(name)
+        converted[name] = 0
+
+        while True:
+            query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+            docs = (
+                await collection.find(query, projection)
+                .sort("_id", 1)
+                .limit(batch_size)
+                .to_list(batch_size)
+            )
+            if not docs:
+                break
+            last_id = docs[-1]["_id"]
+
+            ops = []
+            for doc in docs:
+                updates = timestamp_updates(name, doc)
+                if not updates:
+                    continue
+                # Only if the field still holds the string we parsed
+                guard = {
+                    field: doc[field]
+                    for field in TIMESTAMP_FIELDS[name]
+                    if field in updates
+                }
+                ops.append(UpdateOne({"_id": doc["_id"], **guard}, {"$set": updates}))
+            if ops:
+                result = await collection.bulk_write(ops, ordered=False)
+                converted[name] += result.modified_count
+            await _checkpoint(database, {"$set": {f"last_ids.{name}": last_id}})
+
+        await _checkpoint(
+            database,
+            {
+                "$addToSet": {"done": name},
+                "$unset": {f"last_ids.{name}": ""},
+                "$set": {"updated_at": datetime.now(timezone.utc)},
+            },
+        )
+        logger.info(f"Converted timestamps in {converted[name]} {name} documents")
+
+    return converted
+
+
+async def reset_timestamp_migration(database):
+    """Forget progress so the next run rescans every collection"""
+    await database.migrations.delete_one({"_id": MIGRATION_ID})
@@ -1,3 +1,5 @@
+from datetime import timezone
+
 from motor.motor_asyncio import AsyncIOMotorClient
 
 from app.core.config import settings
@@ -8,7 +10,10 @@ class Database:
     db = None
 
     def connect(self):
-        self.client = AsyncIOMotorClient(settings.MONGO_URL)
+        # Dates come back as aware UTC datetimes, matching what we write
+        self.client = AsyncIOMotorClient(
+            settings.MONGO_URL, tz_aware=True, tzinfo=timezone.utc
+        )
         self.db = self.client[settings.DB_NAME]
         print(f"Connected to MongoDB: {settings.DB_NAME}")
 
@@ -2,16 +2,25 @@ from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
 from starlette.middleware.cors import CORSMiddleware
 
 from app.api.api import api_router
+from app.api.endpoints.upload import storage_service
 from app.core.config import settings
 from app.core.logging_config import setup_logging
 from app.db.session import db
+from app.services.analytics import access_log_writer
+from app.services.courses import course_repository
+from app.services.hashing import password_hasher
+from app.services.images import image_derivatives
+from app.services.log_archive import access_log_archiver
+from app.services.media import MediaFiles
+from app.services.progress import progress_reconciler
+from app.services.transcode import video_transcoder
+from app.services.upload_gc import upload_collector
 
 # Set up structured logging
 logger = setup_logging()
@@ -42,9 +51,23 @@ async def lifespan(app: FastAPI):
     from app.db.init_db import init_db
 
     await init_db()
+    access_log_writer.start()
+    progress_reconciler.start()
+    access_log_archiver.start()
+    image_derivatives.start()
+    video_transcoder.start(storage_service)
+    upload_collector.start(storage_service)
     logger.info("Application startup: DB connected and initialized")
     yield
     # Shutdown
+    await progress_reconciler.stop()
+    await access_log_archiver.stop()
+    await access_log_writer.stop()
+    await image_derivatives.stop()
+    await video_transcoder.stop()
+    await upload_collector.stop()
+    password_hasher.shutdown()
+    storage_service.shutdown()
     db.close()
     logger.info("Application shutdown: DB disconnected")
 
@@ -70,7 +93,7 @@ if settings.CORS_ORIGINS:
         allow_headers=["*"],
     )
 
-# Mount Static Files
+# Mount uploaded media
 UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
 (UPLOAD_DIR / "images").mkdir(exist_ok=True)
@@ -78,7 +101,7 @@ UPLOAD_DIR.mkdir(exist_ok=True)
 (UPLOAD_DIR / "documents").mkdir(exist_ok=True)
 (UPLOAD_DIR / "assignments").mkdir(exist_ok=True)
 
-app.mount("/uploads", StaticFiles(directory=str(UPLOAD_DIR)), name="uploads")
+app.mount("/uploads", MediaFiles(directory=UPLOAD_DIR), name="uploads")
 
 # Include Router
 app.include_router(api_router, prefix=settings.API_V1_STR)
@@ -86,4 +109,13 @@ app.include_router(api_router, prefix=settings.API_V1_STR)
 
 @app.get("/health")
 async def health_check():
-    return {"status": "ok", "version": settings.VERSION}
+    return {
+        "status": "ok",
+        "version": settings.VERSION,
+        "password_hash_queue": password_hasher.queue_length,
+        "access_log": access_log_writer.stats(),
+        "course_cache": course_repository.stats(),
+        "uploads": storage_service.stats(),
+        "image_derivatives": image_derivatives.stats(),
+        "video_transcodes": video_transcoder.stats(),
+    }
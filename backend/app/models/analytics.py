@@ -1,9 +1,11 @@
 from pydantic import BaseModel
 
+from app.core.timestamps import Timestamp
+
 
 class AccessLog(BaseModel):
     user_id: str
     content_type: str  # course, lab, workshop, open_source
     content_id: str
     action: str  # view, enroll, complete, start
-    timestamp: str
+    timestamp: Timestamp
@@ -2,6 +2,8 @@ from typing import Optional
 
 from pydantic import BaseModel, ConfigDict
 
+from app.core.timestamps import Timestamp
+
 
 class AssignmentCreate(BaseModel):
     course_id: str
@@ -25,7 +27,7 @@ class Assignment(BaseModel):
     due_date: Optional[str]
     max_score: int
     is_required: bool
-    created_at: str
+    created_at: Timestamp
     created_by: str
 
 
@@ -37,10 +39,10 @@ class AssignmentSubmission(BaseModel):
     file_url: str
     file_name: str
     notes: str = ""
-    submitted_at: str
+    submitted_at: Timestamp
     grade: Optional[float] = None
     feedback: Optional[str] = None
-    graded_at: Optional[str] = None
+    graded_at: Optional[Timestamp] = None
     graded_by: Optional[str] = None
 
 
@@ -2,6 +2,8 @@ from typing import Optional
 
 from pydantic import BaseModel, ConfigDict
 
+from app.core.timestamps import Timestamp
+
 
 class Certificate(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -11,7 +13,7 @@ class Certificate(BaseModel):
     course_id: str
     user_name: str
     course_title: str
-    issued_at: str
+    issued_at: Timestamp
     quiz_score: float
-    completion_date: str
+    completion_date: Timestamp
     pdf_url: Optional[str] = None
@@ -2,6 +2,8 @@ from typing import Any, List, Optional
 
 from pydantic import BaseModel, ConfigDict
 
+from app.core.timestamps import Timestamp
+
 # ─── Workshops ────────────────────────────────────────────────
 
 
@@ -19,7 +21,7 @@ class Workshop(BaseModel):
     max_participants: Optional[int] = None
     registered_count: int = 0
     is_active: bool = True
-    created_at: Optional[str] = None
+    created_at: Optional[Timestamp] = None
 
 
 class WorkshopCreate(BaseModel):
@@ -51,8 +53,8 @@ class Course(BaseModel):
     modules: List[dict] = []
     is_published: bool = True
     enrolled_count: int = 0
-    created_at: str
-    updated_at: str
+    created_at: Timestamp
+    updated_at: Timestamp
 
 
 class CourseCreate(BaseModel):
@@ -103,7 +105,7 @@ class Lab(BaseModel):
     description: str
     steps: List[Any] = []
     video_url: Optional[str] = None
-    created_at: Optional[str] = None
+    created_at: Optional[Timestamp] = None
 
 
 class LabCreate(BaseModel):
@@ -2,6 +2,8 @@ from typing import List, Optional
 
 from pydantic import BaseModel, ConfigDict, Field
 
+from app.core.timestamps import Timestamp
+
 
 class LearningPathStep(BaseModel):
     title: str
@@ -19,7 +21,7 @@ class LearningPath(BaseModel):
     total_duration: str
     steps: List[LearningPathStep]
     user_id: Optional[str] = None
-    created_at: str
+    created_at: Timestamp
 
     model_config = ConfigDict(from_attributes=True)
 
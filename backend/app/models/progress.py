@@ -2,11 +2,13 @@ from typing import Dict, List, Optional
 
 from pydantic import BaseModel, ConfigDict
 
+from app.core.timestamps import Timestamp
+
 
 class ModuleProgress(BaseModel):
     module_id: str
     completed: bool = False
-    completed_at: Optional[str] = None
+    completed_at: Optional[Timestamp] = None
     time_spent_minutes: int = 0
 
 
@@ -14,7 +16,7 @@ class QuizAttempt(BaseModel):
     attempt_number: int
     score: float
     answers: Dict[str, int] = {}  # question_id: selected_answer
-    submitted_at: str
+    submitted_at: Timestamp
     passed: bool
 
 
@@ -30,13 +32,13 @@ class CourseProgress(BaseModel):
     id: str
     user_id: str
     course_id: str
-    modules_progress: List[ModuleProgress] = []
+    modules_progress: Dict[str, ModuleProgress] = {}  # keyed by module_id
     quiz_progress: Optional[QuizProgress] = None
     overall_progress: float = 0  # percentage
-    started_at: str
-    last_accessed: str
+    started_at: Timestamp
+    last_accessed: Timestamp
     completed: bool = False
-    completed_at: Optional[str] = None
+    completed_at: Optional[Timestamp] = None
 
 
 class SubmitQuizRequest(BaseModel):
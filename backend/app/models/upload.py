@@ -0,0 +1,17 @@
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+class UploadSessionCreate(BaseModel):
+    kind: str = "video"  # image, video, document
+    filename: str
+    content_type: str
+    size: int  # total bytes the client will send
+    # SHA-256 of the file; when those bytes are already stored the upload
+    # completes without sending them. Direct S3 uploads are checked against it.
+    sha256: Optional[str] = Field(None, pattern=r"^[0-9a-fA-F]{64}$")
+
+
+class UploadIntentCreate(UploadSessionCreate):
+    pass
@@ -2,6 +2,8 @@ from typing import List, Optional
 
 from pydantic import BaseModel, ConfigDict, EmailStr, Field
 
+from app.core.timestamps import Timestamp
+
 
 class User(BaseModel):
     email: EmailStr
@@ -20,8 +22,8 @@ class UserInDB(User):
     role: str = "learner"  # learner, trainer, admin
     enrolled_courses: List[str] = []  # List of course IDs
     completed_labs: List[str] = []  # List of lab IDs
-    created_at: str
-    updated_at: str
+    created_at: Timestamp
+    updated_at: Timestamp
 
 
 class UserCreate(BaseModel):
@@ -63,7 +65,7 @@ class UserProfile(BaseModel):
     bio: Optional[str] = None
     skills: List[str] = []
     role: str
-    created_at: str
+    created_at: Timestamp
 
 
 class UserProfileUpdate(BaseModel):
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.db.session import db
+from app.services.analytics import access_counts
+
+logger = logging.getLogger(__name__)
+
+
+async def _sum_field(collection, field: str) -> int:
+    pipeline = [{"$group": {"_id": None, "total": {"$sum": f"${field}"}}}]
+    result = await collection.aggregate(pipeline).to_list(1)
+    return result[0]["total"] if result else 0
+
+
+async def compute_admin_stats() -> dict:
+    """
+    Platform totals for the admin dashboard. All queries run concurrently;
+    unfiltered totals come from collection metadata instead of a scan.
+    """
+    (
+        total_users,
+        total_learners,
+        total_trainers,
+        total_courses,
+        total_workshops,
+        total_labs,
+        total_paths,
+        published_courses,
+        published_labs,
+        active_workshops,
+        total_enrollments,
+        total_completions,
+    ) = await asyncio.gather(
+        db.users.estimated_document_count(),
+        db.users.count_documents({"role": "learner"}),
+        db.users.count_documents({"role": "trainer"}),
+        db.courses.estimated_document_count(),
+        db.workshops.estimated_document_count(),
+        db.labs.estimated_document_count(),
+        db.learning_paths.estimated_document_count(),
+        db.courses.count_documents({"is_published": True}),
+        db.labs.count_documents({"is_published": True}),
+        db.workshops.count_documents({"is_active": True}),
+        _sum_field(db.courses, "enrolled_count"),
+        _sum_field(db.labs, "completions_count"),
+    )
+
+    return {
+        "total_users": total_users,
+        "total_learners": total_learners,
+        "total_trainers": total_trainers,
+        "total_courses": total_courses,
+        "published_courses": published_courses,
+        "total_workshops": total_workshops,
+        "active_workshops": active_workshops,
+        "total_labs": total_labs,
+        "published_labs": published_labs,
+        "total_learning_paths": total_paths,
+        "total_enrollments": total_enrollments,
+        "total_lab_completions": total_completions,
+    }
+
+
+async def compute_admin_analytics() -> dict:
+    """Detailed analytics for the admin dashboard, queried concurrently"""
+    now = datetime.now(timezone.utc)
+    seven_days_ago = now - timedelta(days=7)
+
+    role_pipeline = [{"$group": {"_id": "$role", "count": {"$sum": 1}}}]
+    category_pipeline = [{"$group": {"_id": "$category", "count": {"$sum": 1}}}]
+
+    (
+        access_stats,
+        users_by_role,
+        top_courses,
+        top_labs,
+        courses_by_category,
+        recent_signups,
+    ) = await asyncio.gather(
+        # Access logs by content type (last 30 days), from hourly rollups
+        access_counts(now - timedelta(days=30)),
+        db.users.aggregate(role_pipeline).to_list(10),
+        db.courses.find(
+            {"is_published": True},
+            {"_id": 0, "title": 1, "enrolled_count": 1, "category": 1},
+        )
+        .sort("enrolled_count", -1)
+        .limit(5)
+        .to_list(5),
+        db.labs.find(
+            {"is_published": True},
+            {"_id": 0, "title": 1, "completions_count": 1, "technology": 1},
+        )
+        .sort("completions_count", -1)
+        .limit(5)
+        .to_list(5),
+        db.courses.aggregate(category_pipeline).to_list(20),
+        db.users.count_documents({"created_at": {"$gte": seven_days_ago}}),
+    )
+
+    return {
+        "access_stats": access_stats,
+        "users_by_role": users_by_role,
+        "top_courses": top_courses,
+        "top_labs": top_labs,
+        "courses_by_category": courses_by_category,
+        "recent_signups": recent_signups,
+    }
+
+
+class StatsSnapshot:
+    """
+    Serves admin stats from an in-memory snapshot recomputed every `interval`
+    seconds, so a dashboard load is a dict lookup rather than a set of scans.
+
+    Each snapshot carries `computed_at`. A report that has not been computed
+    yet, or whose refresh loop is not running and has gone stale, is computed
+    on demand; concurrent requests share that one computation.
+    """
+
+    def __init__(
+        self, reports: Dict[str, Callable[[], Awaitable[dict]]], interval: float
+    ):
+        self.reports = reports
+        self.interval = interval
+        self._snapshots: Dict[str, dict] = {}
+        self._computed: Dict[str, datetime] = {}
+        self._locks = {name: asyncio.Lock() for name in reports}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def get(self, name: str, refresh: bool = False) -> dict:
+        if refresh or self._is_stale(name):
+            await self._refresh(name, force=refresh)
+        return self._snapshots[name]
+
+    def _is_stale(self, name: str) -> bool:
+        computed = self._computed.get(name)
+        if computed is None:
+            return True
+        max_age = max(self.interval, 1) * 2
+        age = (datetime.now(timezone.utc) - computed).total_seconds()
+        return age > max_age
+
+    async def _refresh(self, name: str, force: bool = False):
+        async with self._locks[name]:
+            # Someone else refreshed it while we waited for the lock
+            if not force and not self._is_stale(name):
+                return
+            computed_at = datetime.now(timezone.utc)
+            data = await self.reports[name]()
+            self._snapshots[name] = {**data, "computed_at": computed_at.isoformat()}
+            self._computed[name] = computed_at
+
+    async def _run(self):
+        while True:
+            for name in self.reports:
+                try:
+                    await self._refresh(name, force=True)
+                except Exception as e:
+                    logger.error(f"Admin stats refresh failed ({name}): {e}")
+            await asyncio.sleep(self.interval)
+
+
+admin_stats = StatsSnapshot(
+    reports={"stats": compute_admin_stats, "analytics": compute_admin_analytics},
+    interval=settings.ADMIN_STATS_REFRESH_SECONDS,
+)
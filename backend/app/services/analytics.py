@@ -1,8 +1,263 @@
+import asyncio
+import logging
 import uuid
-from datetime import datetime, timezone
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
 
+from pymongo import ASCENDING, UpdateOne
+
+from app.core.config import settings
+from app.core.timestamps import as_utc
 from app.db.session import db
 
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+# ============== ROLLUPS ==============
+# access_log_rollups holds one counter per (granularity, bucket, content_type,
+# content_id, action), $inc-upserted as events are written. Analytics read
+# these instead of grouping raw access_logs. `bucket` is the BSON datetime
+# the hour or day starts at.
+
+ROLLUP_GRANULARITIES = ("hour", "day")
+ROLLUP_KEY = ("granularity", "bucket", "content_type", "content_id", "action")
+
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _event_time(log_doc: dict) -> datetime:
+    return as_utc(log_doc["timestamp"])
+
+
+def rollup_ops(batch: List[dict]) -> List[UpdateOne]:
+    """One $inc upsert per distinct rollup key in the batch"""
+    counts = Counter()
+    for log_doc in batch:
+        timestamp = _event_time(log_doc)
+        for granularity in ROLLUP_GRANULARITIES:
+            key = (
+                granularity,
+                bucket_start(timestamp, granularity),
+                log_doc["content_type"],
+                log_doc["content_id"],
+                log_doc["action"],
+            )
+            counts[key] += 1
+    return [
+        UpdateOne(dict(zip(ROLLUP_KEY, key)), {"$inc": {"count": n}}, upsert=True)
+        for key, n in counts.items()
+    ]
+
+
+async def record_rollups(batch: List[dict]):
+    ops = rollup_ops(batch)
+    if ops:
+        await db.access_log_rollups.bulk_write(ops, ordered=False)
+
+
+async def create_rollup_indexes(database):
+    await database.access_log_rollups.create_index(
+        [(field, ASCENDING) for field in ROLLUP_KEY], unique=True
+    )
+    # Hourly counters are only needed for recent windows
+    await database.access_log_rollups.create_index(
+        "bucket",
+        name="hourly_rollup_ttl",
+        expireAfterSeconds=settings.ACCESS_LOG_HOURLY_ROLLUP_DAYS * 86400,
+        partialFilterExpression={"granularity": "hour"},
+    )
+
+
+async def rebuild_rollups(before: Optional[datetime] = None) -> int:
+    """
+    Recompute rollups of every closed bucket from raw access_logs, e.g. to
+    backfill events logged before rollups existed. Counts are replaced, not
+    incremented, so it is safe to run repeatedly. Buckets that are still
+    open (the current hour and day) are left to the ingest path, and so are
+    buckets reaching back past ACCESS_LOG_RETENTION_DAYS, whose raw events
+    may already have been pruned.
+    """
+    now = before or datetime.now(timezone.utc)
+    retained = now - timedelta(days=settings.ACCESS_LOG_RETENTION_DAYS - 1)
+    rebuilt = 0
+    for granularity in ROLLUP_GRANULARITIES:
+        start = bucket_start(retained, granularity)
+        cutoff = bucket_start(now, granularity)
+        pipeline = [
+            {"$addFields": {"_ts": {"$toDate": "$timestamp"}}},
+            {"$match": {"_ts": {"$gte": start, "$lt": cutoff}}},
+            {
+                "$group": {
+                    "_id": {
+                        "bucket": {"$dateTrunc": {"date": "$_ts", "unit": granularity}},
+                        "content_type": "$content_type",
+                        "content_id": "$content_id",
+                        "action": "$action",
+                    },
+                    "count": {"$sum": 1},
+                }
+            },
+        ]
+        ops = []
+        async for row in db.access_logs.aggregate(pipeline, allowDiskUse=True):
+            key = {"granularity": granularity, **row["_id"]}
+            ops.append(UpdateOne(key, {"$set": {"count": row["count"]}}, upsert=True))
+            if len(ops) >= 1000:
+                await db.access_log_rollups.bulk_write(ops, ordered=False)
+                rebuilt += len(ops)
+                ops = []
+        if ops:
+            await db.access_log_rollups.bulk_write(ops, ordered=False)
+            rebuilt += len(ops)
+    return rebuilt
+
+
+async def access_counts(since: datetime, granularity: str = "hour") -> List[dict]:
+    """Event counts per (content_type, action) since `since`, from rollups"""
+    pipeline = [
+        {
+            "$match": {
+                "granularity": granularity,
+                "bucket": {"$gte": bucket_start(since, granularity)},
+            }
+        },
+        {
+            "$group": {
+                "_id": {"content_type": "$content_type", "action": "$action"},
+                "count": {"$sum": "$count"},
+            }
+        },
+    ]
+    return await db.access_log_rollups.aggregate(pipeline).to_list(None)
+
+
+class AccessLogWriter:
+    """
+    Buffers access-log events in memory and writes them in unordered
+    insert_many batches, flushing when a batch fills or the interval elapses.
+
+    The queue is bounded: when Mongo falls behind, new events are dropped
+    (and counted) rather than stalling the request that produced them.
+    """
+
+    def __init__(self, queue_size: int, batch_size: int, flush_interval: float):
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._run())
+        logger.info("Access log writer started")
+
+    async def stop(self):
+        """Flush everything still queued and stop the background task"""
+        if not self.running:
+            return
+        task, self._task = self._task, None
+        await self._queue.put(_STOP)
+        await task
+        logger.info(f"Access log writer stopped: {self.stats()}")
+
+    def enqueue(self, log_doc: dict) -> bool:
+        try:
+            self._queue.put_nowait(log_doc)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"Access log queue full, dropped {self.dropped} events")
+            return False
+        self.enqueued += 1
+        return True
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is _STOP:
+                break
+
+            batch = [first]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._write(batch)
+
+        # Drain whatever was queued behind the stop marker
+        batch = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                batch.append(item)
+            if len(batch) >= self.batch_size:
+                await self._write(batch)
+                batch = []
+        if batch:
+            await self._write(batch)
+
+    async def _write(self, batch: List[dict]):
+        try:
+            await db.access_logs.insert_many(batch, ordered=False)
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"Access log flush failed ({len(batch)} events): {e}")
+        else:
+            try:
+                await record_rollups(batch)
+            except Exception as e:
+                # Closed buckets can be recomputed later with rebuild_rollups
+                logger.error(f"Access log rollup failed ({len(batch)} events): {e}")
+        self.flushes += 1
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "flushes": self.flushes,
+        }
+
+
+access_log_writer = AccessLogWriter(
+    queue_size=settings.ACCESS_LOG_QUEUE_SIZE,
+    batch_size=settings.ACCESS_LOG_BATCH_SIZE,
+    flush_interval=settings.ACCESS_LOG_FLUSH_SECONDS,
+)
+
 
 async def log_access(user_id: str, content_type: str, content_id: str, action: str):
     """Log user access for analytics"""
@@ -12,6 +267,12 @@ async def log_access(user_id: str, content_type: str, content_id: str, action: s
         "content_type": content_type,
         "content_id": content_id,
         "action": action,
-        "timestamp": datetime.now(timezone.utc).isoformat(),
+        # BSON date, so day range queries and the archiver can use the index
+        "timestamp": datetime.now(timezone.utc),
     }
-    await db.access_logs.insert_one(log_doc)
+    if access_log_writer.running:
+        access_log_writer.enqueue(log_doc)
+    else:
+        # Scripts and tests without the app lifespan write directly
+        await db.access_logs.insert_one(log_doc)
+        await record_rollups([log_doc])
@@ -0,0 +1,136 @@
+import logging
+from datetime import datetime, timezone
+from pathlib import PurePosixPath
+from typing import Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.db.session import db
+from app.services.storage import StorageService
+
+logger = logging.getLogger(__name__)
+
+# Content-addressed uploads: a finished upload is moved to
+# <directory>/<sha256><ext> and recorded in `blobs` (keyed by that storage
+# key). Uploading bytes that are already stored just touches `referenced_at`
+# and drops the new copy, so every course or workshop that reuses an intro
+# video points at one object.
+#
+# Blobs are not reference counted. A stored URL can be replaced or deleted
+# from too many places to keep a count honest, so the orphaned-upload
+# collector (app.services.upload_gc) deletes a blob once no document points
+# at its URL. It keeps blobs touched within its grace period, which covers a
+# deduplicated upload whose form has not been saved yet.
+
+
+def content_key(directory: str, sha256: str, filename: str) -> str:
+    return f"{directory}/{sha256}{PurePosixPath(filename).suffix.lower()}"
+
+
+async def create_blob_indexes(database):
+    await database.blobs.create_index("sha256")
+    await database.blobs.create_index("referenced_at")
+
+
+async def _reference(key: str) -> Optional[dict]:
+    return await db.blobs.find_one_and_update(
+        {"_id": key},
+        {"$set": {"referenced_at": datetime.now(timezone.utc)}},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def _blob_result(
+    storage: StorageService, key: str, filename: str, size: int, content_type: str
+) -> dict:
+    return storage._result(
+        storage.key_url(key), PurePosixPath(key).name, filename, size, content_type
+    )
+
+
+async def store_blob(
+    storage: StorageService,
+    key: str,
+    sha256: str,
+    filename: str,
+    size: int,
+    content_type: str,
+) -> dict:
+    """
+    Move a finished upload at `key` to its content address, or discard it if
+    those bytes are already stored. Returns the upload result dict for the
+    content-addressed URL. If the move fails the upload stays where it was.
+    """
+    directory = PurePosixPath(key).parent.as_posix()
+    target = content_key(directory, sha256, filename)
+
+    if await _reference(target):
+        await storage.run_blocking(storage.delete_object, key)
+        logger.info(f"Deduplicated upload {key} -> {target}")
+        return _blob_result(storage, target, filename, size, content_type)
+
+    try:
+        await storage.run_blocking(storage.move_object, key, target, content_type)
+    except Exception as e:
+        logger.error(f"Failed to move upload {key} to {target}: {e}")
+        return storage._result(
+            storage.key_url(key), PurePosixPath(key).name, filename, size, content_type
+        )
+
+    now = datetime.now(timezone.utc)
+    try:
+        await db.blobs.insert_one(
+            {
+                "_id": target,
+                "sha256": sha256,
+                "size": size,
+                "content_type": content_type,
+                "created_at": now,
+                "referenced_at": now,
+            }
+        )
+    except DuplicateKeyError:
+        # The same bytes finished concurrently; both moves wrote one object
+        await _reference(target)
+    return _blob_result(storage, target, filename, size, content_type)
+
+
+async def adopt_blob(
+    storage: StorageService, key: str, filename: str, size: int, content_type: str
+) -> dict:
+    """
+    store_blob for an object whose bytes never passed through a writer. The
+    hash comes from the checksum S3 verified on upload, so the object is
+    not read back; without one it is registered where it is.
+    """
+    try:
+        sha256 = await storage.run_blocking(storage.hash_object, key)
+    except Exception as e:
+        logger.error(f"Failed to hash upload {key}: {e}")
+        sha256 = None
+    if sha256 is None:
+        return storage._result(
+            storage.key_url(key), PurePosixPath(key).name, filename, size, content_type
+        )
+    return await store_blob(storage, key, sha256, filename, size, content_type)
+
+
+async def reference_existing(
+    storage: StorageService,
+    directory: str,
+    sha256: str,
+    filename: str,
+    size: int,
+    content_type: str,
+) -> Optional[dict]:
+    """
+    Take a reference to an already-stored blob by its declared hash, so a
+    re-upload needs no bytes at all. The size has to match as well. Returns
+    None when there is no such blob.
+    """
+    key = content_key(directory, sha256.lower(), filename)
+    blob = await db.blobs.find_one({"_id": key}, {"size": 1})
+    if not blob or blob["size"] != size or not await _reference(key):
+        return None
+    return _blob_result(storage, key, filename, size, content_type)
@@ -0,0 +1,188 @@
+from typing import Optional
+
+from fastapi import HTTPException
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.db.session import db
+
+# Enough to tell whether a cached course is still current
+VERSION_PROJECTION = {"_id": 0, "id": 1, "slug": 1, "version": 1, "updated_at": 1}
+
+# What a course card in a catalog, dashboard or admin grid renders. Modules
+# and tests (with their correct answers) are reduced to counts.
+COURSE_CARD_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "title": 1,
+    "slug": 1,
+    "short_description": 1,
+    "description": 1,
+    "thumbnail_url": 1,
+    "category": 1,
+    "industry": 1,
+    "level": 1,
+    "duration_hours": 1,
+    "price": 1,
+    "enrolled_count": 1,
+    "is_published": 1,
+    "created_by": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "module_count": {"$size": {"$ifNull": ["$modules", []]}},
+    "test_count": {"$size": {"$ifNull": ["$tests", []]}},
+}
+
+# Course page outline: card fields plus one summary per module. Item bodies,
+# URLs and quiz questions are left for the per-module endpoint.
+MODULE_SUMMARY_PROJECTION = {
+    "$map": {
+        "input": {"$ifNull": ["$modules", []]},
+        "as": "m",
+        "in": {
+            "id": "$$m.id",
+            "title": "$$m.title",
+            "description": "$$m.description",
+            "order": "$$m.order",
+            "item_count": {"$size": {"$ifNull": ["$$m.items", []]}},
+            "duration_minutes": {
+                "$cond": [
+                    {"$gt": [{"$size": {"$ifNull": ["$$m.items", []]}}, 0]},
+                    {"$sum": "$$m.items.duration_minutes"},
+                    {"$ifNull": ["$$m.duration_minutes", 0]},
+                ]
+            },
+        },
+    }
+}
+COURSE_OUTLINE_PROJECTION = {
+    **COURSE_CARD_PROJECTION,
+    "learning_outcomes": 1,
+    "modules": MODULE_SUMMARY_PROJECTION,
+}
+
+
+async def get_course_outline(query: dict) -> Optional[dict]:
+    return await db.courses.find_one(query, COURSE_OUTLINE_PROJECTION)
+
+
+async def get_course_module(course_id: str, module_id: str) -> Optional[dict]:
+    """A single module with its items, without loading the rest of the course"""
+    course = await db.courses.find_one(
+        {"id": course_id},
+        {"_id": 0, "id": 1, "modules": {"$elemMatch": {"id": module_id}}},
+    )
+    if not course or not course.get("modules"):
+        return None
+    return course["modules"][0]
+
+
+def course_list_projection(view: str = "summary", fields: Optional[str] = None):
+    """
+    Projection for course list endpoints: the card fields by default, the
+    whole document for view=full, or an explicit comma-separated ?fields=.
+    """
+    if fields:
+        names = [f.strip() for f in fields.split(",") if f.strip() not in ("", "_id")]
+        if any(name.startswith("$") or "." in name for name in names):
+            raise HTTPException(status_code=400, detail="Invalid fields")
+        # id and created_at are needed for cursors and client-side keys
+        return {"_id": 0, "id": 1, "created_at": 1, **{n: 1 for n in names}}
+    if view == "full":
+        return {"_id": 0}
+    if view == "summary":
+        return dict(COURSE_CARD_PROJECTION)
+    raise HTTPException(status_code=400, detail="view must be summary or full")
+
+
+def course_version(course: dict) -> tuple:
+    """
+    Freshness token of a course document. `version` is incremented by every
+    course write; documents created before it existed fall back to updated_at.
+    """
+    return (course.get("version", 0), course.get("updated_at"))
+
+
+class CourseRepository:
+    """
+    Per-worker cache of full course documents, keyed by id and slug.
+
+    Every hit is validated with a small version lookup, so a course edited
+    through another worker is never served stale; what the cache saves is
+    transferring and decoding the full module/quiz tree. Writers in this
+    worker call invalidate() so the next read does not need the lookup to
+    find out.
+
+    Returned documents are shallow copies: callers may add or replace
+    top-level keys but must not mutate nested modules or tests.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._by_id = TTLCache(maxsize, ttl)
+        self._slugs = TTLCache(maxsize, ttl)
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    async def get_by_id(self, course_id: str) -> Optional[dict]:
+        cached = self._by_id.get(course_id)
+        if cached is not None:
+            current = await db.courses.find_one({"id": course_id}, VERSION_PROJECTION)
+            if current and course_version(current) == cached[0]:
+                self.hits += 1
+                return dict(cached[1])
+            self.stale += 1
+            self.invalidate(course_id)
+            if not current:
+                return None
+
+        self.misses += 1
+        course = await db.courses.find_one({"id": course_id}, {"_id": 0})
+        if course:
+            self._store(course)
+            return dict(course)
+        return None
+
+    async def get_by_slug(self, slug: str) -> Optional[dict]:
+        course_id = self._slugs.get(slug)
+        if course_id is not None:
+            course = await self.get_by_id(course_id)
+            if course and course.get("slug") == slug:
+                return course
+            self._slugs.pop(slug)
+
+        self.misses += 1
+        course = await db.courses.find_one({"slug": slug}, {"_id": 0})
+        if course:
+            self._store(course)
+            return dict(course)
+        return None
+
+    def _store(self, course: dict):
+        self._by_id.set(course["id"], (course_version(course), course))
+        if course.get("slug"):
+            self._slugs.set(course["slug"], course["id"])
+
+    def invalidate(self, course_id: str):
+        cached = self._by_id.pop(course_id)
+        if cached is not None and cached[1].get("slug"):
+            self._slugs.pop(cached[1]["slug"])
+
+    def clear(self):
+        self._by_id.clear()
+        self._slugs.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._by_id),
+            "maxsize": self._by_id.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+        }
+
+
+course_repository = CourseRepository(
+    maxsize=settings.COURSE_CACHE_SIZE,
+    ttl=settings.COURSE_CACHE_TTL_SECONDS,
+)
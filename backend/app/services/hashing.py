@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+import bcrypt
+from fastapi import HTTPException
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _hashpw(password: str) -> str:
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+
+
+def _checkpw(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a bounded process pool so hashing never blocks the event loop.
+
+    Calls beyond `queue_depth` pending operations are rejected with a 503
+    instead of piling up behind a login burst.
+    """
+
+    def __init__(self, workers: int, queue_depth: int):
+        self.workers = max(1, workers)
+        self.queue_depth = max(1, queue_depth)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+
+    @property
+    def queue_length(self) -> int:
+        """Number of hash/verify calls currently queued or running"""
+        return self._pending
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_depth": self.queue_depth,
+            "queue_length": self._pending,
+        }
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created lazily so each gunicorn worker gets its own pool after fork
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.queue_depth:
+            logger.warning(f"Password hash queue full ({self._pending} pending)")
+            raise HTTPException(
+                status_code=503,
+                detail="Server busy, please retry",
+                headers={"Retry-After": "1"},
+            )
+
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        except BrokenProcessPool:
+            logger.error("Password hash pool died, recreating on next call")
+            self._executor = None
+            raise HTTPException(status_code=503, detail="Server busy, please retry")
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hashpw, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(_checkpw, password, hashed)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    queue_depth=settings.PASSWORD_HASH_QUEUE_DEPTH,
+)
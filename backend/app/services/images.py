@@ -0,0 +1,271 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+from pathlib import PurePosixPath
+from typing import List, Optional, Tuple
+
+from PIL import Image, ImageOps, features
+
+from app.core.config import settings
+from app.db.session import db
+from app.services.storage import StorageService
+
+logger = logging.getLogger(__name__)
+
+# Image derivatives: after an image upload, resized WebP/AVIF renditions are
+# rendered in a process pool and stored under images/derived/. They are
+# recorded in `image_derivatives`, keyed by the original's URL, and catalog
+# listings attach them so cards can use a srcset instead of the original.
+# Uploads are content-addressed, so re-uploaded images reuse their renditions.
+
+DERIVED_DIR = "images/derived"
+CONTENT_TYPES = {"webp": "image/webp", "avif": "image/avif"}
+QUALITY = {"webp": 80, "avif": 60}
+# Decompression-bomb guard: a 10 MB upload can still claim huge dimensions
+MAX_PIXELS = 50_000_000
+# A claim older than this belongs to a worker that died mid-render
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+def _render(
+    data: bytes, widths: List[int], formats: List[str]
+) -> Tuple[int, List[Tuple[int, str, bytes]]]:
+    """
+    Runs in the pool. Returns the original width and (width, format, bytes)
+    renditions; images narrower than a target width are never upscaled.
+    """
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+    formats = [fmt for fmt in formats if features.check(fmt)]
+    with Image.open(io.BytesIO(data)) as original:
+        # Only the header is read so far. Pillow itself merely warns below
+        # twice MAX_IMAGE_PIXELS, so the limit is enforced before decoding.
+        if original.width * original.height > MAX_PIXELS:
+            raise ValueError(
+                f"Image too large: {original.width}x{original.height} pixels"
+            )
+        # Apply the EXIF orientation before the metadata is dropped
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            has_alpha = "A" in image.getbands() or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+        source_width = image.width
+        targets = sorted({w for w in widths if w < source_width}) or [source_width]
+
+        renditions = []
+        for width in targets:
+            height = max(1, round(image.height * width / source_width))
+            resized = image.resize((width, height), Image.Resampling.LANCZOS)
+            # No EXIF, ICC or XMP in the output
+            resized.info = {}
+            for fmt in formats:
+                buffer = io.BytesIO()
+                resized.save(buffer, fmt.upper(), quality=QUALITY[fmt])
+                renditions.append((width, fmt, buffer.getvalue()))
+    return source_width, renditions
+
+
+def _is_image_key(key: Optional[str]) -> bool:
+    return bool(key) and key.startswith("images/") and not key.startswith(DERIVED_DIR)
+
+
+async def create_image_indexes(database):
+    await database.image_derivatives.create_index("status")
+
+
+async def attach_derivatives(items: List[dict], field: str, target: str):
+    """Set items[target] to the renditions of the image URL in items[field]"""
+    urls = list({item[field] for item in items if item.get(field)})
+    if not urls:
+        return
+    found = await db.image_derivatives.find(
+        {"_id": {"$in": urls}, "status": "done"}, {"derivatives": 1}
+    ).to_list(None)
+    by_url = {doc["_id"]: doc["derivatives"] for doc in found}
+    for item in items:
+        item[target] = by_url.get(item.get(field), [])
+
+
+class ImageDerivativeWorker:
+    """
+    Renders image derivatives in a bounded process pool, in the background.
+
+    Jobs wait in a bounded queue and `workers` of them render at once; when
+    the queue is full the job is dropped and the original keeps being
+    served. Rendering is idempotent, so a dropped or failed job is simply
+    queued again by the next upload of the same image.
+    """
+
+    def __init__(
+        self, widths: List[int], formats: List[str], workers: int, queue_size: int
+    ):
+        self.widths = sorted(set(widths))
+        self.formats = [fmt for fmt in formats if fmt in CONTENT_TYPES]
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.rendered = 0
+        self.failed = 0
+        self.dropped = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "rendered": self.rendered,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created lazily so each gunicorn worker gets its own pool after fork
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def start(self):
+        if self.running or not self.widths or not self.formats:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+        logger.info("Image derivative worker started")
+
+    async def stop(self):
+        if not self.running:
+            return
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        logger.info(f"Image derivative worker stopped: {self.stats()}")
+
+    async def enqueue(self, storage: StorageService, url: str) -> Optional[List[dict]]:
+        """
+        Queue renditions for an uploaded image. Returns the renditions right
+        away if this image already has them, [] if they are being rendered,
+        and None for a URL that is not an uploaded image.
+        """
+        if not _is_image_key(storage.url_key(url)):
+            return None
+        doc = await db.image_derivatives.find_one(
+            {"_id": url}, {"status": 1, "derivatives": 1}
+        )
+        if doc and doc["status"] == "done":
+            return doc["derivatives"]
+        if not self.running:
+            return []
+        try:
+            self._queue.put_nowait((storage, url))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Image derivative queue full, skipped {url}")
+        return []
+
+    async def _run(self):
+        while True:
+            storage, url = await self._queue.get()
+            try:
+                await self.render(storage, url)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Image derivatives failed for {url}: {e}")
+                await db.image_derivatives.update_one(
+                    {"_id": url}, {"$set": {"status": "failed", "error": str(e)}}
+                )
+
+    async def _claim(self, url: str) -> bool:
+        now = datetime.now(timezone.utc)
+        claimed = await db.image_derivatives.update_one(
+            {
+                "_id": url,
+                "$or": [
+                    {"status": "failed"},
+                    {
+                        "status": "processing",
+                        "claimed_at": {"$lt": now - CLAIM_TIMEOUT},
+                    },
+                ],
+            },
+            {"$set": {"status": "processing", "claimed_at": now}},
+        )
+        if claimed.modified_count:
+            return True
+        # No document yet: the first claim inserts it
+        result = await db.image_derivatives.update_one(
+            {"_id": url},
+            {"$setOnInsert": {"status": "processing", "claimed_at": now}},
+            upsert=True,
+        )
+        return result.upserted_id is not None
+
+    async def render(self, storage: StorageService, url: str) -> List[dict]:
+        """Render, store and record the derivatives of one uploaded image"""
+        if not await self._claim(url):
+            return []
+        key = storage.url_key(url)
+        data = await storage.run_blocking(storage.read_object, key)
+        loop = asyncio.get_running_loop()
+        try:
+            source_width, renditions = await loop.run_in_executor(
+                self._get_executor(), _render, data, self.widths, self.formats
+            )
+        except BrokenProcessPool:
+            logger.error("Image derivative pool died, recreating on next job")
+            self._executor = None
+            raise
+
+        stem = PurePosixPath(key).stem
+        derivatives = []
+        for width, fmt, body in renditions:
+            derived_key = f"{DERIVED_DIR}/{stem}-{width}.{fmt}"
+            await storage.run_blocking(
+                storage.write_object, derived_key, body, CONTENT_TYPES[fmt]
+            )
+            derivatives.append(
+                {
+                    "url": storage.key_url(derived_key),
+                    "width": width,
+                    "format": fmt,
+                    "size": len(body),
+                }
+            )
+
+        await db.image_derivatives.update_one(
+            {"_id": url},
+            {
+                "$set": {
+                    "status": "done",
+                    "source_width": source_width,
+                    "derivatives": derivatives,
+                    "rendered_at": datetime.now(timezone.utc),
+                },
+                "$unset": {"error": ""},
+            },
+        )
+        self.rendered += 1
+        return derivatives
+
+
+image_derivatives = ImageDerivativeWorker(
+    widths=settings.IMAGE_DERIVATIVE_WIDTHS,
+    formats=settings.IMAGE_DERIVATIVE_FORMATS,
+    workers=settings.IMAGE_WORKERS,
+    queue_size=settings.IMAGE_QUEUE_SIZE,
+)
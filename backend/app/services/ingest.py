@@ -0,0 +1,201 @@
+import logging
+from typing import Dict, List, NamedTuple, Optional
+
+from fastapi import HTTPException, Request
+from multipart.exceptions import ParseError
+from multipart.multipart import MultipartParser, parse_options_header
+
+from app.core.config import settings
+from app.services.blobs import store_blob
+from app.services.storage import StorageService, UploadWriter
+
+logger = logging.getLogger(__name__)
+
+# Room for the multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadRule(NamedTuple):
+    directory: str
+    allowed_types: List[str]
+    max_size: int
+    allowed_label: str
+
+
+UPLOAD_RULES: Dict[str, UploadRule] = {
+    "image": UploadRule(
+        "images",
+        ["image/jpeg", "image/png", "image/webp", "image/gif"],
+        settings.MAX_IMAGE_SIZE,
+        "JPEG, PNG, WebP, GIF",
+    ),
+    "video": UploadRule(
+        "videos",
+        ["video/mp4", "video/webm", "video/quicktime"],
+        settings.MAX_VIDEO_SIZE,
+        "MP4, WebM, QuickTime",
+    ),
+    "document": UploadRule(
+        "documents",
+        [
+            "application/pdf",
+            "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+            "application/vnd.ms-powerpoint",
+            "application/msword",
+            "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        ],
+        settings.MAX_DOC_SIZE,
+        "PDF, PPTX, DOCX",
+    ),
+}
+
+
+def too_large(rule: UploadRule) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"File too large. Max size: {rule.max_size // (1024 * 1024)}MB",
+    )
+
+
+class _FilePart:
+    """python-multipart callbacks that pick out the `file` field's bytes"""
+
+    def __init__(self, field_name: str):
+        self.field_name = field_name
+        self.filename: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self.started = False
+        self.finished = False
+        self.data: List[bytes] = []
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_name = b""
+        self._header_value = b""
+        self._in_file = False
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+    def on_part_begin(self):
+        self._headers = {}
+        self._in_file = False
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_name.lower()] = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition"))
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        if name != self.field_name or b"filename" not in options or self.started:
+            return
+        self.started = True
+        self._in_file = True
+        self.filename = options[b"filename"].decode("utf-8", "replace")
+        content_type = self._headers.get(b"content-type", b"")
+        self.content_type = content_type.decode("latin-1").strip()
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self.data.append(data[start:end])
+
+    def on_part_end(self):
+        if self._in_file:
+            self.finished = True
+            self._in_file = False
+
+
+async def ingest_upload(
+    request: Request,
+    storage: StorageService,
+    rule: UploadRule,
+    upload_id: Optional[str] = None,
+    field_name: str = "file",
+) -> dict:
+    """
+    Stream the `file` field of a multipart request straight to storage.
+
+    A declared Content-Length over the limit is rejected before any of the
+    body is read; the type is checked as soon as the part headers arrive;
+    the size is enforced on the bytes actually received, so a chunked or
+    lying body is cut off at the limit. Nothing is spooled to temp files.
+    The file is hashed as it streams and stored at its content address.
+    Returns the same dict as StorageService.upload_file.
+    """
+    declared = request.headers.get("content-length")
+    if declared is not None:
+        if not declared.isdigit():
+            raise HTTPException(status_code=400, detail="Invalid Content-Length")
+        if int(declared) > rule.max_size + MULTIPART_OVERHEAD:
+            raise too_large(rule)
+
+    content_type, params = parse_options_header(request.headers.get("content-type"))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Expected multipart/form-data")
+
+    part = _FilePart(field_name)
+    parser = MultipartParser(params[b"boundary"], part.callbacks())
+    writer: Optional[UploadWriter] = None
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > rule.max_size + MULTIPART_OVERHEAD:
+                raise too_large(rule)
+            parser.write(chunk)
+
+            if part.started and writer is None:
+                if part.content_type not in rule.allowed_types:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Invalid file type. Allowed: {rule.allowed_label}",
+                    )
+                writer = await storage.open_upload(
+                    rule.directory,
+                    part.filename,
+                    part.content_type,
+                    upload_id,
+                    expected_size=int(declared or 0),
+                )
+            if writer is not None:
+                for data in part.data:
+                    if writer.size + len(data) > rule.max_size:
+                        raise too_large(rule)
+                    await writer.write(data)
+            part.data.clear()
+        parser.finalize()
+
+        if writer is None or not part.finished:
+            raise HTTPException(status_code=400, detail="No file uploaded")
+        await writer.close()
+        return await store_blob(
+            storage,
+            writer.key,
+            writer.sha256.hexdigest(),
+            writer.filename,
+            writer.size,
+            writer.content_type,
+        )
+    except ParseError:
+        if writer is not None:
+            await writer.abort()
+        raise HTTPException(status_code=400, detail="Malformed multipart body")
+    except BaseException:
+        # Includes client disconnects and cancellation mid-stream
+        if writer is not None:
+            await writer.abort()
+        raise
@@ -0,0 +1,288 @@
+import asyncio
+import logging
+import shutil
+from datetime import date, datetime, time, timedelta, timezone
+from pathlib import Path
+from typing import List, Optional
+
+import pandas as pd
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from app.core.config import settings
+from app.core.timestamps import as_utc
+from app.db.session import db
+
+logger = logging.getLogger(__name__)
+
+# Access-log retention tiers:
+#   1. raw events in access_logs, kept for ACCESS_LOG_RETENTION_DAYS
+#   2. every closed UTC day exported to zstd Parquet files under
+#      ACCESS_LOG_ARCHIVE_DIR/YYYY/MM/DD/ (one part file per batch)
+#   3. hourly/daily counters in access_log_rollups (app.services.analytics)
+#
+# access_log_archives records which days are done and doubles as a claim, so
+# only one worker exports a given day. Raw events are deleted only once their
+# day is done, never by a TTL index: if archiving fails, events pile up in
+# MongoDB instead of being lost. A day is archived ARCHIVE_LAG after it
+# closes, so events the access-log writer flushes late still make it in.
+
+ARCHIVE_COLUMNS = ["id", "user_id", "content_type", "content_id", "action", "timestamp"]
+CLAIM_TIMEOUT = timedelta(hours=1)
+ARCHIVE_LAG = timedelta(days=1)
+
+
+def archive_root() -> Path:
+    return Path(settings.ACCESS_LOG_ARCHIVE_DIR)
+
+
+def day_dir(day: date) -> Path:
+    return archive_root() / f"{day:%Y}" / f"{day:%m}" / f"{day:%d}"
+
+
+def _day_bounds(day: date):
+    start = datetime.combine(day, time.min, tzinfo=timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+def _day_query(day: date) -> dict:
+    # Events logged before timestamps became BSON dates are ISO strings
+    start, end = _day_bounds(day)
+    return {
+        "$or": [
+            {"timestamp": {"$gte": start, "$lt": end}},
+            {"timestamp": {"$gte": start.isoformat(), "$lt": end.isoformat()}},
+        ]
+    }
+
+
+async def create_archive_indexes(database):
+    """Index on access_logs.timestamp plus the archive manifest index"""
+    try:
+        await database.access_logs.create_index("timestamp")
+    except OperationFailure:
+        # The TTL index of older releases, which could expire unarchived days
+        await database.access_logs.drop_index("timestamp_1")
+        await database.access_logs.create_index("timestamp")
+    await database.access_log_archives.create_index("day", unique=True)
+
+
+def _frame(rows: List[dict]) -> pd.DataFrame:
+    frame = pd.DataFrame(rows, columns=ARCHIVE_COLUMNS)
+    frame["timestamp"] = pd.to_datetime(frame["timestamp"], utc=True, format="mixed")
+    return frame
+
+
+def _write_part(directory: Path, part: int, rows: List[dict]) -> int:
+    directory.mkdir(parents=True, exist_ok=True)
+    _frame(rows).to_parquet(
+        directory / f"part-{part:05d}.parquet", compression="zstd", index=False
+    )
+    return len(rows)
+
+
+async def _claim_day(day: date) -> bool:
+    key = day.isoformat()
+    now = datetime.now(timezone.utc)
+    try:
+        await db.access_log_archives.insert_one(
+            {"day": key, "status": "in_progress", "claimed_at": now}
+        )
+        return True
+    except DuplicateKeyError:
+        pass
+    # Take over a claim left behind by a worker that died mid-export
+    stale = await db.access_log_archives.find_one_and_update(
+        {
+            "day": key,
+            "status": "in_progress",
+            "claimed_at": {"$lt": now - CLAIM_TIMEOUT},
+        },
+        {"$set": {"claimed_at": now}},
+        return_document=ReturnDocument.AFTER,
+    )
+    return stale is not None
+
+
+async def archive_day(day: date, batch_size: Optional[int] = None) -> Optional[int]:
+    """
+    Export one closed UTC day of access_logs to Parquet. Returns the number
+    of events archived, or None if the day is done or claimed elsewhere.
+    """
+    if not await _claim_day(day):
+        return None
+
+    batch_size = batch_size or settings.ACCESS_LOG_ARCHIVE_BATCH_SIZE
+    final_dir = day_dir(day)
+    staging = final_dir.with_name(final_dir.name + ".tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+
+    count = 0
+    part = 0
+    rows = []
+    projection = {"_id": 0, **{c: 1 for c in ARCHIVE_COLUMNS}}
+    try:
+        async for log_doc in db.access_logs.find(_day_query(day), projection).sort(
+            "_id", 1
+        ):
+            rows.append(log_doc)
+            if len(rows) >= batch_size:
+                count += await asyncio.to_thread(_write_part, staging, part, rows)
+                part += 1
+                rows = []
+        if rows:
+            count += await asyncio.to_thread(_write_part, staging, part, rows)
+
+        if staging.exists():
+            shutil.rmtree(final_dir, ignore_errors=True)
+            staging.rename(final_dir)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        await db.access_log_archives.delete_one(
+            {"day": day.isoformat(), "status": "in_progress"}
+        )
+        raise
+
+    await db.access_log_archives.update_one(
+        {"day": day.isoformat()},
+        {
+            "$set": {
+                "status": "done",
+                "count": count,
+                "path": str(final_dir) if count else None,
+                "archived_at": datetime.now(timezone.utc),
+            }
+        },
+    )
+    return count
+
+
+async def _oldest_event_day(today: date) -> Optional[date]:
+    days = []
+    # BSON dates and legacy ISO strings sort separately, so check both
+    for bson_type in ("date", "string"):
+        oldest = await db.access_logs.find_one(
+            {"timestamp": {"$type": bson_type}},
+            {"timestamp": 1},
+            sort=[("timestamp", 1)],
+        )
+        if oldest:
+            days.append(as_utc(oldest["timestamp"]).date())
+    return min(days + [today]) if days else None
+
+
+async def purge_archived_days(retention_days: int) -> int:
+    """
+    Delete the raw events of archived days older than retention_days. Days
+    not marked done are kept however old they are.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    done = await db.access_log_archives.distinct("day", {"status": "done"})
+    deleted = 0
+    for key in done:
+        day = date.fromisoformat(key)
+        if _day_bounds(day)[1] > cutoff:
+            continue
+        result = await db.access_logs.delete_many(_day_query(day))
+        deleted += result.deleted_count
+    return deleted
+
+
+async def archive_closed_days() -> int:
+    """
+    Archive every day closed for at least ARCHIVE_LAG that still has raw
+    events and is not done yet, then purge expired archived days
+    """
+    today = datetime.now(timezone.utc).date()
+    day = await _oldest_event_day(today)
+    if day is None:
+        return 0
+
+    done = set(await db.access_log_archives.distinct("day", {"status": "done"}))
+    archived = 0
+    while day < today - ARCHIVE_LAG:
+        if day.isoformat() not in done:
+            count = await archive_day(day)
+            if count:
+                logger.info(f"Archived {count} access log events for {day}")
+                archived += count
+        day += timedelta(days=1)
+
+    # Not reached when a day fails to archive; _run logs the error
+    await purge_archived_days(settings.ACCESS_LOG_RETENTION_DAYS)
+    return archived
+
+
+def read_archived_access_logs(
+    start: datetime,
+    end: datetime,
+    content_type: Optional[str] = None,
+    content_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    action: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Archived events with start <= timestamp < end, optionally filtered.
+    Only the day directories overlapping the range are read. Blocking; call
+    from a thread inside the event loop.
+    """
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+
+    frames = []
+    day = start.date()
+    while day <= end.date():
+        directory = day_dir(day)
+        if directory.is_dir():
+            frames.append(pd.read_parquet(directory))
+        day += timedelta(days=1)
+    if not frames:
+        return _frame([])
+
+    frame = pd.concat(frames, ignore_index=True)
+    mask = (frame["timestamp"] >= start) & (frame["timestamp"] < end)
+    for column, value in (
+        ("content_type", content_type),
+        ("content_id", content_id),
+        ("user_id", user_id),
+        ("action", action),
+    ):
+        if value is not None:
+            mask &= frame[column] == value
+    return frame[mask].sort_values("timestamp", ignore_index=True)
+
+
+class AccessLogArchiver:
+    """Runs archive_closed_days at startup and then every `interval` seconds"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await archive_closed_days()
+            except Exception as e:
+                logger.error(f"Access log archival failed: {e}")
+            await asyncio.sleep(self.interval)
+
+
+access_log_archiver = AccessLogArchiver(
+    interval=settings.ACCESS_LOG_ARCHIVE_INTERVAL_SECONDS
+)
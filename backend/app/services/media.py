@@ -0,0 +1,242 @@
+import hashlib
+import hmac
+import logging
+import mimetypes
+import os
+import stat
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import settings
+from app.services.storage import COPY_CHUNK_SIZE, IMMUTABLE_CACHE_CONTROL
+
+logger = logging.getLogger(__name__)
+
+# Serving /uploads. Every stored name is unique (a uuid or a content hash),
+# so public files are cached as immutable. Video seeking needs byte ranges.
+# Behind frontend/nginx.conf the worker only checks access and answers with
+# X-Accel-Redirect; nginx then sends the file itself. Files under a private
+# directory (assignment submissions) are only served for a URL signed by
+# sign_media_url, which expires after MEDIA_SIGNED_URL_TTL_SECONDS.
+
+MEDIA_URL_PREFIX = "/uploads/"
+PRIVATE_DIRS = ("assignments/",)
+
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("image/avif", ".avif")
+mimetypes.add_type("application/vnd.apple.mpegurl", ".m3u8")
+mimetypes.add_type("video/mp2t", ".ts")
+
+
+def _signing_key() -> bytes:
+    # Derived, so a media signature can never pass as anything else
+    return hashlib.sha256(b"media-url:" + settings.JWT_SECRET.encode()).digest()
+
+
+def _signature(path: str, expires: int) -> str:
+    message = f"{path}\n{expires}".encode()
+    return hmac.new(_signing_key(), message, hashlib.sha256).hexdigest()
+
+
+def is_private(path: str) -> bool:
+    return path.startswith(PRIVATE_DIRS)
+
+
+def sign_media_url(url: Optional[str], ttl: Optional[int] = None) -> Optional[str]:
+    """Short-lived URL for a private upload; other URLs are returned as is"""
+    if not url or not url.startswith(MEDIA_URL_PREFIX):
+        return url
+    start = len(MEDIA_URL_PREFIX)
+    path = url[start:]
+    if not is_private(path):
+        return url
+    expires = int(time.time()) + (ttl or settings.MEDIA_SIGNED_URL_TTL_SECONDS)
+    return f"{url}?expires={expires}&sig={_signature(path, expires)}"
+
+
+def with_signed_file(doc: Optional[dict], field: str = "file_url") -> Optional[dict]:
+    """Sign doc[field] in place, for API responses carrying a private upload"""
+    if doc and doc.get(field):
+        doc[field] = sign_media_url(doc[field])
+    return doc
+
+
+def _signed_expiry(path: str, request: Request) -> Optional[int]:
+    """Seconds the request's signature stays valid for, or None if invalid"""
+    expires = request.query_params.get("expires", "")
+    signature = request.query_params.get("sig", "")
+    if not expires.isdigit():
+        return None
+    remaining = int(expires) - int(time.time())
+    if remaining <= 0:
+        return None
+    if not hmac.compare_digest(signature, _signature(path, int(expires))):
+        return None
+    return remaining
+
+
+def _etag(st: os.stat_result) -> str:
+    # Same format as nginx, so offloaded and direct responses agree
+    return f'"{int(st.st_mtime):x}-{st.st_size:x}"'
+
+
+def _byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) inclusive for a single `bytes=` range; None to ignore the
+    header and send the whole file. Raises ValueError if unsatisfiable.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash or not (first.isdigit() or last.isdigit()):
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if start >= size:
+        raise ValueError(header)
+    end = int(last) if last.isdigit() else size - 1
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+class MediaFiles:
+    """
+    ASGI app for the uploads directory, used in place of StaticFiles.
+
+    Adds single-range requests (206/416), ETag / If-None-Match, immutable
+    Cache-Control, signed access to private directories and, when
+    MEDIA_ACCEL_REDIRECT_PREFIX is set, X-Accel-Redirect offload to nginx.
+    """
+
+    def __init__(self, directory: Path, accel_prefix: Optional[str] = None):
+        self.directory = Path(directory).resolve()
+        if accel_prefix is None:
+            accel_prefix = settings.MEDIA_ACCEL_REDIRECT_PREFIX
+        self.accel_prefix = accel_prefix.rstrip("/") + "/" if accel_prefix else ""
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        assert scope["type"] == "http"
+        request = Request(scope, receive)
+        response = await self.get_response(request)
+        await response(scope, receive, send)
+
+    def _relative_path(self, scope: Scope) -> Optional[str]:
+        start = len(scope.get("root_path", ""))
+        route_path = scope["path"][start:]
+        parts = [part for part in route_path.split("/") if part]
+        # No traversal, no dotfiles (this also hides .partial uploads)
+        if not parts or any(part.startswith(".") for part in parts):
+            return None
+        return "/".join(parts)
+
+    def _stat(self, path: str) -> Optional[os.stat_result]:
+        full_path = os.path.realpath(self.directory / path)
+        if not full_path.startswith(str(self.directory) + os.sep):
+            return None
+        try:
+            st = os.stat(full_path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return st if stat.S_ISREG(st.st_mode) else None
+
+    async def get_response(self, request: Request) -> Response:
+        if request.method not in ("GET", "HEAD"):
+            return JSONResponse({"detail": "Method Not Allowed"}, status_code=405)
+        path = self._relative_path(request.scope)
+        st = await anyio.to_thread.run_sync(self._stat, path) if path else None
+        if st is None:
+            return JSONResponse({"detail": "Not Found"}, status_code=404)
+
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": _etag(st),
+            "last-modified": formatdate(st.st_mtime, usegmt=True),
+            "cache-control": IMMUTABLE_CACHE_CONTROL,
+        }
+        if is_private(path):
+            remaining = _signed_expiry(path, request)
+            if remaining is None:
+                return JSONResponse(
+                    {"detail": "Link expired or invalid"}, status_code=403
+                )
+            headers["cache-control"] = f"private, max-age={remaining}"
+            # Never render user-submitted files (HTML, SVG) on this origin
+            headers["content-disposition"] = "attachment"
+
+        if self._not_modified(request, headers["etag"], st):
+            return Response(status_code=304, headers=headers)
+
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if self.accel_prefix:
+            # nginx serves the bytes, including ranges and conditionals
+            headers["x-accel-redirect"] = quote(self.accel_prefix + path)
+            return Response(headers=headers, media_type=media_type)
+
+        size = st.st_size
+        start, end = 0, size - 1
+        status_code = 200
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        if range_header and size and (if_range is None or if_range == headers["etag"]):
+            try:
+                byte_range = _byte_range(range_header, size)
+            except ValueError:
+                return Response(
+                    status_code=416,
+                    headers={**headers, "content-range": f"bytes */{size}"},
+                )
+            if byte_range:
+                start, end = byte_range
+                status_code = 206
+                headers["content-range"] = f"bytes {start}-{end}/{size}"
+
+        headers["content-length"] = str(end - start + 1)
+        if request.method == "HEAD":
+            return Response(
+                status_code=status_code, headers=headers, media_type=media_type
+            )
+        return StreamingResponse(
+            self._read(self.directory / path, start, end - start + 1),
+            status_code=status_code,
+            headers=headers,
+            media_type=media_type,
+        )
+
+    def _not_modified(self, request: Request, etag: str, st: os.stat_result) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            return etag in tags or "*" in tags
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(st.st_mtime) <= since
+        return False
+
+    async def _read(self, path: Path, start: int, length: int):
+        async with await anyio.open_file(path, "rb") as f:
+            await f.seek(start)
+            while length > 0:
+                chunk = await f.read(min(COPY_CHUNK_SIZE, length))
+                if not chunk:
+                    break
+                length -= len(chunk)
+                yield chunk
@@ -1,11 +1,28 @@
+import asyncio
 import logging
 import uuid
-from datetime import datetime, timezone
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
 
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from app.core.config import settings
+from app.core.security import load_user
 from app.db.session import db
 
 logger = logging.getLogger(__name__)
 
+# Only what progress evaluation needs, not the full module/quiz tree
+COURSE_PROGRESS_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "title": 1,
+    "modules.id": 1,
+    "tests.id": 1,
+}
+
 
 def generate_certificate_number():
     """Generate unique certificate number like PS-2026-XXXX"""
@@ -14,68 +31,566 @@ def generate_certificate_number():
     return f"PS-{year}-{random_part}"
 
 
+def modules_progress_map(progress_doc: dict) -> Dict[str, dict]:
+    """
+    modules_progress keyed by module_id. Docs written before the map form
+    store a list of entries; those are converted on read.
+    """
+    modules_progress = progress_doc.get("modules_progress") or {}
+    if isinstance(modules_progress, dict):
+        return modules_progress
+
+    by_module = {}
+    for entry in modules_progress:
+        module_id = entry.get("module_id")
+        if not module_id:
+            continue
+        merged = by_module.setdefault(module_id, {**entry, "time_spent_minutes": 0})
+        merged["completed"] = merged.get("completed") or entry.get("completed", False)
+        merged["completed_at"] = merged.get("completed_at") or entry.get("completed_at")
+        merged["time_spent_minutes"] += entry.get("time_spent_minutes", 0)
+    return by_module
+
+
+def modules_progress_list(progress_doc: dict) -> List[dict]:
+    """List form of modules_progress, as returned by the API"""
+    return list(modules_progress_map(progress_doc).values())
+
+
+def evaluate_progress(
+    course: dict,
+    progress_doc: dict,
+    required_assignment_ids: Iterable[str],
+    graded_assignment_ids: Iterable[str],
+) -> dict:
+    """
+    Pure progress evaluation over already-loaded documents.
+
+    Every module, the course quiz (if any) and every required assignment
+    count as one item each. Certificate eligibility requires all of them.
+    """
+    total_items = 0
+    completed_items = 0
+
+    # Modules
+    modules = course.get("modules", [])
+    modules_progress = modules_progress_map(progress_doc)
+    completed_modules = sum(
+        1 for m in modules if modules_progress.get(m["id"], {}).get("completed", False)
+    )
+    total_items += len(modules)
+    completed_items += completed_modules
+
+    # Quiz - only if course has tests
+    has_quiz = bool(course.get("tests"))
+    quiz_progress = progress_doc.get("quiz_progress") or {}
+    quiz_passed = bool(quiz_progress.get("passed"))
+    quiz_score = 0
+    if has_quiz:
+        quiz_score = quiz_progress.get("best_score", 0) if quiz_passed else 0
+        total_items += 1
+        completed_items += 1 if quiz_passed else 0
+
+    # Required assignments with a grade
+    required = set(required_assignment_ids)
+    graded = required & set(graded_assignment_ids)
+    total_items += len(required)
+    completed_items += len(graded)
+
+    progress = (completed_items / total_items * 100) if total_items > 0 else 0
+
+    return {
+        "progress": round(progress, 1),
+        "completed": progress >= 100,
+        "completed_modules": completed_modules,
+        "total_modules": len(modules),
+        "quiz_passed": quiz_passed,
+        "quiz_score": quiz_score,
+        "graded_assignments": len(graded),
+        "required_assignments": len(required),
+        "certificate_eligible": completed_modules == len(modules)
+        and (quiz_passed or not has_quiz)
+        and len(graded) == len(required),
+    }
+
+
+async def evaluate_courses_progress(
+    user_id: str,
+    course_ids: List[str],
+    courses: Optional[List[dict]] = None,
+    progress_docs: Optional[List[dict]] = None,
+) -> Dict[str, dict]:
+    """
+    Evaluate a learner's progress in many courses at once.
+
+    Runs at most four queries whatever the number of courses or assignments:
+    courses and progress docs by $in (skipped when passed in), required
+    assignments by $in, and graded submissions by $in.
+
+    Returns {course_id: evaluation}; courses without a course or progress
+    doc are left out.
+    """
+    if not course_ids:
+        return {}
+
+    if courses is None:
+        courses = await db.courses.find(
+            {"id": {"$in": course_ids}}, COURSE_PROGRESS_PROJECTION
+        ).to_list(None)
+    if progress_docs is None:
+        progress_docs = await db.course_progress.find(
+            {"user_id": user_id, "course_id": {"$in": course_ids}}, {"_id": 0}
+        ).to_list(None)
+
+    courses_by_id = {c["id"]: c for c in courses}
+    progress_by_course = {p["course_id"]: p for p in progress_docs}
+    course_ids = [cid for cid in course_ids if cid in progress_by_course]
+
+    required_by_course = defaultdict(list)
+    async for assignment in db.assignments.find(
+        {"course_id": {"$in": course_ids}, "is_required": True},
+        {"_id": 0, "id": 1, "course_id": 1},
+    ):
+        required_by_course[assignment["course_id"]].append(assignment["id"])
+
+    required_ids = [aid for ids in required_by_course.values() for aid in ids]
+    graded_ids = set()
+    if required_ids:
+        graded_ids = set(
+            await db.submissions.distinct(
+                "assignment_id",
+                {
+                    "assignment_id": {"$in": required_ids},
+                    "user_id": user_id,
+                    "grade": {"$ne": None},
+                },
+            )
+        )
+
+    evaluations = {}
+    for course_id in course_ids:
+        course = courses_by_id.get(course_id)
+        if not course:
+            continue
+        evaluation = evaluate_progress(
+            course,
+            progress_by_course[course_id],
+            required_by_course[course_id],
+            graded_ids,
+        )
+        evaluation["course_title"] = course.get("title", "")
+        evaluations[course_id] = evaluation
+    return evaluations
+
+
+async def evaluate_course_progress(
+    user_id: str,
+    course_id: str,
+    course: Optional[dict] = None,
+    progress_doc: Optional[dict] = None,
+) -> Optional[dict]:
+    """
+    Evaluate a learner's progress in one course with a fixed number of
+    queries (see evaluate_courses_progress).
+
+    Returns None if the course or progress doc does not exist.
+    """
+    evaluations = await evaluate_courses_progress(
+        user_id,
+        [course_id],
+        courses=[course] if course else None,
+        progress_docs=[progress_doc] if progress_doc else None,
+    )
+    return evaluations.get(course_id)
+
+
 async def calculate_course_progress(user_id: str, course_id: str) -> dict:
     """Calculate overall course progress including modules, quiz, and assignments"""
-    course = await db.courses.find_one({"id": course_id}, {"_id": 0})
-    if not course:
+    evaluation = await evaluate_course_progress(user_id, course_id)
+    if not evaluation:
         return {"progress": 0, "completed": False}
+    return {"progress": evaluation["progress"], "completed": evaluation["completed"]}
 
-    progress_doc = await db.course_progress.find_one(
-        {"user_id": user_id, "course_id": course_id}, {"_id": 0}
+
+# ─── Materialized counters ────────────────────────────────────
+#
+# course_progress docs carry completed_modules, quiz_passed and
+# graded_required_assignments, updated atomically by the write paths, plus
+# the overall_progress/completed values derived from them. Reads use the
+# stored values; ProgressReconciler repairs drift (e.g. after a course edit).
+
+COUNTER_FIELDS = ("completed_modules", "quiz_passed", "graded_required_assignments")
+
+
+async def get_course_totals(course: dict) -> dict:
+    """Denominators for overall_progress: modules, quiz and required assignments"""
+    required = await db.assignments.count_documents(
+        {"course_id": course["id"], "is_required": True}
     )
+    return {
+        "modules": len(course.get("modules", [])),
+        "quiz": bool(course.get("tests")),
+        "assignments": required,
+    }
 
-    if not progress_doc:
-        return {"progress": 0, "completed": False}
 
-    total_items = 0
-    completed_items = 0
+def progress_from_counters(doc: dict, totals: dict) -> float:
+    """Same weighting as evaluate_progress, computed from stored counters"""
+    modules = min(doc.get("completed_modules") or 0, totals["modules"])
+    quiz = 1 if totals["quiz"] and doc.get("quiz_passed") else 0
+    graded = min(doc.get("graded_required_assignments") or 0, totals["assignments"])
+    total_items = totals["modules"] + (1 if totals["quiz"] else 0)
+    total_items += totals["assignments"]
+    if total_items == 0:
+        return 0
+    return round((modules + quiz + graded) / total_items * 100, 1)
 
-    # Module completion (50% weight)
-    modules = course.get("modules", [])
-    if modules:
-        total_items += len(modules)
-        modules_progress = {
-            m["module_id"]: m for m in progress_doc.get("modules_progress", [])
+
+def counters_from_evaluation(evaluation: dict) -> dict:
+    return {
+        "completed_modules": evaluation["completed_modules"],
+        "quiz_passed": evaluation["quiz_passed"],
+        "graded_required_assignments": evaluation["graded_assignments"],
+        "overall_progress": evaluation["progress"],
+        "completed": evaluation["completed"],
+    }
+
+
+async def store_evaluation(user_id: str, course_id: str, evaluation: dict) -> dict:
+    """Persist a full evaluation as the progress doc's counters"""
+    counters = counters_from_evaluation(evaluation)
+    await db.course_progress.update_one(
+        {"user_id": user_id, "course_id": course_id}, {"$set": counters}
+    )
+    return counters
+
+
+async def update_progress_counters(
+    user_id: str, course_id: str, update: dict, totals: dict
+) -> Optional[dict]:
+    """
+    Apply `update` (which may $inc/$set counter fields alongside the raw
+    progress change) in one atomic write, then refresh overall_progress.
+
+    overall_progress is only written if no concurrent update changed the
+    counters in between; that update refreshes it instead. Progress docs
+    created before the counters existed are rebuilt from source data.
+
+    Returns the stored counters, or None if there is no progress doc.
+    """
+    key = {"user_id": user_id, "course_id": course_id}
+    projection = {"_id": 0, "completed_at": 1, **{f: 1 for f in COUNTER_FIELDS}}
+
+    if update:
+        doc = await db.course_progress.find_one_and_update(
+            {**key, "completed_modules": {"$exists": True}},
+            update,
+            projection=projection,
+            return_document=ReturnDocument.AFTER,
+        )
+    else:
+        doc = await db.course_progress.find_one(
+            {**key, "completed_modules": {"$exists": True}}, projection
+        )
+
+    if doc is None:
+        # No counters yet: apply the raw change only, then rebuild them
+        raw = dict(update)
+        raw_inc = {
+            k: v for k, v in raw.pop("$inc", {}).items() if k not in COUNTER_FIELDS
         }
-        completed_items += sum(
-            1
-            for m in modules
-            if modules_progress.get(m["id"], {}).get("completed", False)
+        if raw_inc:
+            raw["$inc"] = raw_inc
+        if raw:
+            result = await db.course_progress.update_one(key, raw)
+            if result.matched_count == 0:
+                return None
+        evaluation = await evaluate_course_progress(user_id, course_id)
+        if not evaluation:
+            return None
+        return await store_evaluation(user_id, course_id, evaluation)
+
+    overall = progress_from_counters(doc, totals)
+    derived = {"overall_progress": overall, "completed": overall >= 100}
+    if derived["completed"] and not doc.get("completed_at"):
+        derived["completed_at"] = datetime.now(timezone.utc)
+
+    await db.course_progress.update_one(
+        {**key, **{f: doc.get(f) for f in COUNTER_FIELDS}}, {"$set": derived}
+    )
+    return {**{f: doc.get(f) for f in COUNTER_FIELDS}, **derived}
+
+
+# ============== MODULE PROGRESS ==============
+# modules_progress is a map keyed by module_id, so completing a module is a
+# single $set/$inc on its own path instead of rewriting the whole list.
+
+
+async def convert_modules_progress(progress_doc: dict) -> bool:
+    """
+    Rewrite a list-form modules_progress as a map. Only applied if the list
+    is unchanged since it was read; returns False if nothing was converted.
+    """
+    modules_progress = progress_doc.get("modules_progress")
+    if not isinstance(modules_progress, list):
+        return False
+    result = await db.course_progress.update_one(
+        {"_id": progress_doc["_id"], "modules_progress": modules_progress},
+        {"$set": {"modules_progress": modules_progress_map(progress_doc)}},
+    )
+    return result.modified_count > 0
+
+
+async def migrate_modules_progress(batch_size: int = 500) -> int:
+    """Convert every list-form modules_progress to a map, in batches"""
+    converted = 0
+    last_id = None
+    while True:
+        query = {"modules_progress": {"$type": "array"}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        docs = (
+            await db.course_progress.find(query, {"modules_progress": 1})
+            .sort("_id", 1)
+            .limit(batch_size)
+            .to_list(batch_size)
+        )
+        if not docs:
+            return converted
+        last_id = docs[-1]["_id"]
+
+        ops = [
+            UpdateOne(
+                {"_id": doc["_id"], "modules_progress": doc["modules_progress"]},
+                {"$set": {"modules_progress": modules_progress_map(doc)}},
+            )
+            for doc in docs
+        ]
+        result = await db.course_progress.bulk_write(ops, ordered=False)
+        converted += result.modified_count
+
+
+async def _apply_module_completion(key: dict, path: str, update: dict) -> bool:
+    """
+    Apply a module completion `update`. If the module was not complete yet,
+    completed_modules is incremented in the same atomic write; a module that
+    already was only gets the update. Returns False if there is no progress
+    doc.
+    """
+    counted = {**update, "$inc": {**update["$inc"], "completed_modules": 1}}
+    doc = await db.course_progress.find_one_and_update(
+        {
+            **key,
+            f"{path}.completed": {"$ne": True},
+            # Docs without counters are rebuilt by update_progress_counters
+            "completed_modules": {"$exists": True},
+        },
+        counted,
+        projection={"_id": 1},
+    )
+    if doc is None:
+        doc = await db.course_progress.find_one_and_update(
+            key, update, projection={"_id": 1}
+        )
+    return doc is not None
+
+
+async def complete_module(
+    user_id: str,
+    course_id: str,
+    module_id: str,
+    time_spent_minutes: int,
+    totals: dict,
+) -> Optional[dict]:
+    """
+    Mark a module complete, add its time spent and count it in
+    completed_modules in one atomic write.
+
+    The write only counts the module if its `completed` flag was not set
+    yet, so concurrent completions of the same module count once; a repeat
+    completion just adds its time. Returns the stored counters, or None if
+    there is no progress doc.
+    """
+    key = {"user_id": user_id, "course_id": course_id}
+    path = f"modules_progress.{module_id}"
+    now = datetime.now(timezone.utc)
+    update = {
+        "$set": {
+            f"{path}.module_id": module_id,
+            f"{path}.completed": True,
+            f"{path}.completed_at": now,
+            "last_accessed": now,
+        },
+        "$inc": {f"{path}.time_spent_minutes": time_spent_minutes},
+    }
+
+    try:
+        found = await _apply_module_completion(key, path, update)
+    except OperationFailure:
+        # List-form modules_progress not migrated yet: convert, then retry
+        doc = await db.course_progress.find_one(key, {"modules_progress": 1})
+        if not doc or not await convert_modules_progress(doc):
+            raise
+        found = await _apply_module_completion(key, path, update)
+    if not found:
+        return None
+    # Refresh overall_progress from the new counters
+    return await update_progress_counters(user_id, course_id, {}, totals)
+
+
+async def reconcile_course_progress(course: dict, batch_size: int = 500) -> int:
+    """
+    Recompute the counters of every progress doc in a course from source
+    data and fix the ones that drifted. Returns the number of docs repaired.
+    """
+    course_id = course["id"]
+    required_ids = await db.assignments.distinct(
+        "id", {"course_id": course_id, "is_required": True}
+    )
+
+    repaired = 0
+    last_id = None
+    while True:
+        query = {"course_id": course_id}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        docs = (
+            await db.course_progress.find(query)
+            .sort("_id", 1)
+            .limit(batch_size)
+            .to_list(batch_size)
         )
+        if not docs:
+            return repaired
+        last_id = docs[-1]["_id"]
 
-    # Quiz completion (30% weight) - only if course has tests
-    tests = course.get("tests", [])
-    if tests:
-        total_items += 1  # Quiz counts as 1 item
-        quiz_progress = progress_doc.get("quiz_progress")
-        if quiz_progress and quiz_progress.get("passed"):
-            completed_items += 1
-
-    # Assignment completion (20% weight)
-    assignments = await db.assignments.find(
-        {"course_id": course_id, "is_required": True}
-    ).to_list(100)
-    if assignments:
-        total_items += len(assignments)
-        for assignment in assignments:
-            submission = await db.submissions.find_one(
+        graded_by_user = defaultdict(set)
+        if required_ids:
+            async for sub in db.submissions.find(
                 {
-                    "assignment_id": assignment["id"],
-                    "user_id": user_id,
+                    "assignment_id": {"$in": required_ids},
+                    "user_id": {"$in": [d["user_id"] for d in docs]},
                     "grade": {"$ne": None},
-                }
+                },
+                {"_id": 0, "assignment_id": 1, "user_id": 1},
+            ):
+                graded_by_user[sub["user_id"]].add(sub["assignment_id"])
+
+        ops = []
+        for doc in docs:
+            evaluation = evaluate_progress(
+                course, doc, required_ids, graded_by_user[doc["user_id"]]
             )
-            if submission:
-                completed_items += 1
+            counters = counters_from_evaluation(evaluation)
+            if any(doc.get(k) != v for k, v in counters.items()):
+                # Skip docs whose counters moved since we read them
+                unchanged = {f: doc.get(f) for f in COUNTER_FIELDS}
+                ops.append(
+                    UpdateOne({"_id": doc["_id"], **unchanged}, {"$set": counters})
+                )
+        if ops:
+            await db.course_progress.bulk_write(ops, ordered=False)
+            repaired += len(ops)
 
-    progress = (completed_items / total_items * 100) if total_items > 0 else 0
-    completed = progress >= 100
 
-    return {"progress": round(progress, 1), "completed": completed}
+async def reconcile_all_progress() -> int:
+    repaired = 0
+    async for course in db.courses.find({}, COURSE_PROGRESS_PROJECTION):
+        repaired += await reconcile_course_progress(course)
+    if repaired:
+        logger.info(f"Progress reconciler repaired {repaired} progress docs")
+    return repaired
+
 
+# One reconciliation per interval across all workers, as for the upload GC
+LEASE_ID = "progress_reconciler"
+# A worker that dies mid-run leaves its lease "running"; after this long
+# another worker may take it over
+CLAIM_TIMEOUT = timedelta(hours=1)
+POLL_SECONDS = 60
 
-async def check_and_issue_certificate(user_id: str, course_id: str):
-    """Check if user qualifies for certificate and issue if so"""
+
+async def _claim_run(interval: float) -> bool:
+    """One reconciliation per interval across all workers"""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.progress_reconciler.insert_one(
+            {"_id": LEASE_ID, "status": "running", "claimed_at": now}
+        )
+        return True
+    except DuplicateKeyError:
+        pass
+    claimed = await db.progress_reconciler.update_one(
+        {
+            "_id": LEASE_ID,
+            "$or": [
+                {
+                    "status": "done",
+                    "claimed_at": {"$lt": now - timedelta(seconds=interval)},
+                },
+                {"status": "running", "claimed_at": {"$lt": now - CLAIM_TIMEOUT}},
+            ],
+        },
+        {"$set": {"status": "running", "claimed_at": now}},
+    )
+    return claimed.modified_count == 1
+
+
+class ProgressReconciler:
+    """
+    Runs reconcile_all_progress every `interval` seconds. Every worker wakes
+    up on that schedule, but the lease in `progress_reconciler` lets only one
+    of them run.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                if await _claim_run(self.interval):
+                    await self._reconcile()
+            except Exception as e:
+                logger.error(f"Progress reconciliation failed: {e}")
+            await asyncio.sleep(min(self.interval, POLL_SECONDS))
+
+    async def _reconcile(self):
+        try:
+            await reconcile_all_progress()
+        finally:
+            # A failed run is retried next interval, not after CLAIM_TIMEOUT
+            await db.progress_reconciler.update_one(
+                {"_id": LEASE_ID}, {"$set": {"status": "done"}}
+            )
+
+
+progress_reconciler = ProgressReconciler(interval=settings.PROGRESS_RECONCILE_SECONDS)
+
+
+async def check_and_issue_certificate(
+    user_id: str, course_id: str, evaluation: Optional[dict] = None
+):
+    """
+    Check if user qualifies for certificate and issue if so.
+
+    Pass the result of evaluate_course_progress when the caller already has
+    it, so the same request does not evaluate the course twice.
+    """
     # Check if certificate already exists
     existing_cert = await db.certificates.find_one(
         {"user_id": user_id, "course_id": course_id}, {"_id": 0}
@@ -83,73 +598,32 @@ async def check_and_issue_certificate(user_id: str, course_id: str):
     if existing_cert:
         return existing_cert
 
-    # Get course and progress
-    course = await db.courses.find_one({"id": course_id}, {"_id": 0})
-    if not course:
-        return None
-
-    progress_doc = await db.course_progress.find_one(
-        {"user_id": user_id, "course_id": course_id}, {"_id": 0}
-    )
-    if not progress_doc:
+    if evaluation is None:
+        evaluation = await evaluate_course_progress(user_id, course_id)
+    if not evaluation or not evaluation["certificate_eligible"]:
         return None
 
-    # Check all modules completed
-    modules = course.get("modules", [])
-    if modules:
-        modules_progress = {
-            m["module_id"]: m for m in progress_doc.get("modules_progress", [])
-        }
-        all_modules_complete = all(
-            modules_progress.get(m["id"], {}).get("completed", False) for m in modules
-        )
-        if not all_modules_complete:
-            return None
-
-    # Check quiz passed (if exists)
-    quiz_score = 0
-    tests = course.get("tests", [])
-    if tests:
-        quiz_progress = progress_doc.get("quiz_progress")
-        if not quiz_progress or not quiz_progress.get("passed"):
-            return None
-        quiz_score = quiz_progress.get("best_score", 0)
-
-    # Check required assignments graded
-    assignments = await db.assignments.find(
-        {"course_id": course_id, "is_required": True}
-    ).to_list(100)
-    for assignment in assignments:
-        submission = await db.submissions.find_one(
-            {
-                "assignment_id": assignment["id"],
-                "user_id": user_id,
-                "grade": {"$ne": None},
-            }
-        )
-        if not submission:
-            return None
-
     # Issue certificate
-    user = await db.users.find_one({"id": user_id}, {"_id": 0})
+    user = await load_user(user_id)
     if not user:
         return None
 
-    now = datetime.now(timezone.utc).isoformat()
+    now = datetime.now(timezone.utc)
     cert_doc = {
         "id": str(uuid.uuid4()),
         "certificate_number": generate_certificate_number(),
         "user_id": user_id,
         "course_id": course_id,
         "user_name": f"{user['first_name']} {user['last_name']}",
-        "course_title": course["title"],
+        "course_title": evaluation["course_title"],
         "issued_at": now,
-        "quiz_score": quiz_score,
+        "quiz_score": evaluation["quiz_score"],
         "completion_date": now,
         "pdf_url": None,
     }
 
     await db.certificates.insert_one(cert_doc)
+    cert_doc.pop("_id", None)
 
     logger.info(
         f"Certificate issued: {cert_doc['certificate_number']} for user {user_id}"
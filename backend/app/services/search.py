@@ -0,0 +1,94 @@
+import html
+import re
+from typing import Dict, Iterable, List
+
+# Weighted fields of each collection's text index, created by init_db.
+# A collection can only have one text index, so it is named explicitly.
+TEXT_INDEX_NAME = "search_text"
+TEXT_INDEX_WEIGHTS: Dict[str, Dict[str, int]] = {
+    "courses": {"title": 10, "category": 5, "description": 2},
+    "labs": {"title": 10, "topic": 5, "description": 2},
+    "workshops": {"title": 10, "tags": 5, "description": 2},
+}
+
+# Fields snippets are cut from, in display order
+HIGHLIGHT_FIELDS = ("title", "description")
+SNIPPET_CHARS = 160
+
+SCORE_PROJECTION = {"score": {"$meta": "textScore"}}
+SCORE_SORT = [("score", {"$meta": "textScore"})]
+
+
+async def create_text_indexes(db):
+    for collection, weights in TEXT_INDEX_WEIGHTS.items():
+        await db[collection].create_index(
+            [(field, "text") for field in weights],
+            weights=weights,
+            name=TEXT_INDEX_NAME,
+            default_language="english",
+        )
+
+
+def text_query(search: str) -> dict:
+    """Query fragment matching `search` against the collection's text index"""
+    return {"$text": {"$search": search}}
+
+
+def search_terms(search: str) -> List[str]:
+    """Words to highlight: quoted phrases are split, negated words dropped"""
+    terms = []
+    for word in re.findall(r"-?\w+", search.replace('"', " ")):
+        if not word.startswith("-") and word.lower() not in terms:
+            terms.append(word.lower())
+    return terms
+
+
+def highlight(text: str, terms: Iterable[str], max_chars: int = SNIPPET_CHARS):
+    """
+    HTML-escaped snippet of `text` around the first matching term, with every
+    match wrapped in <mark>. Terms match word prefixes, so "course" also
+    marks "courses" the way the stemmed text index matched it.
+
+    Returns None if no term occurs in `text`.
+    """
+    terms = [t for t in terms if t]
+    if not text or not terms:
+        return None
+    pattern = re.compile(
+        r"\b(?:" + "|".join(re.escape(t) for t in terms) + r")\w*", re.IGNORECASE
+    )
+    first = pattern.search(text)
+    if not first:
+        return None
+
+    start = max(0, first.start() - max_chars // 4)
+    end = min(len(text), start + max_chars)
+    window = text[start:end]
+
+    parts = []
+    last = 0
+    for match in pattern.finditer(window):
+        found = match.start()
+        parts.append(html.escape(window[last:found]))
+        parts.append(f"<mark>{html.escape(match.group())}</mark>")
+        last = match.end()
+    parts.append(html.escape(window[last:]))
+
+    snippet = "".join(parts)
+    if start > 0:
+        snippet = "…" + snippet
+    if end < len(text):
+        snippet += "…"
+    return snippet
+
+
+def add_highlights(items: List[dict], search: str) -> List[dict]:
+    """Attach a `highlights` map of field -> snippet to each search result"""
+    terms = search_terms(search)
+    for item in items:
+        item["highlights"] = {
+            field: snippet
+            for field in HIGHLIGHT_FIELDS
+            if (snippet := highlight(item.get(field) or "", terms))
+        }
+    return items
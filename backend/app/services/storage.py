@@ -1,36 +1,160 @@
+import asyncio
+import base64
+import hashlib
 import logging
 import os
-import shutil
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import partial
 from pathlib import Path
+from typing import Optional
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import NoCredentialsError
 from fastapi import HTTPException, UploadFile
 
+from app.core.config import settings
+from app.db.session import db
+
 logger = logging.getLogger(__name__)
 
+MB = 1024 * 1024
+COPY_CHUNK_SIZE = 1 * MB
+# Stored names are unique (uuid or content hash), so a URL never changes meaning
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# How often the progress of an upload in flight is saved to upload_progress
+PROGRESS_SAVE_SECONDS = 1.0
+
+
+async def create_upload_progress_indexes(database):
+    # Progress of finished (or abandoned) uploads is kept for a while only
+    await database.upload_progress.create_index(
+        "updated_at", expireAfterSeconds=settings.STORAGE_PROGRESS_TTL_SECONDS
+    )
+
+
+async def load_progress(upload_id: str) -> Optional[dict]:
+    return await db.upload_progress.find_one(
+        {"_id": upload_id}, {"_id": 0, "updated_at": 0}
+    )
+
+
+class UploadProgress:
+    """
+    Bytes transferred so far for one upload, fed from transfer threads.
+    Uploads started with an upload id are saved to upload_progress, so any
+    worker can report on them.
+    """
+
+    def __init__(self, upload_id: Optional[str], filename: str, size: int):
+        self.upload_id = upload_id
+        self.filename = filename
+        self.size = size
+        self.transferred = 0
+        self.status = "queued"
+        self._lock = threading.Lock()
+        self._saved_at = 0.0
+
+    def __call__(self, bytes_amount: int):
+        # boto3 transfer callback; parts of one upload report concurrently
+        with self._lock:
+            self.transferred += bytes_amount
+
+    def to_dict(self) -> dict:
+        if self.status == "done":
+            percent = 100.0
+        elif self.size:
+            percent = round(min(self.transferred * 100 / self.size, 100.0), 1)
+        else:
+            # Streamed without a Content-Length: total unknown until the end
+            percent = None
+        return {
+            "upload_id": self.upload_id,
+            "filename": self.filename,
+            "size": self.size,
+            "transferred": self.transferred,
+            "percent": percent,
+            "status": self.status,
+        }
+
+    async def save(self, force: bool = False):
+        """Upsert into upload_progress, at most every PROGRESS_SAVE_SECONDS"""
+        if self.upload_id is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._saved_at < PROGRESS_SAVE_SECONDS:
+            return
+        self._saved_at = now
+        try:
+            await db.upload_progress.replace_one(
+                {"_id": self.upload_id},
+                {**self.to_dict(), "updated_at": datetime.now(timezone.utc)},
+                upsert=True,
+            )
+        except Exception as e:
+            # Progress is informational; the upload itself carries on
+            logger.warning(f"Failed to save upload progress {self.upload_id}: {e}")
+
+    async def save_while(self, future: asyncio.Future):
+        """Await a transfer running on pool threads, saving meanwhile"""
+        while not future.done():
+            await self.save(force=True)
+            await asyncio.wait({future}, timeout=PROGRESS_SAVE_SECONDS)
+        return future.result()
+
 
 class StorageService:
-    def __init__(self, upload_dir: Path):
+    """
+    Stores uploads in S3 when a bucket is configured, else under upload_dir.
+
+    Transfers run in a dedicated thread pool so a large video never blocks
+    the event loop. The pool size bounds how many uploads transfer at once
+    per worker; further uploads wait their turn. S3 uploads use multipart
+    transfers above S3_MULTIPART_THRESHOLD_MB. Progress of uploads started
+    with an upload id is kept in upload_progress for
+    STORAGE_PROGRESS_TTL_SECONDS.
+    """
+
+    def __init__(self, upload_dir: Path, s3_client=None):
         self.upload_dir = upload_dir
         self.bucket_name = os.environ.get("AWS_BUCKET_NAME")
         self.aws_region = os.environ.get("AWS_REGION", "us-east-1")
-        self.s3_client = None
+        # Custom endpoint for S3-compatible stores (MinIO, moto server)
+        self.endpoint_url = os.environ.get("AWS_S3_ENDPOINT_URL") or None
+        self.s3_client = s3_client
 
-        if self.bucket_name:
+        if self.bucket_name and self.s3_client is None:
             try:
                 self.s3_client = boto3.client(
                     "s3",
                     aws_access_key_id=os.environ.get("AWS_ACCESS_KEY_ID"),
                     aws_secret_access_key=os.environ.get("AWS_SECRET_ACCESS_KEY"),
                     region_name=self.aws_region,
+                    endpoint_url=self.endpoint_url,
                 )
                 logger.info(f"Initialized S3 storage with bucket: {self.bucket_name}")
             except Exception as e:
                 logger.error(f"Failed to initialize S3 client: {e}")
                 self.s3_client = None
 
+        self.transfer_config = TransferConfig(
+            multipart_threshold=settings.S3_MULTIPART_THRESHOLD_MB * MB,
+            multipart_chunksize=settings.S3_MULTIPART_CHUNK_MB * MB,
+            max_concurrency=settings.S3_MAX_CONCURRENCY,
+            use_threads=True,
+        )
+        self.workers = max(1, settings.STORAGE_UPLOAD_WORKERS)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._active = 0
+        self._active_lock = threading.Lock()
+        self._streams = 0
+
         # Ensure local directories exist regardless of S3 (for fallbacks or hybrids)
         self.upload_dir.mkdir(parents=True, exist_ok=True)
         (self.upload_dir / "images").mkdir(exist_ok=True)
@@ -38,16 +162,170 @@ class StorageService:
         (self.upload_dir / "documents").mkdir(exist_ok=True)
         (self.upload_dir / "assignments").mkdir(exist_ok=True)
 
-    async def upload_file(self, file: UploadFile, directory: str) -> dict:
+    def stats(self) -> dict:
+        return {
+            "backend": "s3" if self.s3_client else "local",
+            "workers": self.workers,
+            "active": self._active,
+            "queued": self._pending - self._active,
+            "streaming": self._streams,
+        }
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="storage-upload"
+            )
+        return self._executor
+
+    async def run_blocking(self, fn, *args, **kwargs):
+        """Run blocking storage I/O (boto3 calls, file writes) in the pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_executor(), partial(fn, *args, **kwargs)
+        )
+
+    @contextmanager
+    def _transferring(self, progress: UploadProgress):
+        # Runs on pool threads, hence the lock around the shared counter
+        with self._active_lock:
+            self._active += 1
+        progress.status = "uploading"
+        try:
+            yield
+        finally:
+            with self._active_lock:
+                self._active -= 1
+
+    def object_url(self, key: str) -> str:
+        if self.endpoint_url:
+            return f"{self.endpoint_url.rstrip('/')}/{self.bucket_name}/{key}"
+        # Virtual-hosted-style URL: https://bucket-name.s3.region.amazonaws.com/key
+        return f"https://{self.bucket_name}.s3.{self.aws_region}.amazonaws.com/{key}"
+
+    def object_key(self, file_url: str) -> Optional[str]:
+        """S3 key of a URL produced by object_url, or None"""
+        prefix = self.object_url("")
+        if self.bucket_name and file_url.startswith(prefix):
+            start = len(prefix)
+            return file_url[start:]
+        return None
+
+    def key_url(self, key: str) -> str:
+        """URL of a stored key on the configured backend"""
+        return self.object_url(key) if self.s3_client else f"/uploads/{key}"
+
+    def url_key(self, file_url: str) -> Optional[str]:
+        """Inverse of key_url, or None for a URL this storage did not issue"""
+        if self.s3_client:
+            return self.object_key(file_url)
+        if file_url.startswith("/uploads/"):
+            start = len("/uploads/")
+            return file_url[start:]
+        return None
+
+    # Blocking primitives on keys, for run_blocking
+
+    def hash_object(self, key: str) -> Optional[str]:
+        """
+        Hex SHA-256 of a stored object. In S3 this is the checksum S3 kept
+        for the upload, read with a HEAD request rather than by downloading
+        the object; a multipart upload has a checksum of its part checksums,
+        returned as "<hex>-<parts>". None when the object was uploaded
+        without a SHA-256 checksum.
+        """
+        if self.s3_client:
+            head = self.s3_client.head_object(
+                Bucket=self.bucket_name, Key=key, ChecksumMode="ENABLED"
+            )
+            checksum = head.get("ChecksumSHA256")
+            if not checksum:
+                return None
+            digest, _, parts = checksum.partition("-")
+            hexdigest = base64.b64decode(digest).hex()
+            return f"{hexdigest}-{parts}" if parts else hexdigest
+
+        digest = hashlib.sha256()
+        with open(self.upload_dir / key, "rb") as f:
+            while chunk := f.read(COPY_CHUNK_SIZE):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def move_object(self, source: str, target: str, content_type: str):
+        if self.s3_client:
+            # Server-side copy; multipart above the transfer threshold
+            self.s3_client.copy(
+                {"Bucket": self.bucket_name, "Key": source},
+                self.bucket_name,
+                target,
+                ExtraArgs={
+                    "ContentType": content_type,
+                    "CacheControl": IMMUTABLE_CACHE_CONTROL,
+                    "MetadataDirective": "REPLACE",
+                },
+                Config=self.transfer_config,
+            )
+            self.s3_client.delete_object(Bucket=self.bucket_name, Key=source)
+        else:
+            target_path = self.upload_dir / target
+            target_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(self.upload_dir / source, target_path)
+
+    def read_object(self, key: str) -> bytes:
+        if self.s3_client:
+            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=key)
+            return response["Body"].read()
+        return (self.upload_dir / key).read_bytes()
+
+    def write_object(self, key: str, data: bytes, content_type: str):
+        if self.s3_client:
+            self.s3_client.put_object(
+                Bucket=self.bucket_name,
+                Key=key,
+                Body=data,
+                ContentType=content_type,
+                CacheControl=IMMUTABLE_CACHE_CONTROL,
+            )
+        else:
+            path = self.upload_dir / key
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data)
+
+    def delete_object(self, key: str):
+        if self.s3_client:
+            self.s3_client.delete_object(Bucket=self.bucket_name, Key=key)
+        else:
+            (self.upload_dir / key).unlink(missing_ok=True)
+
+    def _result(
+        self,
+        url: str,
+        unique_name: str,
+        original_name: str,
+        size: int,
+        content_type: str,
+    ) -> dict:
+        return {
+            "url": url,
+            "filename": unique_name,
+            "original_name": original_name,
+            "size": size,
+            "type": content_type,
+        }
+
+    async def upload_file(
+        self, file: UploadFile, directory: str, upload_id: Optional[str] = None
+    ) -> dict:
         """
         Uploads a file to either S3 or local storage.
 
         Args:
             file: The FastAPI UploadFile object
             directory: The subdirectory (images, videos, documents)
+            upload_id: Key to look the transfer up by in load_progress()
 
         Returns:
-            dict: { "url": str, "filename": str, "size": int, "content_type": str }
+            dict: { "url": str, "filename": str, "size": int, "type": str }
         """
         ext = Path(file.filename).suffix
         unique_name = f"{uuid.uuid4()}{ext}"
@@ -58,69 +336,99 @@ class StorageService:
         size = file.file.tell()
         file.file.seek(0)
 
+        progress = UploadProgress(upload_id, file.filename, size)
+
         if self.s3_client:
-            return self._upload_to_s3(file, directory, unique_name, size, content_type)
+            transfer = self._upload_to_s3
         else:
-            return self._upload_to_local(
-                file, directory, unique_name, size, content_type
+            transfer = self._upload_to_local
+
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(
+                self._get_executor(),
+                transfer,
+                file.file,
+                directory,
+                unique_name,
+                content_type,
+                progress,
             )
+            url = await progress.save_while(future)
+            progress.status = "done"
+        except Exception:
+            progress.status = "failed"
+            raise
+        finally:
+            self._pending -= 1
+            await progress.save(force=True)
+
+        return self._result(url, unique_name, file.filename, size, content_type)
+
+    async def open_upload(
+        self,
+        directory: str,
+        filename: str,
+        content_type: str,
+        upload_id: Optional[str] = None,
+        expected_size: int = 0,
+    ) -> "UploadWriter":
+        """
+        Writer that streams a file to its final location as its bytes arrive,
+        without spooling it first. close() returns the same dict as
+        upload_file(); abort() discards whatever was written.
+        """
+        writer_class = S3UploadWriter if self.s3_client else LocalUploadWriter
+        unique_name = f"{uuid.uuid4()}{Path(filename).suffix}"
+        progress = UploadProgress(upload_id, filename, expected_size)
+        writer = writer_class(self, directory, unique_name, filename, content_type)
+        writer.progress = progress
+        await writer.open()
+        return writer
 
     def _upload_to_local(
         self,
-        file: UploadFile,
+        fileobj,
         directory: str,
         unique_name: str,
-        size: int,
         content_type: str,
-    ) -> dict:
+        progress: UploadProgress,
+    ) -> str:
         file_path = self.upload_dir / directory / unique_name
 
         # Ensure directory exists
         file_path.parent.mkdir(parents=True, exist_ok=True)
 
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        with self._transferring(progress), open(file_path, "wb") as buffer:
+            while chunk := fileobj.read(COPY_CHUNK_SIZE):
+                buffer.write(chunk)
+                progress(len(chunk))
 
         # Return local URL (relative path)
-        url = f"/uploads/{directory}/{unique_name}"
-
-        return {
-            "url": url,
-            "filename": unique_name,
-            "original_name": file.filename,
-            "size": size,
-            "type": content_type,
-        }
+        return f"/uploads/{directory}/{unique_name}"
 
     def _upload_to_s3(
         self,
-        file: UploadFile,
+        fileobj,
         directory: str,
         unique_name: str,
-        size: int,
         content_type: str,
-    ) -> dict:
+        progress: UploadProgress,
+    ) -> str:
         key = f"{directory}/{unique_name}"
 
         try:
-            self.s3_client.upload_fileobj(
-                file.file,
-                self.bucket_name,
-                key,
-                ExtraArgs={"ContentType": content_type},
-            )
-
-            # Construct S3 URL
-            # Virtual-hosted-style URL: https://bucket-name.s3.region.amazonaws.com/key
-            url = f"https://{self.bucket_name}.s3.{self.aws_region}.amazonaws.com/{key}"
-
-            return {
-                "url": url,
-                "filename": unique_name,
-                "original_name": file.filename,
-                "size": size,
-                "type": content_type,
-            }
+            with self._transferring(progress):
+                self.s3_client.upload_fileobj(
+                    fileobj,
+                    self.bucket_name,
+                    key,
+                    ExtraArgs={"ContentType": content_type},
+                    Config=self.transfer_config,
+                    Callback=progress,
+                )
+            return self.object_url(key)
         except NoCredentialsError:
             logger.error("AWS Credentials not found")
             raise HTTPException(status_code=500, detail="AWS Credentials conflict")
@@ -135,12 +443,12 @@ class StorageService:
         if not file_url:
             return
 
-        if "amazonaws.com" in file_url and self.s3_client:
+        key = self.object_key(file_url) if self.s3_client else None
+        if key:
             try:
-                path_parts = file_url.split(".com/")
-                if len(path_parts) > 1:
-                    key = path_parts[1]
-                    self.s3_client.delete_object(Bucket=self.bucket_name, Key=key)
+                await asyncio.to_thread(
+                    self.s3_client.delete_object, Bucket=self.bucket_name, Key=key
+                )
             except Exception as e:
                 logger.error(f"Failed to delete S3 object {file_url}: {e}")
 
@@ -149,6 +457,192 @@ class StorageService:
                 rel_path = file_url.replace("/uploads/", "")
                 file_path = self.upload_dir / rel_path
                 if file_path.exists():
-                    os.remove(file_path)
+                    await asyncio.to_thread(os.remove, file_path)
             except Exception as e:
                 logger.error(f"Failed to delete local file {file_url}: {e}")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class UploadWriter:
+    """
+    One upload streamed chunk by chunk to storage. Chunks are buffered up to
+    `flush_size` and written from the storage thread pool, so the event loop
+    never blocks on disk or network I/O. `sha256` is fed the same chunks, so
+    the content hash is known the moment the upload closes.
+    """
+
+    flush_size = COPY_CHUNK_SIZE
+
+    def __init__(
+        self,
+        storage: StorageService,
+        directory: str,
+        unique_name: str,
+        filename: str,
+        content_type: str,
+    ):
+        self.storage = storage
+        self.key = f"{directory}/{unique_name}"
+        self.unique_name = unique_name
+        self.filename = filename
+        self.content_type = content_type
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.progress: Optional[UploadProgress] = None
+        self._buffer = bytearray()
+
+    async def _run(self, fn, *args, **kwargs):
+        return await self.storage.run_blocking(fn, *args, **kwargs)
+
+    async def open(self):
+        self.storage._streams += 1
+        self.progress.status = "uploading"
+        await self.progress.save(force=True)
+
+    async def write(self, data: bytes):
+        self._buffer += data
+        self.size += len(data)
+        if len(self._buffer) >= self.flush_size:
+            await self._flush()
+
+    async def _flush(self):
+        chunk = bytes(self._buffer)
+        self._buffer.clear()
+        if chunk:
+            await self._run(self.sha256.update, chunk)
+            await self._write_chunk(chunk)
+            self.progress(len(chunk))
+            await self.progress.save()
+
+    async def _write_chunk(self, chunk: bytes):
+        raise NotImplementedError
+
+    async def _finish(self) -> str:
+        """Make the object visible at its final location and return its URL"""
+        raise NotImplementedError
+
+    async def _discard(self):
+        raise NotImplementedError
+
+    async def close(self) -> dict:
+        try:
+            url = await self._finish()
+        except Exception:
+            await self.abort()
+            raise
+        self.storage._streams -= 1
+        self.progress.size = self.size
+        self.progress.status = "done"
+        await self.progress.save(force=True)
+        return self.storage._result(
+            url, self.unique_name, self.filename, self.size, self.content_type
+        )
+
+    async def abort(self):
+        if self.progress.status != "uploading":
+            return
+        self.storage._streams -= 1
+        self.progress.status = "failed"
+        await self.progress.save(force=True)
+        self._buffer.clear()
+        try:
+            await self._discard()
+        except Exception as e:
+            logger.error(f"Failed to discard partial upload {self.key}: {e}")
+
+
+class LocalUploadWriter(UploadWriter):
+    async def open(self):
+        path = self.storage.upload_dir / self.key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._path = path
+        self._file = await self._run(open, path, "wb")
+        await super().open()
+
+    async def _write_chunk(self, chunk: bytes):
+        await self._run(self._file.write, chunk)
+
+    async def _finish(self) -> str:
+        await self._flush()
+        await self._run(self._file.close)
+        return f"/uploads/{self.key}"
+
+    async def _discard(self):
+        await self._run(self._file.close)
+        await self._run(self._path.unlink, missing_ok=True)
+
+
+class S3UploadWriter(UploadWriter):
+    """
+    Buffers one multipart part at a time. Files smaller than a part are
+    sent with a single put_object; the multipart upload is only created
+    once the first part is full.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # S3 rejects parts under 5 MB, except the last one
+        self.flush_size = max(settings.S3_MULTIPART_CHUNK_MB, 5) * MB
+        self._upload_id: Optional[str] = None
+        self._parts = []
+
+    async def _write_chunk(self, chunk: bytes):
+        client = self.storage.s3_client
+        bucket = self.storage.bucket_name
+        if self._upload_id is None:
+            created = await self._run(
+                client.create_multipart_upload,
+                Bucket=bucket,
+                Key=self.key,
+                ContentType=self.content_type,
+            )
+            self._upload_id = created["UploadId"]
+        number = len(self._parts) + 1
+        part = await self._run(
+            client.upload_part,
+            Bucket=bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=number,
+            Body=chunk,
+        )
+        self._parts.append({"PartNumber": number, "ETag": part["ETag"]})
+
+    async def _finish(self) -> str:
+        client = self.storage.s3_client
+        bucket = self.storage.bucket_name
+        if self._upload_id is None:
+            body = bytes(self._buffer)
+            self._buffer.clear()
+            await self._run(self.sha256.update, body)
+            await self._run(
+                client.put_object,
+                Bucket=bucket,
+                Key=self.key,
+                Body=body,
+                ContentType=self.content_type,
+            )
+            self.progress(len(body))
+        else:
+            await self._flush()
+            await self._run(
+                client.complete_multipart_upload,
+                Bucket=bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+                MultipartUpload={"Parts": self._parts},
+            )
+        return self.storage.object_url(self.key)
+
+    async def _discard(self):
+        if self._upload_id is not None:
+            await self._run(
+                self.storage.s3_client.abort_multipart_upload,
+                Bucket=self.storage.bucket_name,
+                Key=self.key,
+                UploadId=self._upload_id,
+            )
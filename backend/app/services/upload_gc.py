@@ -0,0 +1,340 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import PurePosixPath
+from typing import Iterator, List, Optional, Set, Tuple
+
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import settings
+from app.db.session import db
+from app.services.ingest import UPLOAD_RULES
+from app.services.storage import StorageService
+from app.services.transcode import hls_prefix
+
+logger = logging.getLogger(__name__)
+
+# Orphaned-upload collector. Replaced submissions, deleted courses and labs
+# and uploads nobody saved leave files behind that no document points at.
+# collect_orphans() streams every upload URL still referenced from the
+# database, lists the upload directories (local or S3) and deletes the files
+# that are not referenced and older than UPLOAD_GC_GRACE_HOURS. The grace
+# period covers uploads whose form has not been saved yet.
+#
+# Only the upload directories are listed, never the whole bucket. Dotted
+# paths (.partial session files) belong to upload_sessions and are skipped.
+# References are matched by URL, so a local file is never mistaken for the
+# S3 object with the same key.
+
+# Fields holding upload URLs, per collection (dotted paths reach into arrays)
+REFERENCE_FIELDS = {
+    "courses": ["thumbnail_url", "modules.items.url"],
+    "workshops": [
+        "image_url",
+        "recording_url",
+        "speakers.avatar_url",
+        "speakers.company_logo",
+    ],
+    "labs": ["thumbnail_url", "video_url"],
+    "submissions": ["file_url"],
+    "certificates": ["pdf_url"],
+    # Uploads in flight, and finished ones whose form is not saved yet
+    "upload_sessions": ["key", "result.url"],
+    "upload_intents": ["key", "result.url"],
+}
+# S3 DeleteObjects takes at most 1000 keys per request
+DELETE_BATCH_SIZE = 1000
+SAMPLE_SIZE = 20
+LOCAL_ONLY_DIR = "assignments"
+LEASE_ID = "upload_gc"
+# A lease older than this belongs to a worker that died mid-collection
+CLAIM_TIMEOUT = timedelta(hours=2)
+POLL_SECONDS = 600
+
+
+def _locations(storage: StorageService) -> List[Tuple[bool, str]]:
+    """(in S3?, directory) pairs to scan"""
+    directories = sorted({rule.directory for rule in UPLOAD_RULES.values()})
+    # Submissions are always written to local disk, and the local upload
+    # directories stay in use as a fallback next to S3
+    local = [(False, directory) for directory in directories + [LOCAL_ONLY_DIR]]
+    if storage.s3_client:
+        return [(True, directory) for directory in directories] + local
+    return local
+
+
+def _url(storage: StorageService, key: str, in_s3: bool) -> str:
+    return storage.object_url(key) if in_s3 else f"/uploads/{key}"
+
+
+def _strings(value) -> Iterator[str]:
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, list):
+        for item in value:
+            yield from _strings(item)
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _strings(item)
+
+
+async def referenced_urls(storage: StorageService, grace: timedelta) -> Set[str]:
+    """
+    Upload URLs something in the database still points at. Session and
+    intent docs also contribute their bare storage keys.
+    """
+    urls: Set[str] = set()
+    for collection, fields in REFERENCE_FIELDS.items():
+        projection = {"_id": 0, **{field: 1 for field in fields}}
+        async for doc in db.db[collection].find({}, projection):
+            urls.update(_strings(doc))
+
+    # Renditions live as long as the image they were rendered from
+    async for doc in db.image_derivatives.find({}, {"derivatives.url": 1}):
+        if doc["_id"] in urls:
+            urls.update(_strings(doc.get("derivatives", [])))
+
+    # So do the HLS renditions of a video; the whole directory counts
+    async for doc in db.video_transcodes.find({}, {"_id": 1}):
+        key = storage.url_key(doc["_id"])
+        if doc["_id"] in urls and key:
+            urls.add(storage.key_url(hls_prefix(key)))
+
+    # A blob referenced within the grace period may be an old file that a
+    # fresh upload has just deduplicated against
+    cutoff = datetime.now(timezone.utc) - grace
+    async for blob in db.blobs.find({"referenced_at": {"$gte": cutoff}}, {"_id": 1}):
+        urls.add(storage.key_url(blob["_id"]))
+    return urls
+
+
+def _list_objects(
+    storage: StorageService, directory: str, in_s3: bool
+) -> List[Tuple[str, datetime, int]]:
+    """(key, last modified, size) of every stored file under directory"""
+    objects = []
+    if in_s3:
+        paginator = storage.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(
+            Bucket=storage.bucket_name, Prefix=f"{directory}/"
+        ):
+            for obj in page.get("Contents", []):
+                objects.append((obj["Key"], obj["LastModified"], obj["Size"]))
+        return objects
+
+    root = storage.upload_dir
+    for dirpath, dirnames, filenames in os.walk(root / directory):
+        dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+        for name in filenames:
+            if name.startswith("."):
+                continue
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            modified = datetime.fromtimestamp(st.st_mtime, timezone.utc)
+            key = os.path.relpath(path, root).replace(os.sep, "/")
+            objects.append((key, modified, st.st_size))
+    return objects
+
+
+def _delete_objects(storage: StorageService, keys: List[str], in_s3: bool) -> List[str]:
+    """Delete one batch of keys; returns the keys that could not be deleted"""
+    if in_s3:
+        response = storage.s3_client.delete_objects(
+            Bucket=storage.bucket_name,
+            Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True},
+        )
+        return [error["Key"] for error in response.get("Errors", [])]
+
+    failed = []
+    for key in keys:
+        try:
+            (storage.upload_dir / key).unlink(missing_ok=True)
+        except OSError:
+            failed.append(key)
+    return failed
+
+
+async def _delete_orphans(
+    storage: StorageService, keys: List[str], in_s3: bool, cutoff: datetime
+) -> Tuple[int, int]:
+    """Delete in batches of DELETE_BATCH_SIZE; returns (deleted, failed)"""
+    deleted = failed = 0
+    for start in range(0, len(keys), DELETE_BATCH_SIZE):
+        stop = start + DELETE_BATCH_SIZE
+        urls = {key: _url(storage, key, in_s3) for key in keys[start:stop]}
+        blob_keys = {key: storage.url_key(url) for key, url in urls.items()}
+        # An upload may have deduplicated against one of these blobs since
+        # the references were read. Only blobs still untouched since the
+        # cutoff are deleted; the files of the others are kept.
+        await db.blobs.delete_many(
+            {"_id": {"$in": list(blob_keys.values())}, "referenced_at": {"$lt": cutoff}}
+        )
+        touched = {
+            blob["_id"]
+            async for blob in db.blobs.find(
+                {"_id": {"$in": list(blob_keys.values())}}, {"_id": 1}
+            )
+        }
+        batch = [key for key in urls if blob_keys[key] not in touched]
+        if not batch:
+            continue
+        try:
+            errors = await storage.run_blocking(_delete_objects, storage, batch, in_s3)
+        except Exception as e:
+            logger.error(f"Failed to delete orphaned uploads: {e}")
+            errors = batch
+        removed = sorted(set(batch) - set(errors))
+        deleted += len(removed)
+        failed += len(errors)
+        # Their records would otherwise point at files that are gone
+        removed_urls = [urls[key] for key in removed]
+        await db.image_derivatives.delete_many({"_id": {"$in": removed_urls}})
+        await db.video_transcodes.delete_many({"_id": {"$in": removed_urls}})
+    return deleted, failed
+
+
+async def collect_orphans(
+    storage: StorageService, grace_hours: Optional[float] = None, dry_run: bool = True
+) -> dict:
+    """
+    Find (and unless dry_run, delete) uploaded files no document references
+    that are older than grace_hours. Returns a report of what was found.
+    """
+    if grace_hours is None:
+        grace_hours = settings.UPLOAD_GC_GRACE_HOURS
+    grace = timedelta(hours=grace_hours)
+    started_at = datetime.now(timezone.utc)
+    cutoff = started_at - grace
+
+    referenced = await referenced_urls(storage, grace)
+    scanned = scanned_bytes = 0
+    orphan_count = orphan_bytes = 0
+    deleted = failed = 0
+    sample: List[str] = []
+    for in_s3, directory in _locations(storage):
+        objects = await storage.run_blocking(_list_objects, storage, directory, in_s3)
+        orphans = []
+        for key, modified, size in objects:
+            scanned += 1
+            scanned_bytes += size
+            if modified >= cutoff:
+                continue
+            url = _url(storage, key, in_s3)
+            if url in referenced or key in referenced:
+                continue
+            parents = PurePosixPath(key).parents
+            if any(_url(storage, str(p), in_s3) in referenced for p in parents):
+                continue
+            orphans.append(key)
+            orphan_bytes += size
+            if len(sample) < SAMPLE_SIZE:
+                sample.append(url)
+        orphan_count += len(orphans)
+        if orphans and not dry_run:
+            counts = await _delete_orphans(storage, orphans, in_s3, cutoff)
+            deleted += counts[0]
+            failed += counts[1]
+
+    logger.info(
+        f"Upload GC: {orphan_count} of {scanned} files orphaned "
+        f"({orphan_bytes} bytes), {deleted} deleted"
+    )
+    return {
+        "dry_run": dry_run,
+        "backend": "s3" if storage.s3_client else "local",
+        "grace_hours": grace_hours,
+        "referenced": len(referenced),
+        "scanned": scanned,
+        "scanned_bytes": scanned_bytes,
+        "orphans": orphan_count,
+        "orphan_bytes": orphan_bytes,
+        "deleted": deleted,
+        "failed": failed,
+        "sample": sample,
+        "started_at": started_at,
+        "finished_at": datetime.now(timezone.utc),
+    }
+
+
+async def _claim_run(interval: float) -> bool:
+    """One collection per interval across all workers"""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.upload_gc.insert_one(
+            {"_id": LEASE_ID, "status": "running", "claimed_at": now}
+        )
+        return True
+    except DuplicateKeyError:
+        pass
+    claimed = await db.upload_gc.update_one(
+        {
+            "_id": LEASE_ID,
+            "$or": [
+                {
+                    "status": "done",
+                    "claimed_at": {"$lt": now - timedelta(seconds=interval)},
+                },
+                {"status": "running", "claimed_at": {"$lt": now - CLAIM_TIMEOUT}},
+            ],
+        },
+        {"$set": {"status": "running", "claimed_at": now}},
+    )
+    return claimed.modified_count == 1
+
+
+async def last_report() -> Optional[dict]:
+    doc = await db.upload_gc.find_one({"_id": LEASE_ID}, {"report": 1})
+    return (doc or {}).get("report")
+
+
+class UploadCollector:
+    """
+    Runs collect_orphans every `interval` seconds. Every worker wakes up on
+    that schedule, but the lease in `upload_gc` lets only one of them run.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, storage: StorageService):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run(storage))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, storage: StorageService):
+        while True:
+            try:
+                if await _claim_run(self.interval):
+                    await self._collect(storage)
+            except Exception as e:
+                logger.error(f"Upload GC failed: {e}")
+            # The lease spaces runs `interval` apart; polling more often only
+            # keeps a worker that started late from skipping a whole interval
+            await asyncio.sleep(min(self.interval, POLL_SECONDS))
+
+    async def _collect(self, storage: StorageService):
+        report = None
+        try:
+            report = await collect_orphans(storage, dry_run=settings.UPLOAD_GC_DRY_RUN)
+        finally:
+            # A failed run is retried next interval, not after CLAIM_TIMEOUT
+            update = {"status": "done"}
+            if report is not None:
+                update["report"] = report
+            await db.upload_gc.update_one({"_id": LEASE_ID}, {"$set": update})
+
+
+upload_collector = UploadCollector(interval=settings.UPLOAD_GC_INTERVAL_SECONDS)
@@ -0,0 +1,235 @@
+import base64
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+
+from botocore.exceptions import ClientError
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.db.session import db
+from app.services.blobs import adopt_blob, reference_existing
+from app.services.ingest import UPLOAD_RULES, UploadRule, too_large
+from app.services.storage import StorageService
+
+logger = logging.getLogger(__name__)
+
+# Direct-to-storage uploads: the API hands out a presigned S3 target, the
+# browser sends the file to the bucket itself, then calls complete so the
+# object is checked (HEAD) and registered. No upload byte passes through an
+# API worker. Without a bucket the intent points back at the regular upload
+# endpoint instead.
+#
+# When the client declares the file's SHA-256, the presigned POST and PUT
+# carry it as the object checksum: S3 rejects bytes that do not match, and
+# the stored checksum later serves as the content hash for deduplication.
+# Uploads without one are registered under their random key.
+
+# A completion holding the intent for longer than this was abandoned
+COMPLETE_LEASE = timedelta(minutes=10)
+
+
+def _rule(kind: str) -> UploadRule:
+    rule = UPLOAD_RULES.get(kind)
+    if rule is None:
+        raise HTTPException(status_code=400, detail=f"Unknown upload kind: {kind}")
+    return rule
+
+
+async def create_upload_intent_indexes(database):
+    await database.upload_intents.create_index("id", unique=True)
+    # Intents nobody completed; their objects are left to the orphan sweep
+    await database.upload_intents.create_index(
+        "expires_at",
+        expireAfterSeconds=0,
+        partialFilterExpression={"status": "pending"},
+    )
+
+
+async def create_intent(
+    storage: StorageService,
+    user: dict,
+    kind: str,
+    filename: str,
+    content_type: str,
+    size: int,
+    sha256: Optional[str] = None,
+) -> dict:
+    rule = _rule(kind)
+    if content_type not in rule.allowed_types:
+        raise HTTPException(
+            status_code=400, detail=f"Invalid file type. Allowed: {rule.allowed_label}"
+        )
+    if size <= 0:
+        raise HTTPException(status_code=400, detail="File is empty")
+    if size > rule.max_size:
+        raise too_large(rule)
+
+    now = datetime.now(timezone.utc)
+    intent = {
+        "id": str(uuid.uuid4()),
+        "user_id": user["id"],
+        "kind": kind,
+        "filename": filename,
+        "content_type": content_type,
+        "size": size,
+        "status": "pending",
+        "created_at": now,
+    }
+    existing = None
+    if sha256:
+        existing = await reference_existing(
+            storage, rule.directory, sha256, filename, size, content_type
+        )
+    if existing:
+        intent.update(status="complete", result=existing, completed_at=now)
+        await db.upload_intents.insert_one(intent)
+        return {"mode": "complete", "id": intent["id"], "result": existing}
+
+    if not storage.s3_client:
+        return {"mode": "local", "method": "POST", "url": f"/api/upload/{kind}"}
+
+    unique_name = f"{uuid.uuid4()}{Path(filename).suffix}"
+    key = f"{rule.directory}/{unique_name}"
+    expires_in = settings.UPLOAD_PRESIGN_EXPIRES_SECONDS
+    client = storage.s3_client
+    fields = {"Content-Type": content_type}
+    params = {"Bucket": storage.bucket_name, "Key": key, "ContentType": content_type}
+    headers = {"Content-Type": content_type}
+    if sha256:
+        checksum = base64.b64encode(bytes.fromhex(sha256)).decode()
+        fields.update(
+            {"x-amz-checksum-algorithm": "SHA256", "x-amz-checksum-sha256": checksum}
+        )
+        params.update(ChecksumAlgorithm="SHA256", ChecksumSHA256=checksum)
+        headers["x-amz-sdk-checksum-algorithm"] = "SHA256"
+        headers["x-amz-checksum-sha256"] = checksum
+    # The POST policy pins type, exact size and checksum; a PUT URL cannot
+    # limit the size, which complete() checks either way
+    post = await storage.run_blocking(
+        client.generate_presigned_post,
+        storage.bucket_name,
+        key,
+        Fields=fields,
+        Conditions=[
+            *({name: value} for name, value in fields.items()),
+            ["content-length-range", size, size],
+        ],
+        ExpiresIn=expires_in,
+    )
+    put_url = await storage.run_blocking(
+        client.generate_presigned_url,
+        "put_object",
+        Params=params,
+        ExpiresIn=expires_in,
+    )
+
+    intent.update(
+        key=key,
+        unique_name=unique_name,
+        sha256=sha256.lower() if sha256 else None,
+        # Room to finish an upload that started just before the URL expired
+        expires_at=now + timedelta(seconds=expires_in * 2),
+    )
+    await db.upload_intents.insert_one(intent)
+    return {
+        "mode": "s3",
+        "id": intent["id"],
+        "key": key,
+        "expires_in": expires_in,
+        "post": post,
+        "put": {"url": put_url, "headers": headers},
+    }
+
+
+async def complete_intent(storage: StorageService, user: dict, intent_id: str) -> dict:
+    """
+    Check the uploaded object against the intent with a HEAD request and
+    register it. Returns the same dict as StorageService.upload_file. An
+    object of the wrong size or type is deleted.
+    """
+    intent = await db.upload_intents.find_one(
+        {"id": intent_id, "user_id": user["id"]}, {"_id": 0}
+    )
+    if not intent:
+        raise HTTPException(status_code=404, detail="Upload intent not found")
+    if intent["status"] == "complete":
+        return intent["result"]
+    if intent["status"] == "rejected":
+        raise HTTPException(status_code=400, detail=intent["error"])
+    if not storage.s3_client:
+        raise HTTPException(status_code=409, detail="Direct uploads are not enabled")
+
+    # Only one request checks and registers the object; a concurrent retry
+    # would otherwise move it from under the first. A worker that died while
+    # completing leaves the intent to a retry once its lease has expired.
+    now = datetime.now(timezone.utc)
+    claimed = await db.upload_intents.find_one_and_update(
+        {
+            "id": intent_id,
+            "$or": [
+                {"status": "pending"},
+                {"status": "completing", "claimed_at": {"$lt": now - COMPLETE_LEASE}},
+            ],
+        },
+        {"$set": {"status": "completing", "claimed_at": now}},
+    )
+    if claimed is None:
+        raise HTTPException(status_code=409, detail="Upload is already completing")
+
+    try:
+        result, etag = await _register(storage, intent)
+    except Exception:
+        # Back to pending so the client can retry (a rejected intent stays so)
+        await db.upload_intents.update_one(
+            {"id": intent_id, "status": "completing", "claimed_at": now},
+            {"$set": {"status": "pending"}},
+        )
+        raise
+
+    await db.upload_intents.update_one(
+        {"id": intent_id},
+        {
+            "$set": {
+                "status": "complete",
+                "result": result,
+                "etag": etag,
+                "completed_at": datetime.now(timezone.utc),
+            }
+        },
+    )
+    return result
+
+
+async def _register(storage: StorageService, intent: dict):
+    """HEAD the uploaded object, check it and adopt it; returns (result, ETag)"""
+    try:
+        head = await storage.run_blocking(
+            storage.s3_client.head_object, Bucket=storage.bucket_name, Key=intent["key"]
+        )
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            raise HTTPException(status_code=409, detail="File has not been uploaded")
+        raise
+
+    rule = _rule(intent["kind"])
+    size = head["ContentLength"]
+    content_type = head.get("ContentType", "")
+    problem = None
+    if size != intent["size"] or size > rule.max_size:
+        problem = f"Uploaded {size} bytes, expected {intent['size']}"
+    elif content_type != intent["content_type"]:
+        problem = f"Uploaded type {content_type}, expected {intent['content_type']}"
+    if problem:
+        await storage.delete_file(storage.object_url(intent["key"]))
+        await db.upload_intents.update_one(
+            {"id": intent["id"]}, {"$set": {"status": "rejected", "error": problem}}
+        )
+        raise HTTPException(status_code=400, detail=problem)
+
+    result = await adopt_blob(
+        storage, intent["key"], intent["filename"], size, content_type
+    )
+    return result, head.get("ETag")
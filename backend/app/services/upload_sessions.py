@@ -0,0 +1,378 @@
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+from app.core.config import settings
+from app.db.session import db
+from app.services.blobs import adopt_blob, reference_existing
+from app.services.ingest import UPLOAD_RULES, too_large
+from app.services.storage import MB, StorageService
+
+logger = logging.getLogger(__name__)
+
+# Resumable uploads: create a session, PUT the file in fixed-size chunks at
+# explicit offsets, then complete it. upload_sessions is shared by every
+# worker, so each chunk may land on a different one. Chunks are appended to
+# a partial file under upload_dir/.partial, or become the parts of an S3
+# multipart upload; either way completing is a rename, never a copy. S3
+# keeps a SHA-256 checksum of every part (part_checksums), and the object's
+# checksum of those checksums is its content hash for deduplication.
+#
+# A session that is neither completed nor touched for UPLOAD_SESSION_TTL_HOURS
+# is discarded, together with its partial file or multipart upload.
+
+PARTIAL_DIR = ".partial"
+# A chunk write holding the session for longer than this was abandoned
+WRITE_LEASE = timedelta(minutes=5)
+
+
+def _chunk_size() -> int:
+    # S3 rejects multipart parts under 5 MB, except the last one
+    return max(settings.UPLOAD_CHUNK_SIZE_MB, 5) * MB
+
+
+def _expires_at() -> datetime:
+    ttl = timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)
+    return datetime.now(timezone.utc) + ttl
+
+
+def _partial_path(storage: StorageService, session: dict) -> Path:
+    return storage.upload_dir / PARTIAL_DIR / session["id"]
+
+
+def session_status(session: dict) -> dict:
+    return {
+        "id": session["id"],
+        "kind": session["kind"],
+        "filename": session["filename"],
+        "size": session["size"],
+        "chunk_size": session["chunk_size"],
+        "offset": session["received"],
+        "status": session["status"],
+        "expires_at": session["expires_at"],
+    }
+
+
+async def create_upload_session_indexes(database):
+    await database.upload_sessions.create_index("id", unique=True)
+    await database.upload_sessions.create_index("expires_at")
+
+
+async def create_session(
+    storage: StorageService,
+    user: dict,
+    kind: str,
+    filename: str,
+    content_type: str,
+    size: int,
+    sha256: Optional[str] = None,
+) -> dict:
+    rule = UPLOAD_RULES.get(kind)
+    if rule is None:
+        raise HTTPException(status_code=400, detail=f"Unknown upload kind: {kind}")
+    if content_type not in rule.allowed_types:
+        raise HTTPException(
+            status_code=400, detail=f"Invalid file type. Allowed: {rule.allowed_label}"
+        )
+    if size <= 0:
+        raise HTTPException(status_code=400, detail="File is empty")
+    if size > rule.max_size:
+        raise too_large(rule)
+
+    await purge_expired_sessions(storage)
+
+    unique_name = f"{uuid.uuid4()}{Path(filename).suffix}"
+    session = {
+        "id": str(uuid.uuid4()),
+        "user_id": user["id"],
+        "kind": kind,
+        "filename": filename,
+        "content_type": content_type,
+        "size": size,
+        "chunk_size": _chunk_size(),
+        "key": f"{rule.directory}/{unique_name}",
+        "unique_name": unique_name,
+        "received": 0,
+        "status": "active",
+        "s3_upload_id": None,
+        "part_checksums": {},
+        "writing": None,
+        "created_at": datetime.now(timezone.utc),
+        "expires_at": _expires_at(),
+    }
+    existing = None
+    if sha256:
+        existing = await reference_existing(
+            storage, rule.directory, sha256, filename, size, content_type
+        )
+    if existing:
+        # Already stored: the session starts out complete, with nothing to send
+        session.update(received=size, status="complete", result=existing)
+    elif storage.s3_client:
+        created = await storage.run_blocking(
+            storage.s3_client.create_multipart_upload,
+            Bucket=storage.bucket_name,
+            Key=session["key"],
+            ContentType=content_type,
+            ChecksumAlgorithm="SHA256",
+        )
+        session["s3_upload_id"] = created["UploadId"]
+    else:
+        path = _partial_path(storage, session)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        await storage.run_blocking(path.touch)
+
+    await db.upload_sessions.insert_one(session)
+    return session_status(session)
+
+
+async def get_session(session_id: str, user: dict) -> dict:
+    session = await db.upload_sessions.find_one(
+        {"id": session_id, "user_id": user["id"]}, {"_id": 0}
+    )
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return session
+
+
+async def _read_chunk(body: AsyncIterator[bytes], limit: int) -> bytes:
+    chunk = bytearray()
+    async for data in body:
+        chunk += data
+        if len(chunk) > limit:
+            raise HTTPException(
+                status_code=413, detail=f"Chunk larger than {limit} bytes"
+            )
+    return bytes(chunk)
+
+
+def _write_at(path: Path, offset: int, data: bytes):
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        f.write(data)
+
+
+async def _claim_offset(session: dict, offset: int) -> Optional[str]:
+    """
+    Lease the session for writing the chunk at `offset`, or None if that is
+    not the current offset or another request is writing it. Nothing touches
+    the partial file or the parts without the lease, so a stale or replayed
+    chunk can never overwrite bytes that were already accepted.
+    """
+    token = str(uuid.uuid4())
+    now = datetime.now(timezone.utc)
+    claimed = await db.upload_sessions.find_one_and_update(
+        {
+            "id": session["id"],
+            "received": offset,
+            "status": "active",
+            "$or": [
+                {"writing": None},
+                {"writing_at": {"$lt": now - WRITE_LEASE}},
+            ],
+        },
+        {"$set": {"writing": token, "writing_at": now}},
+        projection={"_id": 1},
+    )
+    return token if claimed else None
+
+
+async def write_chunk(
+    storage: StorageService, session: dict, offset: int, body: AsyncIterator[bytes]
+) -> dict:
+    """
+    Store the chunk starting at `offset`. Every chunk but the last must be
+    exactly chunk_size bytes, and chunks must arrive in order: a chunk at
+    any offset other than the session's current one is rejected with 409,
+    so a client that lost track asks for the status and resumes from there.
+    """
+    if session["status"] != "active":
+        raise HTTPException(status_code=409, detail="Upload session is not active")
+    received = session["received"]
+    if offset != received:
+        raise HTTPException(
+            status_code=409, detail=f"Expected offset {received}, got {offset}"
+        )
+    expected = min(session["chunk_size"], session["size"] - received)
+    if expected <= 0:
+        raise HTTPException(status_code=409, detail="All bytes already received")
+
+    data = await _read_chunk(body, expected)
+    if len(data) != expected:
+        raise HTTPException(
+            status_code=400, detail=f"Chunk must be {expected} bytes, got {len(data)}"
+        )
+
+    token = await _claim_offset(session, offset)
+    if token is None:
+        raise HTTPException(
+            status_code=409, detail="Chunk already received or being written"
+        )
+    written = {
+        "received": offset + len(data),
+        "writing": None,
+        "expires_at": _expires_at(),
+    }
+    try:
+        if storage.s3_client:
+            part_number = offset // session["chunk_size"] + 1
+            part = await storage.run_blocking(
+                storage.s3_client.upload_part,
+                Bucket=storage.bucket_name,
+                Key=session["key"],
+                UploadId=session["s3_upload_id"],
+                PartNumber=part_number,
+                Body=data,
+                ChecksumAlgorithm="SHA256",
+            )
+            written[f"part_checksums.{part_number}"] = part["ChecksumSHA256"]
+        else:
+            await storage.run_blocking(
+                _write_at, _partial_path(storage, session), offset, data
+            )
+    except Exception:
+        await db.upload_sessions.update_one(
+            {"id": session["id"], "writing": token}, {"$set": {"writing": None}}
+        )
+        raise
+
+    updated = await db.upload_sessions.find_one_and_update(
+        {"id": session["id"], "writing": token},
+        {"$set": written},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+    if updated is None:
+        # The lease expired mid-write and another request took the offset over
+        raise HTTPException(status_code=409, detail="Chunk write timed out")
+    return session_status(updated)
+
+
+async def _list_parts(storage: StorageService, session: dict) -> list:
+    # ETags come from S3 itself, so a part re-sent by a retry is never stale
+    listed = await storage.run_blocking(
+        storage.s3_client.list_parts,
+        Bucket=storage.bucket_name,
+        Key=session["key"],
+        UploadId=session["s3_upload_id"],
+    )
+    return listed.get("Parts", [])
+
+
+def _partial_size(path: Path) -> int:
+    return path.stat().st_size
+
+
+async def complete_session(storage: StorageService, session: dict) -> dict:
+    """
+    Assemble the uploaded chunks into the final file and return the same
+    dict as StorageService.upload_file. Completing twice returns the
+    first result.
+    """
+    if session["status"] == "complete":
+        return session["result"]
+    received, size = session["received"], session["size"]
+    if received != size:
+        raise HTTPException(
+            status_code=409, detail=f"Upload incomplete: {received} of {size} bytes"
+        )
+
+    claimed = await db.upload_sessions.find_one_and_update(
+        {"id": session["id"], "status": "active", "received": size, "writing": None},
+        {"$set": {"status": "completing"}},
+    )
+    if claimed is None:
+        raise HTTPException(status_code=409, detail="Upload is already completing")
+
+    try:
+        if storage.s3_client:
+            parts = await _list_parts(storage, session)
+            stored = sum(part["Size"] for part in parts)
+        else:
+            partial = _partial_path(storage, session)
+            stored = await storage.run_blocking(_partial_size, partial)
+        if stored != size:
+            logger.error(f"Upload session {session['id']} stored {stored} of {size}")
+            raise HTTPException(
+                status_code=409,
+                detail=f"Stored {stored} bytes, expected {size}; restart the upload",
+            )
+        if storage.s3_client:
+            checksums = claimed.get("part_checksums") or {}
+            completed = [
+                {"PartNumber": part["PartNumber"], "ETag": part["ETag"]}
+                for part in parts
+            ]
+            # Sessions created before checksums were recorded have none
+            for part in completed:
+                if str(part["PartNumber"]) in checksums:
+                    part["ChecksumSHA256"] = checksums[str(part["PartNumber"])]
+            await storage.run_blocking(
+                storage.s3_client.complete_multipart_upload,
+                Bucket=storage.bucket_name,
+                Key=session["key"],
+                UploadId=session["s3_upload_id"],
+                MultipartUpload={"Parts": completed},
+            )
+        else:
+            final_path = storage.upload_dir / session["key"]
+            final_path.parent.mkdir(parents=True, exist_ok=True)
+            await storage.run_blocking(os.replace, partial, final_path)
+    except Exception:
+        await db.upload_sessions.update_one(
+            {"id": session["id"]}, {"$set": {"status": "active"}}
+        )
+        raise
+
+    result = await adopt_blob(
+        storage,
+        session["key"],
+        session["filename"],
+        session["size"],
+        session["content_type"],
+    )
+    await db.upload_sessions.update_one(
+        {"id": session["id"]},
+        {"$set": {"status": "complete", "result": result, "expires_at": _expires_at()}},
+    )
+    return result
+
+
+async def _discard(storage: StorageService, session: dict):
+    if session["status"] == "complete":
+        return
+    try:
+        if session.get("s3_upload_id") and storage.s3_client:
+            await storage.run_blocking(
+                storage.s3_client.abort_multipart_upload,
+                Bucket=storage.bucket_name,
+                Key=session["key"],
+                UploadId=session["s3_upload_id"],
+            )
+        else:
+            await storage.run_blocking(
+                _partial_path(storage, session).unlink, missing_ok=True
+            )
+    except Exception as e:
+        logger.error(f"Failed to discard upload session {session['id']}: {e}")
+
+
+async def abort_session(storage: StorageService, session: dict):
+    await _discard(storage, session)
+    await db.upload_sessions.delete_one({"id": session["id"]})
+
+
+async def purge_expired_sessions(storage: StorageService, limit: int = 100) -> int:
+    """Discard sessions past expires_at; completed ones only lose the record"""
+    expired = await db.upload_sessions.find(
+        {"expires_at": {"$lt": datetime.now(timezone.utc)}}, {"_id": 0}
+    ).to_list(limit)
+    for session in expired:
+        await abort_session(storage, session)
+    return len(expired)
@@ -0,0 +1,53 @@
+"""Report (or with --delete, remove) uploaded files no document references"""
+
+import argparse
+import asyncio
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Load env vars
+load_dotenv(".env")
+
+if not os.environ.get("MONGO_URL") or not os.environ.get("DB_NAME"):
+    print("Error: MONGO_URL or DB_NAME not set in .env")
+    exit(1)
+
+# app.* reads its settings from the environment loaded above
+from app.db.session import db  # noqa: E402
+from app.services.storage import StorageService  # noqa: E402
+from app.services.upload_gc import collect_orphans  # noqa: E402
+
+
+async def collect(args):
+    storage = StorageService(upload_dir=Path(args.upload_dir))
+    mode = "Deleting" if args.delete else "Dry run: listing"
+    print(f"{mode} orphaned uploads ({storage.stats()['backend']} storage)...")
+    db.connect()
+    try:
+        report = await collect_orphans(
+            storage, grace_hours=args.grace_hours, dry_run=not args.delete
+        )
+    finally:
+        db.close()
+        storage.shutdown()
+    for key in report["sample"]:
+        print(f"  {key}")
+    print(
+        f"{report['orphans']} of {report['scanned']} files orphaned "
+        f"({report['orphan_bytes'] / 1024 / 1024:.1f} MB), "
+        f"{report['deleted']} deleted, {report['failed']} failed."
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--delete", action="store_true", help="delete the orphans, not just list them"
+    )
+    parser.add_argument(
+        "--grace-hours", type=float, default=None, help="default: UPLOAD_GC_GRACE_HOURS"
+    )
+    parser.add_argument("--upload-dir", default="uploads")
+    asyncio.run(collect(parser.parse_args()))
@@ -0,0 +1,29 @@
+import asyncio
+import os
+
+from dotenv import load_dotenv
+
+# Load env vars
+load_dotenv(".env")
+
+if not os.environ.get("MONGO_URL") or not os.environ.get("DB_NAME"):
+    print("Error: MONGO_URL or DB_NAME not set in .env")
+    exit(1)
+
+# app.* reads its settings from the environment loaded above
+from app.db.session import db  # noqa: E402
+from app.services.progress import migrate_modules_progress  # noqa: E402
+
+
+async def migrate():
+    print("Starting migration: modules_progress list -> map keyed by module_id...")
+    db.connect()
+    try:
+        count = await migrate_modules_progress()
+    finally:
+        db.close()
+    print(f"Migration complete. Converted {count} progress documents.")
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
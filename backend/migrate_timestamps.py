@@ -0,0 +1,47 @@
+import argparse
+import asyncio
+import os
+
+from dotenv import load_dotenv
+
+# Load env vars
+load_dotenv(".env")
+
+if not os.environ.get("MONGO_URL") or not os.environ.get("DB_NAME"):
+    print("Error: MONGO_URL or DB_NAME not set in .env")
+    exit(1)
+
+# app.* reads its settings from the environment loaded above
+from app.db import migrations  # noqa: E402
+from app.db.session import db  # noqa: E402
+
+
+async def migrate(args):
+    print("Starting migration: ISO string timestamps -> BSON dates...")
+    db.connect()
+    try:
+        if args.restart:
+            await migrations.reset_timestamp_migration(db.db)
+        counts = await migrations.migrate_timestamps(
+            db.db, batch_size=args.batch_size, collections=args.collections
+        )
+    finally:
+        db.close()
+    for name, count in counts.items():
+        print(f"  {name}: {count} documents converted")
+    print("Migration complete. Re-run to resume if it was interrupted.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument(
+        "--collections",
+        nargs="*",
+        choices=sorted(migrations.TIMESTAMP_FIELDS),
+        default=None,
+    )
+    parser.add_argument(
+        "--restart", action="store_true", help="ignore saved progress and rescan"
+    )
+    asyncio.run(migrate(parser.parse_args()))
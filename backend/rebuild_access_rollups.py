@@ -0,0 +1,31 @@
+import asyncio
+import os
+
+from dotenv import load_dotenv
+
+# Load env vars
+load_dotenv(".env")
+
+if not os.environ.get("MONGO_URL") or not os.environ.get("DB_NAME"):
+    print("Error: MONGO_URL or DB_NAME not set in .env")
+    exit(1)
+
+# app.* reads its settings from the environment loaded above
+from app.core.config import settings  # noqa: E402
+from app.db.session import db  # noqa: E402
+from app.services.analytics import rebuild_rollups  # noqa: E402
+
+
+async def rebuild():
+    days = settings.ACCESS_LOG_RETENTION_DAYS
+    print(f"Rebuilding the last {days} days of access log rollups...")
+    db.connect()
+    try:
+        count = await rebuild_rollups()
+    finally:
+        db.close()
+    print(f"Rebuild complete. Wrote {count} rollup counters.")
+
+
+if __name__ == "__main__":
+    asyncio.run(rebuild())
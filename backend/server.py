@@ -1,3 +1,4 @@
+import asyncio
 import io
 import json
 import logging
@@ -8,15 +9,12 @@ from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from typing import Dict, List, Optional
 
-import bcrypt
 import jwt
 from dotenv import load_dotenv
-from fastapi import (APIRouter, Depends, FastAPI, File, Form, HTTPException,
-                     Request, UploadFile, status)
+from fastapi import (APIRouter, Depends, FastAPI, File, Form, Header,
+                     HTTPException, Query, Request, UploadFile, status)
 from fastapi.responses import FileResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from fastapi.staticfiles import StaticFiles
-from motor.motor_asyncio import AsyncIOMotorClient
 from openai import AsyncOpenAI
 from pydantic import BaseModel, ConfigDict, EmailStr, Field
 from slowapi import Limiter, _rate_limit_exceeded_handler
@@ -26,17 +24,98 @@ from starlette.middleware.cors import CORSMiddleware
 
 ROOT_DIR = Path(__file__).parent
 SERVICE_DIR = ROOT_DIR / "services"
-import sys
+import sys  # noqa: E402
 
 sys.path.append(str(ROOT_DIR))
-from services.storage import StorageService
 
 load_dotenv(ROOT_DIR / ".env")
 
-# MongoDB connection
-mongo_url = os.environ["MONGO_URL"]
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ["DB_NAME"]]
+# app.* reads its settings from the environment loaded above, so these
+# imports stay below load_dotenv() and out of isort's reach
+# isort: off
+from app.core.security import (  # noqa: E402
+    invalidate_user,
+    is_enrolled,
+    load_memberships,
+    load_user,
+)
+from app.core.timestamps import Timestamp  # noqa: E402
+from app.db.session import db as app_db  # noqa: E402
+from app.models.upload import UploadIntentCreate, UploadSessionCreate  # noqa: E402
+from app.services.admin_stats import admin_stats  # noqa: E402
+from app.services.analytics import (  # noqa: E402
+    access_log_writer,
+    create_rollup_indexes,
+)
+from app.services.analytics import log_access as buffered_log_access  # noqa: E402
+from app.services.blobs import create_blob_indexes  # noqa: E402
+from app.services.courses import (  # noqa: E402
+    course_list_projection,
+    course_repository,
+    get_course_module,
+    get_course_outline,
+)
+from app.services.hashing import password_hasher  # noqa: E402
+from app.services.images import (  # noqa: E402
+    attach_derivatives,
+    create_image_indexes,
+    image_derivatives,
+)
+from app.services.ingest import UPLOAD_RULES, ingest_upload  # noqa: E402
+from app.services.log_archive import (  # noqa: E402
+    access_log_archiver,
+    create_archive_indexes,
+    read_archived_access_logs,
+)
+from app.services.media import MediaFiles, with_signed_file  # noqa: E402
+from app.services.progress import (  # noqa: E402
+    check_and_issue_certificate,
+    complete_module,
+    evaluate_course_progress,
+    evaluate_courses_progress,
+    get_course_totals,
+    modules_progress_list,
+    progress_reconciler,
+    store_evaluation,
+    update_progress_counters,
+)
+from app.services.storage import (  # noqa: E402
+    create_upload_progress_indexes,
+    load_progress,
+)
+from app.services.transcode import (  # noqa: E402
+    create_transcode_indexes,
+    get_transcode,
+    refresh_course_streams,
+    video_transcoder,
+)
+from app.services.upload_gc import (  # noqa: E402
+    collect_orphans,
+    last_report,
+    upload_collector,
+)
+from app.services.upload_intents import (  # noqa: E402
+    complete_intent,
+    create_intent,
+    create_upload_intent_indexes,
+)
+from app.services.upload_sessions import (  # noqa: E402
+    abort_session,
+    complete_session,
+    create_session,
+    create_upload_session_indexes,
+    get_session,
+    session_status,
+    write_chunk,
+)
+from services.storage import StorageService  # noqa: E402
+
+# isort: on
+
+# MongoDB connection (shared with the app.* service layer)
+app_db.connect()
+client = app_db.client
+db = app_db.db
 
 # JWT Configuration
 # JWT Configuration
@@ -84,25 +163,13 @@ UPLOAD_DIR.mkdir(exist_ok=True)
 (UPLOAD_DIR / "assignments").mkdir(exist_ok=True)
 (UPLOAD_DIR / "certificates").mkdir(exist_ok=True)
 
-app.mount("/uploads", StaticFiles(directory=str(UPLOAD_DIR)), name="uploads")
+app.mount("/uploads", MediaFiles(directory=UPLOAD_DIR), name="uploads")
 
 # Initialize Storage Service
 storage_service = StorageService(upload_dir=UPLOAD_DIR)
 
 security = HTTPBearer(auto_error=False)
 
-# File upload settings
-MAX_VIDEO_SIZE = 500 * 1024 * 1024  # 500MB
-MAX_DOC_SIZE = 50 * 1024 * 1024  # 50MB
-ALLOWED_VIDEO_TYPES = ["video/mp4", "video/webm", "video/quicktime"]
-ALLOWED_DOC_TYPES = [
-    "application/pdf",
-    "application/vnd.openxmlformats-officedocument.presentationml.presentation",
-    "application/vnd.ms-powerpoint",
-    "application/msword",
-    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-]
-
 # Certificate settings
 PASS_SCORE = 80  # 80% required to pass
 MAX_QUIZ_ATTEMPTS = 2  # Initial + 1 retry
@@ -141,7 +208,7 @@ class UserProfile(BaseModel):
     skills: List[str] = []
     role: str = "learner"
     enrolled_courses: List[str] = []
-    created_at: str
+    created_at: Timestamp
 
 
 class UserProfileUpdate(BaseModel):
@@ -192,7 +259,7 @@ class Workshop(BaseModel):
     tags: List[str]
     registered_count: int = 0
     is_active: bool
-    created_at: str
+    created_at: Timestamp
 
 
 # Course Models with Videos and Tests
@@ -201,6 +268,9 @@ class ModuleItem(BaseModel):
     title: str
     type: str = "video"  # video, article, quiz
     url: Optional[str] = ""
+    # Set once an uploaded video is transcoded (app.services.transcode)
+    hls_url: Optional[str] = None
+    poster_url: Optional[str] = None
     content: Optional[str] = ""  # For articles
     duration_minutes: int = 10
     is_free: bool = False
@@ -275,8 +345,8 @@ class Course(BaseModel):
     learning_outcomes: List[str]
     is_published: bool
     enrolled_count: int = 0
-    created_at: str
-    updated_at: str
+    created_at: Timestamp
+    updated_at: Timestamp
     created_by: Optional[str] = None
 
 
@@ -306,7 +376,7 @@ class OpenSourcePath(BaseModel):
     difficulty: str
     estimated_weeks: int
     steps: List[LearningPathStep]
-    created_at: str
+    created_at: Timestamp
     generated_by: str = "ai"
 
 
@@ -363,7 +433,7 @@ class Lab(BaseModel):
     is_published: bool
     is_interactive: bool = True
     completions_count: int = 0
-    created_at: str
+    created_at: Timestamp
     created_by: Optional[str] = None
 
 
@@ -373,7 +443,7 @@ class AccessLog(BaseModel):
     content_type: str  # course, lab, workshop, open_source
     content_id: str
     action: str  # view, enroll, complete, start
-    timestamp: str
+    timestamp: Timestamp
 
 
 class EnrollRequest(BaseModel):
@@ -391,7 +461,7 @@ class PasswordChange(BaseModel):
 class ModuleProgress(BaseModel):
     module_id: str
     completed: bool = False
-    completed_at: Optional[str] = None
+    completed_at: Optional[Timestamp] = None
     time_spent_minutes: int = 0
 
 
@@ -399,7 +469,7 @@ class QuizAttempt(BaseModel):
     attempt_number: int
     score: float
     answers: Dict[str, int] = {}  # question_id: selected_answer
-    submitted_at: str
+    submitted_at: Timestamp
     passed: bool
 
 
@@ -415,13 +485,13 @@ class CourseProgress(BaseModel):
     id: str
     user_id: str
     course_id: str
-    modules_progress: List[ModuleProgress] = []
+    modules_progress: Dict[str, ModuleProgress] = {}  # keyed by module_id
     quiz_progress: Optional[QuizProgress] = None
     overall_progress: float = 0  # percentage
-    started_at: str
-    last_accessed: str
+    started_at: Timestamp
+    last_accessed: Timestamp
     completed: bool = False
-    completed_at: Optional[str] = None
+    completed_at: Optional[Timestamp] = None
 
 
 class SubmitQuizRequest(BaseModel):
@@ -460,7 +530,7 @@ class Assignment(BaseModel):
     due_date: Optional[str]
     max_score: int
     is_required: bool
-    created_at: str
+    created_at: Timestamp
     created_by: str
 
 
@@ -472,10 +542,10 @@ class AssignmentSubmission(BaseModel):
     file_url: str
     file_name: str
     notes: str = ""
-    submitted_at: str
+    submitted_at: Timestamp
     grade: Optional[float] = None
     feedback: Optional[str] = None
-    graded_at: Optional[str] = None
+    graded_at: Optional[Timestamp] = None
     graded_by: Optional[str] = None
 
 
@@ -500,21 +570,21 @@ class Certificate(BaseModel):
     course_id: str
     user_name: str
     course_title: str
-    issued_at: str
+    issued_at: Timestamp
     quiz_score: float
-    completion_date: str
+    completion_date: Timestamp
     pdf_url: Optional[str] = None
 
 
 # ============== HELPER FUNCTIONS ==============
 
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+async def hash_password(password: str) -> str:
+    return await password_hasher.hash(password)
 
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+async def verify_password(password: str, hashed: str) -> bool:
+    return await password_hasher.verify(password, hashed)
 
 
 def create_token(user_id: str, role: str) -> str:
@@ -542,7 +612,7 @@ async def get_current_user(
         raise HTTPException(status_code=401, detail="Not authenticated")
 
     payload = decode_token(credentials.credentials)
-    user = await db.users.find_one({"id": payload["user_id"]}, {"_id": 0})
+    user = await load_user(payload["user_id"])
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
     return user
@@ -555,7 +625,7 @@ async def get_optional_user(
         return None
     try:
         payload = decode_token(credentials.credentials)
-        user = await db.users.find_one({"id": payload["user_id"]}, {"_id": 0})
+        user = await load_user(payload["user_id"])
         return user
     except:
         return None
@@ -574,168 +644,8 @@ async def require_trainer_or_admin(user: dict = Depends(get_current_user)):
 
 
 async def log_access(user_id: str, content_type: str, content_id: str, action: str):
-    """Log user access for analytics"""
-    log_doc = {
-        "id": str(uuid.uuid4()),
-        "user_id": user_id,
-        "content_type": content_type,
-        "content_id": content_id,
-        "action": action,
-        "timestamp": datetime.now(timezone.utc).isoformat(),
-    }
-    await db.access_logs.insert_one(log_doc)
-
-
-def generate_certificate_number():
-    """Generate unique certificate number like PS-2026-XXXX"""
-    year = datetime.now().year
-    random_part = uuid.uuid4().hex[:8].upper()
-    return f"PS-{year}-{random_part}"
-
-
-async def calculate_course_progress(user_id: str, course_id: str) -> dict:
-    """Calculate overall course progress including modules, quiz, and assignments"""
-    course = await db.courses.find_one({"id": course_id}, {"_id": 0})
-    if not course:
-        return {"progress": 0, "completed": False}
-
-    progress_doc = await db.course_progress.find_one(
-        {"user_id": user_id, "course_id": course_id}, {"_id": 0}
-    )
-
-    if not progress_doc:
-        return {"progress": 0, "completed": False}
-
-    total_items = 0
-    completed_items = 0
-
-    # Module completion (50% weight)
-    modules = course.get("modules", [])
-    if modules:
-        total_items += len(modules)
-        modules_progress = {
-            m["module_id"]: m for m in progress_doc.get("modules_progress", [])
-        }
-        completed_items += sum(
-            1
-            for m in modules
-            if modules_progress.get(m["id"], {}).get("completed", False)
-        )
-
-    # Quiz completion (30% weight) - only if course has tests
-    tests = course.get("tests", [])
-    if tests:
-        total_items += 1  # Quiz counts as 1 item
-        quiz_progress = progress_doc.get("quiz_progress")
-        if quiz_progress and quiz_progress.get("passed"):
-            completed_items += 1
-
-    # Assignment completion (20% weight)
-    assignments = await db.assignments.find(
-        {"course_id": course_id, "is_required": True}
-    ).to_list(100)
-    if assignments:
-        total_items += len(assignments)
-        for assignment in assignments:
-            submission = await db.submissions.find_one(
-                {
-                    "assignment_id": assignment["id"],
-                    "user_id": user_id,
-                    "grade": {"$ne": None},
-                }
-            )
-            if submission:
-                completed_items += 1
-
-    progress = (completed_items / total_items * 100) if total_items > 0 else 0
-    completed = progress >= 100
-
-    return {"progress": round(progress, 1), "completed": completed}
-
-
-async def check_and_issue_certificate(user_id: str, course_id: str) -> Optional[dict]:
-    """Check if user qualifies for certificate and issue if so"""
-    # Check if certificate already exists
-    existing_cert = await db.certificates.find_one(
-        {"user_id": user_id, "course_id": course_id}, {"_id": 0}
-    )
-    if existing_cert:
-        return existing_cert
-
-    # Get course and progress
-    course = await db.courses.find_one({"id": course_id}, {"_id": 0})
-    if not course:
-        return None
-
-    progress_doc = await db.course_progress.find_one(
-        {"user_id": user_id, "course_id": course_id}, {"_id": 0}
-    )
-    if not progress_doc:
-        return None
-
-    # Check all modules completed
-    modules = course.get("modules", [])
-    if modules:
-        modules_progress = {
-            m["module_id"]: m for m in progress_doc.get("modules_progress", [])
-        }
-        all_modules_complete = all(
-            modules_progress.get(m["id"], {}).get("completed", False) for m in modules
-        )
-        if not all_modules_complete:
-            return None
-
-    # Check quiz passed (if exists)
-    quiz_score = 0
-    tests = course.get("tests", [])
-    if tests:
-        quiz_progress = progress_doc.get("quiz_progress")
-        if not quiz_progress or not quiz_progress.get("passed"):
-            return None
-        quiz_score = quiz_progress.get("best_score", 0)
-
-    # Check required assignments graded
-    assignments = await db.assignments.find(
-        {"course_id": course_id, "is_required": True}
-    ).to_list(100)
-    for assignment in assignments:
-        submission = await db.submissions.find_one(
-            {
-                "assignment_id": assignment["id"],
-                "user_id": user_id,
-                "grade": {"$ne": None},
-            }
-        )
-        if not submission:
-            return None
-
-    # Issue certificate
-    user = await db.users.find_one({"id": user_id}, {"_id": 0})
-    if not user:
-        return None
-
-    now = datetime.now(timezone.utc).isoformat()
-    cert_doc = {
-        "id": str(uuid.uuid4()),
-        "certificate_number": generate_certificate_number(),
-        "user_id": user_id,
-        "course_id": course_id,
-        "user_name": f"{user['first_name']} {user['last_name']}",
-        "course_title": course["title"],
-        "issued_at": now,
-        "quiz_score": quiz_score,
-        "completion_date": now,
-        "pdf_url": None,
-    }
-
-    await db.certificates.insert_one(cert_doc)
-    if "_id" in cert_doc:
-        del cert_doc["_id"]
-
-    logger.info(
-        f"Certificate issued: {cert_doc['certificate_number']} for user {user_id}"
-    )
-    return cert_doc
+    """Log user access for analytics (buffered, see app.services.analytics)"""
+    await buffered_log_access(user_id, content_type, content_id, action)
 
 
 # ============== AUTH ROUTES ==============
@@ -749,12 +659,12 @@ async def signup(request: Request, user_data: UserCreate):
         raise HTTPException(status_code=400, detail="Email already registered")
 
     user_id = str(uuid.uuid4())
-    now = datetime.now(timezone.utc).isoformat()
+    now = datetime.now(timezone.utc)
 
     user_doc = {
         "id": user_id,
         "email": user_data.email,
-        "password_hash": hash_password(user_data.password),
+        "password_hash": await hash_password(user_data.password),
         "first_name": user_data.first_name,
         "last_name": user_data.last_name,
         "bio": "",
@@ -788,7 +698,7 @@ async def login(request: Request, credentials: UserLogin):
     if not user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
-    if not verify_password(credentials.password, user["password_hash"]):
+    if not await verify_password(credentials.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
     token = create_token(user["id"], user["role"])
@@ -832,6 +742,7 @@ async def refresh_token(
 
 @api_router.get("/auth/me")
 async def get_me(user: dict = Depends(get_current_user)):
+    memberships = await load_memberships(user["id"])
     return {
         "id": user["id"],
         "email": user["email"],
@@ -840,8 +751,7 @@ async def get_me(user: dict = Depends(get_current_user)):
         "bio": user.get("bio", ""),
         "skills": user.get("skills", []),
         "role": user["role"],
-        "enrolled_courses": user.get("enrolled_courses", []),
-        "completed_labs": user.get("completed_labs", []),
+        **memberships,
     }
 
 
@@ -849,18 +759,19 @@ async def get_me(user: dict = Depends(get_current_user)):
 async def change_password(data: PasswordChange, user: dict = Depends(get_current_user)):
     full_user = await db.users.find_one({"id": user["id"]}, {"_id": 0})
 
-    if not verify_password(data.current_password, full_user["password_hash"]):
+    if not await verify_password(data.current_password, full_user["password_hash"]):
         raise HTTPException(status_code=400, detail="Current password is incorrect")
 
     await db.users.update_one(
         {"id": user["id"]},
         {
             "$set": {
-                "password_hash": hash_password(data.new_password),
-                "updated_at": datetime.now(timezone.utc).isoformat(),
+                "password_hash": await hash_password(data.new_password),
+                "updated_at": datetime.now(timezone.utc),
             }
         },
     )
+    invalidate_user(user["id"])
 
     return {"message": "Password updated successfully"}
 
@@ -870,6 +781,7 @@ async def change_password(data: PasswordChange, user: dict = Depends(get_current
 
 @api_router.get("/users/profile", response_model=UserProfile)
 async def get_profile(user: dict = Depends(get_current_user)):
+    memberships = await load_memberships(user["id"])
     return UserProfile(
         id=user["id"],
         email=user["email"],
@@ -878,7 +790,7 @@ async def get_profile(user: dict = Depends(get_current_user)):
         bio=user.get("bio", ""),
         skills=user.get("skills", []),
         role=user["role"],
-        enrolled_courses=user.get("enrolled_courses", []),
+        enrolled_courses=memberships["enrolled_courses"],
         created_at=user["created_at"],
     )
 
@@ -887,7 +799,7 @@ async def get_profile(user: dict = Depends(get_current_user)):
 async def update_profile(
     profile_data: UserProfileUpdate, user: dict = Depends(get_current_user)
 ):
-    update_doc = {"updated_at": datetime.now(timezone.utc).isoformat()}
+    update_doc = {"updated_at": datetime.now(timezone.utc)}
 
     if profile_data.first_name is not None:
         update_doc["first_name"] = profile_data.first_name
@@ -899,6 +811,7 @@ async def update_profile(
         update_doc["skills"] = profile_data.skills
 
     await db.users.update_one({"id": user["id"]}, {"$set": update_doc})
+    invalidate_user(user["id"])
     updated_user = await db.users.find_one(
         {"id": user["id"]}, {"_id": 0, "password_hash": 0}
     )
@@ -914,6 +827,7 @@ async def get_workshops(
 ):
     query = {"is_active": True} if active_only else {}
     workshops = await db.workshops.find(query, {"_id": 0}).sort("date", 1).to_list(100)
+    await attach_derivatives(workshops, "image_url", "image_derivatives")
 
     # Log access
     if user:
@@ -960,7 +874,7 @@ async def register_for_workshop(
         )
 
     # Register user
-    now = datetime.now(timezone.utc).isoformat()
+    now = datetime.now(timezone.utc)
     registration = {
         "id": str(uuid.uuid4()),
         "workshop_id": workshop_id,
@@ -987,7 +901,7 @@ async def trainer_create_workshop(
     workshop_data: WorkshopCreate, user: dict = Depends(require_trainer_or_admin)
 ):
     workshop_id = str(uuid.uuid4())
-    now = datetime.now(timezone.utc).isoformat()
+    now = datetime.now(timezone.utc)
 
     workshop_doc = {
         "id": workshop_id,
@@ -1048,10 +962,15 @@ async def trainer_delete_workshop(
 
 @api_router.get("/courses")
 async def get_courses(
-    published_only: bool = True, user: dict = Depends(get_optional_user)
+    published_only: bool = True,
+    view: str = "summary",
+    fields: Optional[str] = None,
+    user: dict = Depends(get_optional_user),
 ):
     query = {"is_published": True} if published_only else {}
-    courses = await db.courses.find(query, {"_id": 0}).to_list(100)
+    projection = course_list_projection(view, fields)
+    courses = await db.courses.find(query, projection).to_list(100)
+    await attach_derivatives(courses, "thumbnail_url", "thumbnail_derivatives")
 
     if user:
         await log_access(user["id"], "course", "list", "view")
@@ -1061,42 +980,74 @@ async def get_courses(
 
 @api_router.get("/courses/{slug}")
 async def get_course_by_slug(slug: str, user: dict = Depends(get_optional_user)):
-    course = await db.courses.find_one({"slug": slug}, {"_id": 0})
+    course = await course_repository.get_by_slug(slug)
+    if not course:
+        raise HTTPException(status_code=404, detail="Course not found")
+
+    enrolled = False
+    if user:
+        enrolled = await is_enrolled(user, course["id"])
+        await log_access(user["id"], "course", course["id"], "view")
+
+    return {**course, "is_enrolled": enrolled}
+
+
+@api_router.get("/courses/{slug}/outline")
+async def get_course_outline_by_slug(
+    slug: str, user: dict = Depends(get_optional_user)
+):
+    """Course page data with module summaries only; load modules separately"""
+    course = await get_course_outline({"slug": slug})
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
 
-    is_enrolled = False
+    enrolled = False
     if user:
-        if course["id"] in user.get("enrolled_courses", []):
-            is_enrolled = True
+        enrolled = await is_enrolled(user, course["id"])
         await log_access(user["id"], "course", course["id"], "view")
 
-    return {**course, "is_enrolled": is_enrolled}
+    return {**course, "is_enrolled": enrolled}
+
+
+@api_router.get("/courses/{course_id}/modules/{module_id}")
+async def get_course_module_detail(course_id: str, module_id: str):
+    module = await get_course_module(course_id, module_id)
+    if not module:
+        raise HTTPException(status_code=404, detail="Module not found")
+    return module
 
 
 @api_router.post("/courses/enroll")
 async def enroll_in_course(data: EnrollRequest, user: dict = Depends(get_current_user)):
-    course = await db.courses.find_one({"id": data.course_id}, {"_id": 0})
+    course = await course_repository.get_by_id(data.course_id)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
 
-    if data.course_id in user.get("enrolled_courses", []):
+    # Conditional, so two concurrent requests cannot both enroll
+    enrolled = await db.users.update_one(
+        {"id": user["id"], "enrolled_courses": {"$ne": data.course_id}},
+        {"$push": {"enrolled_courses": data.course_id}},
+    )
+    if not enrolled.modified_count:
         raise HTTPException(status_code=400, detail="Already enrolled in this course")
+    invalidate_user(user["id"])
 
-    await db.users.update_one(
-        {"id": user["id"]}, {"$push": {"enrolled_courses": data.course_id}}
+    await db.courses.update_one(
+        {"id": data.course_id}, {"$inc": {"enrolled_count": 1, "version": 1}}
     )
-
-    await db.courses.update_one({"id": data.course_id}, {"$inc": {"enrolled_count": 1}})
+    course_repository.invalidate(data.course_id)
 
     # Initialize course progress
-    now = datetime.now(timezone.utc).isoformat()
+    now = datetime.now(timezone.utc)
     progress_doc = {
         "id": str(uuid.uuid4()),
         "user_id": user["id"],
         "course_id": data.course_id,
-        "modules_progress": [],
+        "modules_progress": {},
         "quiz_progress": None,
+        "completed_modules": 0,
+        "quiz_passed": False,
+        "graded_required_assignments": 0,
         "overall_progress": 0,
         "started_at": now,
         "last_accessed": now,
@@ -1112,7 +1063,7 @@ async def enroll_in_course(data: EnrollRequest, user: dict = Depends(get_current
 
 @api_router.get("/my-courses")
 async def get_my_courses(user: dict = Depends(get_current_user)):
-    enrolled_ids = user.get("enrolled_courses", [])
+    enrolled_ids = (await load_memberships(user["id"]))["enrolled_courses"]
     if not enrolled_ids:
         return []
 
@@ -1120,18 +1071,36 @@ async def get_my_courses(user: dict = Depends(get_current_user)):
         100
     )
 
-    # Add progress info to each course
-    for course in courses:
-        progress = await db.course_progress.find_one(
-            {"user_id": user["id"], "course_id": course["id"]}, {"_id": 0}
+    # Add progress info to each course from the stored counters
+    progress_docs = await db.course_progress.find(
+        {"user_id": user["id"], "course_id": {"$in": enrolled_ids}},
+        {
+            "_id": 0,
+            "course_id": 1,
+            "completed_modules": 1,
+            "overall_progress": 1,
+            "completed": 1,
+        },
+    ).to_list(None)
+    progress_by_course = {p["course_id"]: p for p in progress_docs}
+
+    # Docs written before the counters existed are evaluated once and stored
+    missing = [
+        p["course_id"] for p in progress_docs if "completed_modules" not in p
+    ]
+    if missing:
+        evaluations = await evaluate_courses_progress(
+            user["id"], missing, courses=courses
         )
-        if progress:
-            calc = await calculate_course_progress(user["id"], course["id"])
-            course["progress"] = calc["progress"]
-            course["completed"] = calc["completed"]
-        else:
-            course["progress"] = 0
-            course["completed"] = False
+        for course_id, evaluation in evaluations.items():
+            progress_by_course[course_id] = await store_evaluation(
+                user["id"], course_id, evaluation
+            )
+
+    for course in courses:
+        progress = progress_by_course.get(course["id"], {})
+        course["progress"] = progress.get("overall_progress", 0)
+        course["completed"] = progress.get("completed", False)
 
     return courses
 
@@ -1142,7 +1111,7 @@ async def get_my_courses(user: dict = Depends(get_current_user)):
 @api_router.get("/progress/{course_id}")
 async def get_course_progress(course_id: str, user: dict = Depends(get_current_user)):
     """Get detailed progress for a course"""
-    if course_id not in user.get("enrolled_courses", []):
+    if not await is_enrolled(user, course_id):
         raise HTTPException(status_code=403, detail="Not enrolled in this course")
 
     progress = await db.course_progress.find_one(
@@ -1152,10 +1121,14 @@ async def get_course_progress(course_id: str, user: dict = Depends(get_current_u
     if not progress:
         raise HTTPException(status_code=404, detail="Progress not found")
 
-    # Calculate overall progress
-    calc = await calculate_course_progress(user["id"], course_id)
-    progress["overall_progress"] = calc["progress"]
-    progress["completed"] = calc["completed"]
+    # Stored counters are authoritative; older docs are evaluated once
+    if "completed_modules" not in progress:
+        evaluation = await evaluate_course_progress(
+            user["id"], course_id, progress_doc=progress
+        )
+        if evaluation:
+            progress.update(await store_evaluation(user["id"], course_id, evaluation))
+    progress["modules_progress"] = modules_progress_list(progress)
 
     # Check for certificate
     certificate = await db.certificates.find_one(
@@ -1171,10 +1144,10 @@ async def mark_module_complete(
     data: MarkModuleCompleteRequest, user: dict = Depends(get_current_user)
 ):
     """Mark a module as completed"""
-    if data.course_id not in user.get("enrolled_courses", []):
+    if not await is_enrolled(user, data.course_id):
         raise HTTPException(status_code=403, detail="Not enrolled in this course")
 
-    course = await db.courses.find_one({"id": data.course_id}, {"_id": 0})
+    course = await course_repository.get_by_id(data.course_id)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
 
@@ -1183,53 +1156,22 @@ async def mark_module_complete(
     if not module_exists:
         raise HTTPException(status_code=404, detail="Module not found")
 
-    now = datetime.now(timezone.utc).isoformat()
-
-    # Update or create module progress
-    progress = await db.course_progress.find_one(
-        {"user_id": user["id"], "course_id": data.course_id}
+    counters = await complete_module(
+        user["id"],
+        data.course_id,
+        data.module_id,
+        data.time_spent_minutes,
+        await get_course_totals(course),
     )
 
-    if progress:
-        modules_progress = progress.get("modules_progress", [])
-        existing_idx = next(
-            (
-                i
-                for i, m in enumerate(modules_progress)
-                if m["module_id"] == data.module_id
-            ),
-            None,
-        )
-
-        if existing_idx is not None:
-            modules_progress[existing_idx]["completed"] = True
-            modules_progress[existing_idx]["completed_at"] = now
-            modules_progress[existing_idx][
-                "time_spent_minutes"
-            ] += data.time_spent_minutes
-        else:
-            modules_progress.append(
-                {
-                    "module_id": data.module_id,
-                    "completed": True,
-                    "completed_at": now,
-                    "time_spent_minutes": data.time_spent_minutes,
-                }
-            )
-
-        await db.course_progress.update_one(
-            {"user_id": user["id"], "course_id": data.course_id},
-            {"$set": {"modules_progress": modules_progress, "last_accessed": now}},
-        )
-
-    # Check if eligible for certificate
-    certificate = await check_and_issue_certificate(user["id"], data.course_id)
-
-    calc = await calculate_course_progress(user["id"], data.course_id)
+    # Only a fully completed course can qualify for a certificate
+    certificate = None
+    if counters and counters["completed"]:
+        certificate = await check_and_issue_certificate(user["id"], data.course_id)
 
     return {
         "message": "Module marked as complete",
-        "overall_progress": calc["progress"],
+        "overall_progress": counters["overall_progress"] if counters else 0,
         "certificate_issued": certificate is not None,
         "certificate": certificate,
     }
@@ -1238,10 +1180,10 @@ async def mark_module_complete(
 @api_router.post("/progress/quiz/submit")
 async def submit_quiz(data: SubmitQuizRequest, user: dict = Depends(get_current_user)):
     """Submit quiz answers and get score"""
-    if data.course_id not in user.get("enrolled_courses", []):
+    if not await is_enrolled(user, data.course_id):
         raise HTTPException(status_code=403, detail="Not enrolled in this course")
 
-    course = await db.courses.find_one({"id": data.course_id}, {"_id": 0})
+    course = await course_repository.get_by_id(data.course_id)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
 
@@ -1281,7 +1223,7 @@ async def submit_quiz(data: SubmitQuizRequest, user: dict = Depends(get_current_
     score = (correct / total * 100) if total > 0 else 0
     passed = score >= PASS_SCORE
 
-    now = datetime.now(timezone.utc).isoformat()
+    now = datetime.now(timezone.utc)
     attempt = {
         "attempt_number": len(quiz_progress.get("attempts", [])) + 1,
         "score": score,
@@ -1294,17 +1236,23 @@ async def submit_quiz(data: SubmitQuizRequest, user: dict = Depends(get_current_
     quiz_progress["best_score"] = max(quiz_progress.get("best_score", 0), score)
     quiz_progress["passed"] = quiz_progress.get("passed", False) or passed
 
-    await db.course_progress.update_one(
-        {"user_id": user["id"], "course_id": data.course_id},
-        {"$set": {"quiz_progress": quiz_progress, "last_accessed": now}},
+    counters = await update_progress_counters(
+        user["id"],
+        data.course_id,
+        {
+            "$set": {
+                "quiz_progress": quiz_progress,
+                "quiz_passed": quiz_progress["passed"],
+                "last_accessed": now,
+            }
+        },
+        await get_course_totals(course),
     )
 
     # Check if eligible for certificate
-    certificate = (
-        await check_and_issue_certificate(user["id"], data.course_id)
-        if passed
-        else None
-    )
+    certificate = None
+    if passed and counters and counters["completed"]:
+        certificate = await check_and_issue_certificate(user["id"], data.course_id)
 
     attempts_remaining = MAX_QUIZ_ATTEMPTS - len(quiz_progress["attempts"])
 
@@ -1325,97 +1273,191 @@ async def submit_quiz(data: SubmitQuizRequest, user: dict = Depends(get_current_
 # Create images directory
 (UPLOAD_DIR / "images").mkdir(exist_ok=True)
 
-ALLOWED_IMAGE_TYPES = ["image/jpeg", "image/png", "image/webp", "image/gif"]
-MAX_IMAGE_SIZE = 10 * 1024 * 1024  # 10MB
 
+def _upload_key(user: dict, upload_id: Optional[str]) -> Optional[str]:
+    # Progress is looked up per user, so ids chosen by clients never collide
+    return f"{user['id']}:{upload_id}" if upload_id else None
 
-@api_router.post("/upload/image")
-async def upload_image(
-    file: UploadFile = File(...), user: dict = Depends(require_trainer_or_admin)
-):
-    """Upload an image file for course/workshop banners"""
-    if file.content_type not in ALLOWED_IMAGE_TYPES:
-        raise HTTPException(
-            status_code=400, detail=f"Invalid file type. Allowed: JPEG, PNG, WebP, GIF"
-        )
 
-    # Check file size
-    file.file.seek(0, 2)
-    size = file.file.tell()
-    file.file.seek(0)
+@api_router.get("/upload/progress/{upload_id}")
+async def get_upload_progress(
+    upload_id: str, user: dict = Depends(require_trainer_or_admin)
+):
+    """Progress of an upload started with an X-Upload-Id header"""
+    progress = await load_progress(_upload_key(user, upload_id))
+    if not progress:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return {**progress, "upload_id": upload_id}
 
-    if size > MAX_IMAGE_SIZE:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File too large. Max size: {MAX_IMAGE_SIZE // (1024*1024)}MB",
-        )
 
+async def _ingest(request: Request, kind: str, user: dict, upload_id: Optional[str]):
+    # Allowed types and size limits per kind live in UPLOAD_RULES
     try:
-        result = await storage_service.upload_file(file, "images")
-        logger.info(f"Image uploaded: {result['url']} by user {user['id']}")
-        return result
+        result = await ingest_upload(
+            request, storage_service, UPLOAD_RULES[kind], _upload_key(user, upload_id)
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Upload failed: {str(e)}")
         raise HTTPException(status_code=500, detail="File upload failed")
+    logger.info(f"{kind.title()} uploaded: {result['url']} by user {user['id']}")
+    return result
+
+
+async def _with_transcode(result: dict) -> dict:
+    # services.storage keeps the original response keys: content_type, not type
+    transcode = await video_transcoder.enqueue(
+        storage_service, result["url"], result["content_type"]
+    )
+    if transcode is not None:
+        result = {**result, "transcode": transcode}
+    return result
+
+
+@api_router.post("/upload/image")
+async def upload_image(
+    request: Request,
+    upload_id: Optional[str] = Header(None, alias="X-Upload-Id"),
+    user: dict = Depends(require_trainer_or_admin),
+):
+    """
+    Upload an image file for course/workshop banners. Resized renditions are
+    rendered in the background; `derivatives` lists them once they exist.
+    """
+    result = await _ingest(request, "image", user, upload_id)
+    result["derivatives"] = await image_derivatives.enqueue(
+        storage_service, result["url"]
+    )
+    return result
 
 
 @api_router.post("/upload/video")
 async def upload_video(
-    file: UploadFile = File(...), user: dict = Depends(require_trainer_or_admin)
+    request: Request,
+    upload_id: Optional[str] = Header(None, alias="X-Upload-Id"),
+    user: dict = Depends(require_trainer_or_admin),
 ):
-    """Upload a video file for course modules"""
-    if file.content_type not in ALLOWED_VIDEO_TYPES:
-        raise HTTPException(
-            status_code=400, detail=f"Invalid file type. Allowed: {ALLOWED_VIDEO_TYPES}"
-        )
-
-    # Check file size
-    file.file.seek(0, 2)  # Seek to end
-    size = file.file.tell()
-    file.file.seek(0)  # Reset
+    """
+    Upload a video file for course modules. HLS renditions are transcoded in
+    the background; `transcode` carries the job status.
+    """
+    return await _with_transcode(await _ingest(request, "video", user, upload_id))
 
-    if size > MAX_VIDEO_SIZE:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File too large. Max size: {MAX_VIDEO_SIZE // (1024*1024)}MB",
-        )
 
-    try:
-        result = await storage_service.upload_file(file, "videos")
-        logger.info(f"Video uploaded: {result['url']} by user {user['id']}")
-        return result
-    except Exception as e:
-        logger.error(f"Upload failed: {str(e)}")
-        raise HTTPException(status_code=500, detail="File upload failed")
+@api_router.get("/upload/video/transcode")
+async def get_video_transcode(
+    url: str = Query(...), user: dict = Depends(require_trainer_or_admin)
+):
+    """Status of a video's HLS transcode, with the manifest URL once done"""
+    job = await get_transcode(url)
+    if job is None:
+        raise HTTPException(status_code=404, detail="No transcode for this video")
+    return job
 
 
 @api_router.post("/upload/document")
 async def upload_document(
-    file: UploadFile = File(...), user: dict = Depends(require_trainer_or_admin)
+    request: Request,
+    upload_id: Optional[str] = Header(None, alias="X-Upload-Id"),
+    user: dict = Depends(require_trainer_or_admin),
 ):
     """Upload a document file for course materials"""
-    if file.content_type not in ALLOWED_DOC_TYPES:
-        raise HTTPException(
-            status_code=400, detail=f"Invalid file type. Allowed: PDF, PPTX, DOCX"
-        )
+    return await _ingest(request, "document", user, upload_id)
 
-    file.file.seek(0, 2)
-    size = file.file.tell()
-    file.file.seek(0)
 
-    if size > MAX_DOC_SIZE:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File too large. Max size: {MAX_DOC_SIZE // (1024*1024)}MB",
-        )
+# Resumable uploads
 
-    try:
-        result = await storage_service.upload_file(file, "documents")
-        logger.info(f"Document uploaded: {result['url']} by user {user['id']}")
-        return result
-    except Exception as e:
-        logger.error(f"Upload failed: {str(e)}")
-        raise HTTPException(status_code=500, detail="File upload failed")
+
+@api_router.post("/upload/sessions")
+async def create_upload_session(
+    data: UploadSessionCreate, user: dict = Depends(require_trainer_or_admin)
+):
+    """Start a resumable upload; the file is then PUT in chunk_size pieces"""
+    return await create_session(
+        storage_service,
+        user,
+        data.kind,
+        data.filename,
+        data.content_type,
+        data.size,
+        data.sha256,
+    )
+
+
+@api_router.get("/upload/sessions/{session_id}")
+async def get_upload_session(
+    session_id: str, user: dict = Depends(require_trainer_or_admin)
+):
+    """Current offset of a resumable upload, to resume after a dropped chunk"""
+    return session_status(await get_session(session_id, user))
+
+
+@api_router.put("/upload/sessions/{session_id}")
+async def put_upload_chunk(
+    session_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    user: dict = Depends(require_trainer_or_admin),
+):
+    """Store the chunk starting at `offset` (raw bytes in the request body)"""
+    session = await get_session(session_id, user)
+    return await write_chunk(storage_service, session, offset, request.stream())
+
+
+@api_router.post("/upload/sessions/{session_id}/complete")
+async def complete_upload_session(
+    session_id: str, user: dict = Depends(require_trainer_or_admin)
+):
+    """Assemble the chunks; returns the same result as a single-request upload"""
+    session = await get_session(session_id, user)
+    result = await complete_session(storage_service, session)
+    logger.info(f"Chunked upload completed: {result['url']} by user {user['id']}")
+    return await _with_transcode(result)
+
+
+@api_router.delete("/upload/sessions/{session_id}")
+async def abort_upload_session(
+    session_id: str, user: dict = Depends(require_trainer_or_admin)
+):
+    """Abandon a resumable upload and discard its chunks"""
+    await abort_session(storage_service, await get_session(session_id, user))
+    return {"message": "Upload aborted"}
+
+
+# Direct-to-storage uploads
+
+
+@api_router.post("/upload/intents")
+async def create_upload_intent(
+    data: UploadIntentCreate, user: dict = Depends(require_trainer_or_admin)
+):
+    """
+    Presigned POST and PUT targets to upload straight to the bucket, then
+    call complete. Without S3 the intent points at the regular upload route.
+    """
+    return await create_intent(
+        storage_service,
+        user,
+        data.kind,
+        data.filename,
+        data.content_type,
+        data.size,
+        data.sha256,
+    )
+
+
+@api_router.post("/upload/intents/{intent_id}/complete")
+async def complete_upload_intent(
+    intent_id: str, user: dict = Depends(require_trainer_or_admin)
+):
+    """Verify and register a direct upload; same result as a regular upload"""
+    result = await complete_intent(storage_service, user, intent_id)
+    logger.info(f"Direct upload completed: {result['url']} by user {user['id']}")
+    derivatives = await image_derivatives.enqueue(storage_service, result["url"])
+    if derivatives is not None:
+        result = {**result, "derivatives": derivatives}
+    return await _with_transcode(result)
 
 
 # ============== ASSIGNMENT ROUTES ==============
@@ -1435,7 +1477,7 @@ async def get_course_assignments(
         submission = await db.submissions.find_one(
             {"assignment_id": assignment["id"], "user_id": user["id"]}, {"_id": 0}
         )
-        assignment["submission"] = submission
+        assignment["submission"] = with_signed_file(submission)
 
     return assignments
 
@@ -1445,7 +1487,7 @@ async def create_assignment(
     data: AssignmentCreate, user: dict = Depends(require_trainer_or_admin)
 ):
     """Create a new assignment for a course"""
-    course = await db.courses.find_one({"id": data.course_id})
+    course = await course_repository.get_by_id(data.course_id)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
 
@@ -1455,7 +1497,7 @@ async def create_assignment(
             status_code=403, detail="You can only add assignments to your own courses"
         )
 
-    now = datetime.now(timezone.utc).isoformat()
+    now = datetime.now(timezone.utc)
     assignment_doc = {
         "id": str(uuid.uuid4()),
         **data.model_dump(),
@@ -1501,7 +1543,7 @@ async def submit_assignment(
         raise HTTPException(status_code=404, detail="Assignment not found")
 
     # Check if user is enrolled in the course
-    if assignment["course_id"] not in user.get("enrolled_courses", []):
+    if not await is_enrolled(user, assignment["course_id"]):
         raise HTTPException(status_code=403, detail="Not enrolled in this course")
 
     # Check for existing submission
@@ -1524,7 +1566,7 @@ async def submit_assignment(
 
     file_url = f"/uploads/assignments/{unique_name}"
 
-    now = datetime.now(timezone.utc).isoformat()
+    now = datetime.now(timezone.utc)
     submission_doc = {
         "id": str(uuid.uuid4()),
         "assignment_id": assignment_id,
@@ -1543,7 +1585,7 @@ async def submit_assignment(
     if "_id" in submission_doc:
         del submission_doc["_id"]
 
-    return submission_doc
+    return with_signed_file(submission_doc)
 
 
 @api_router.get("/assignments/{assignment_id}/submissions")
@@ -1573,6 +1615,7 @@ async def get_assignment_submissions(
         if sub_user:
             sub["user_name"] = f"{sub_user['first_name']} {sub_user['last_name']}"
             sub["user_email"] = sub_user["email"]
+        with_signed_file(sub)
 
     return submissions
 
@@ -1604,28 +1647,40 @@ async def grade_submission(
             detail=f"Grade must be between 0 and {assignment.get('max_score', 100)}",
         )
 
-    now = datetime.now(timezone.utc).isoformat()
-    await db.submissions.update_one(
-        {"id": submission_id},
-        {
-            "$set": {
-                "grade": data.grade,
-                "feedback": data.feedback,
-                "graded_at": now,
-                "graded_by": user["id"],
-            }
-        },
-    )
+    now = datetime.now(timezone.utc)
+    grade = {
+        "$set": {
+            "grade": data.grade,
+            "feedback": data.feedback,
+            "graded_at": now,
+            "graded_by": user["id"],
+        }
+    }
+    # Conditional, so of two concurrent first grades only one counts
+    first = await db.submissions.update_one({"id": submission_id, "grade": None}, grade)
+    if not first.matched_count:
+        await db.submissions.update_one({"id": submission_id}, grade)
 
-    # Check if student now qualifies for certificate
+    # First grade on a required assignment counts towards progress
     student_id = submission["user_id"]
     course_id = assignment["course_id"]
+    if assignment.get("is_required", True) and first.matched_count:
+        course = await course_repository.get_by_id(course_id)
+        if course:
+            await update_progress_counters(
+                student_id,
+                course_id,
+                {"$inc": {"graded_required_assignments": 1}},
+                await get_course_totals(course),
+            )
+
+    # Check if student now qualifies for certificate
     certificate = await check_and_issue_certificate(student_id, course_id)
 
     updated = await db.submissions.find_one({"id": submission_id}, {"_id": 0})
     updated["certificate_issued"] = certificate is not None
 
-    return updated
+    return with_signed_file(updated)
 
 
 # ============== CERTIFICATE ROUTES ==============
@@ -1673,14 +1728,15 @@ async def verify_certificate(certificate_number: str):
 
 # Trainer Course Management
 @api_router.get("/trainer/courses")
-async def get_trainer_courses(user: dict = Depends(require_trainer_or_admin)):
+async def get_trainer_courses(
+    view: str = "summary",
+    fields: Optional[str] = None,
+    user: dict = Depends(require_trainer_or_admin),
+):
     """Get courses - trainers see their own, admins see all"""
-    if user["role"] == "admin":
-        courses = await db.courses.find({}, {"_id": 0}).to_list(100)
-    else:
-        courses = await db.courses.find({"created_by": user["id"]}, {"_id": 0}).to_list(
-            100
-        )
+    query = {} if user["role"] == "admin" else {"created_by": user["id"]}
+    projection = course_list_projection(view, fields)
+    courses = await db.courses.find(query, projection).to_list(100)
     return courses
 
 
@@ -1695,12 +1751,13 @@ async def trainer_create_course(
         )
 
     course_id = str(uuid.uuid4())
-    now = datetime.now(timezone.utc).isoformat()
+    now = datetime.now(timezone.utc)
 
     course_doc = {
         "id": course_id,
         **course_data.model_dump(),
         "enrolled_count": 0,
+        "version": 1,
         "created_at": now,
         "updated_at": now,
         "created_by": user["id"],
@@ -1709,6 +1766,7 @@ async def trainer_create_course(
     await db.courses.insert_one(course_doc)
     if "_id" in course_doc:
         del course_doc["_id"]
+    await refresh_course_streams(course_id)
     return course_doc
 
 
@@ -1727,13 +1785,17 @@ async def trainer_update_course(
             status_code=403, detail="You can only edit your own courses"
         )
 
-    update_doc = {"updated_at": datetime.now(timezone.utc).isoformat()}
+    update_doc = {"updated_at": datetime.now(timezone.utc)}
 
     for field, value in course_data.model_dump(exclude_unset=True).items():
         if value is not None:
             update_doc[field] = value
 
-    await db.courses.update_one({"id": course_id}, {"$set": update_doc})
+    await db.courses.update_one(
+        {"id": course_id}, {"$set": update_doc, "$inc": {"version": 1}}
+    )
+    course_repository.invalidate(course_id)
+    await refresh_course_streams(course_id)
     updated = await db.courses.find_one({"id": course_id}, {"_id": 0})
     return updated
 
@@ -1752,9 +1814,79 @@ async def trainer_delete_course(
         )
 
     await db.courses.delete_one({"id": course_id})
+    course_repository.invalidate(course_id)
     return {"message": "Course deleted successfully"}
 
 
+async def _get_editable_course(course_id: str, user: dict) -> dict:
+    course = await db.courses.find_one(
+        {"id": course_id}, {"_id": 0, "id": 1, "created_by": 1}
+    )
+    if not course:
+        raise HTTPException(status_code=404, detail="Course not found")
+    if user["role"] == "trainer" and course.get("created_by") != user["id"]:
+        raise HTTPException(
+            status_code=403, detail="You can only edit your own courses"
+        )
+    return course
+
+
+async def _write_course_modules(course_id: str, query: dict, update: dict):
+    """Apply a single-module update; every course write bumps `version`"""
+    now = datetime.now(timezone.utc)
+    update.setdefault("$set", {})["updated_at"] = now
+    update["$inc"] = {"version": 1}
+    result = await db.courses.update_one({"id": course_id, **query}, update)
+    course_repository.invalidate(course_id)
+    await refresh_course_streams(course_id)
+    return result
+
+
+@api_router.post("/trainer/courses/{course_id}/modules")
+async def trainer_add_module(
+    course_id: str,
+    module: CourseModule,
+    user: dict = Depends(require_trainer_or_admin),
+):
+    await _get_editable_course(course_id, user)
+    module_doc = module.model_dump()
+    await _write_course_modules(course_id, {}, {"$push": {"modules": module_doc}})
+    return module_doc
+
+
+@api_router.put("/trainer/courses/{course_id}/modules/{module_id}")
+async def trainer_update_module(
+    course_id: str,
+    module_id: str,
+    module: CourseModule,
+    user: dict = Depends(require_trainer_or_admin),
+):
+    """Replace one module in place instead of rewriting the modules array"""
+    await _get_editable_course(course_id, user)
+    module_doc = {**module.model_dump(), "id": module_id}
+    result = await _write_course_modules(
+        course_id, {"modules.id": module_id}, {"$set": {"modules.$": module_doc}}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Module not found")
+    return module_doc
+
+
+@api_router.delete("/trainer/courses/{course_id}/modules/{module_id}")
+async def trainer_delete_module(
+    course_id: str, module_id: str, user: dict = Depends(require_trainer_or_admin)
+):
+    await _get_editable_course(course_id, user)
+    result = await _write_course_modules(
+        course_id,
+        {"modules.id": module_id},
+        {"$pull": {"modules": {"id": module_id}}},
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Module not found")
+    return {"message": "Module deleted successfully"}
+
+
 # ============== OPEN SOURCE LEARNING PATHS ==============
 
 
@@ -1918,7 +2050,7 @@ Generate a 4-8 week roadmap with specific, real open-source resources."""
 
     try:
         path_id = str(uuid.uuid4())
-        now = datetime.now(timezone.utc).isoformat()
+        now = datetime.now(timezone.utc)
 
         path_doc = {
             "id": path_id,
@@ -1976,8 +2108,8 @@ async def get_lab_by_slug(slug: str, user: dict = Depends(get_optional_user)):
 
     is_completed = False
     if user:
-        if lab["id"] in user.get("completed_labs", []):
-            is_completed = True
+        memberships = await load_memberships(user["id"])
+        is_completed = lab["id"] in memberships["completed_labs"]
         await log_access(user["id"], "lab", lab["id"], "view")
 
     return {**lab, "is_completed": is_completed}
@@ -1999,10 +2131,12 @@ async def complete_lab(lab_id: str, user: dict = Depends(get_current_user)):
     if not lab:
         raise HTTPException(status_code=404, detail="Lab not found")
 
-    if lab_id not in user.get("completed_labs", []):
-        await db.users.update_one(
-            {"id": user["id"]}, {"$push": {"completed_labs": lab_id}}
-        )
+    # $addToSet keeps this idempotent even if the cached user is stale
+    result = await db.users.update_one(
+        {"id": user["id"]}, {"$addToSet": {"completed_labs": lab_id}}
+    )
+    if result.modified_count:
+        invalidate_user(user["id"])
         await db.labs.update_one({"id": lab_id}, {"$inc": {"completions_count": 1}})
 
     await log_access(user["id"], "lab", lab_id, "complete")
@@ -2128,7 +2262,7 @@ async def save_lab_progress(
     if not lab:
         raise HTTPException(status_code=404, detail="Lab not found")
 
-    now = datetime.now(timezone.utc).isoformat()
+    now = datetime.now(timezone.utc)
 
     # Update or create lab progress
     progress = await db.lab_progress.find_one({"user_id": user["id"], "lab_id": lab_id})
@@ -2191,7 +2325,7 @@ async def trainer_create_lab(
         raise HTTPException(status_code=400, detail="Lab with this slug already exists")
 
     lab_id = str(uuid.uuid4())
-    now = datetime.now(timezone.utc).isoformat()
+    now = datetime.now(timezone.utc)
 
     lab_doc = {
         "id": lab_id,
@@ -2244,106 +2378,60 @@ async def trainer_delete_lab(
 
 
 @api_router.get("/admin/stats")
-async def get_admin_stats(admin: dict = Depends(require_admin)):
-    total_users = await db.users.count_documents({})
-    total_learners = await db.users.count_documents({"role": "learner"})
-    total_trainers = await db.users.count_documents({"role": "trainer"})
-    total_courses = await db.courses.count_documents({})
-    total_workshops = await db.workshops.count_documents({})
-    total_labs = await db.labs.count_documents({})
-    total_paths = await db.learning_paths.count_documents({})
-    published_courses = await db.courses.count_documents({"is_published": True})
-    published_labs = await db.labs.count_documents({"is_published": True})
-    active_workshops = await db.workshops.count_documents({"is_active": True})
-
-    # Get total enrollments
-    pipeline = [{"$group": {"_id": None, "total": {"$sum": "$enrolled_count"}}}]
-    enrollment_result = await db.courses.aggregate(pipeline).to_list(1)
-    total_enrollments = enrollment_result[0]["total"] if enrollment_result else 0
-
-    # Get total lab completions
-    pipeline = [{"$group": {"_id": None, "total": {"$sum": "$completions_count"}}}]
-    completion_result = await db.labs.aggregate(pipeline).to_list(1)
-    total_completions = completion_result[0]["total"] if completion_result else 0
-
-    return {
-        "total_users": total_users,
-        "total_learners": total_learners,
-        "total_trainers": total_trainers,
-        "total_courses": total_courses,
-        "published_courses": published_courses,
-        "total_workshops": total_workshops,
-        "active_workshops": active_workshops,
-        "total_labs": total_labs,
-        "published_labs": published_labs,
-        "total_learning_paths": total_paths,
-        "total_enrollments": total_enrollments,
-        "total_lab_completions": total_completions,
-    }
+async def get_admin_stats(refresh: bool = False, admin: dict = Depends(require_admin)):
+    """Platform totals from the periodically refreshed snapshot"""
+    return await admin_stats.get("stats", refresh=refresh)
 
 
 @api_router.get("/admin/analytics")
-async def get_admin_analytics(admin: dict = Depends(require_admin)):
+async def get_admin_analytics(
+    refresh: bool = False, admin: dict = Depends(require_admin)
+):
     """Get detailed analytics data for admin dashboard"""
-    now = datetime.now(timezone.utc)
-
-    # Access logs by content type (last 30 days)
-    thirty_days_ago = (now - timedelta(days=30)).isoformat()
-
-    pipeline = [
-        {"$match": {"timestamp": {"$gte": thirty_days_ago}}},
-        {
-            "$group": {
-                "_id": {"content_type": "$content_type", "action": "$action"},
-                "count": {"$sum": 1},
-            }
-        },
-    ]
-    access_stats = await db.access_logs.aggregate(pipeline).to_list(100)
-
-    # Users by role
-    role_pipeline = [{"$group": {"_id": "$role", "count": {"$sum": 1}}}]
-    users_by_role = await db.users.aggregate(role_pipeline).to_list(10)
-
-    # Top courses by enrollment
-    top_courses = (
-        await db.courses.find(
-            {"is_published": True},
-            {"_id": 0, "title": 1, "enrolled_count": 1, "category": 1},
-        )
-        .sort("enrolled_count", -1)
-        .limit(5)
-        .to_list(5)
-    )
-
-    # Top labs by completions
-    top_labs = (
-        await db.labs.find(
-            {"is_published": True},
-            {"_id": 0, "title": 1, "completions_count": 1, "technology": 1},
-        )
-        .sort("completions_count", -1)
-        .limit(5)
-        .to_list(5)
+    return await admin_stats.get("analytics", refresh=refresh)
+
+
+@api_router.get("/admin/access-logs/archive")
+async def get_archived_access_logs(
+    start: datetime,
+    end: datetime,
+    content_type: Optional[str] = None,
+    content_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    action: Optional[str] = None,
+    limit: int = 1000,
+    admin: dict = Depends(require_admin),
+):
+    """Query access-log events that were moved to the Parquet archive"""
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if end - start > timedelta(days=31):
+        raise HTTPException(status_code=400, detail="Range is limited to 31 days")
+
+    frame = await asyncio.to_thread(
+        read_archived_access_logs,
+        start,
+        end,
+        content_type=content_type,
+        content_id=content_id,
+        user_id=user_id,
+        action=action,
     )
+    items = frame.head(max(limit, 0)).to_dict("records")
+    for item in items:
+        item["timestamp"] = item["timestamp"].isoformat()
+    return {"items": items, "total": len(frame)}
 
-    # Courses by category
-    category_pipeline = [{"$group": {"_id": "$category", "count": {"$sum": 1}}}]
-    courses_by_category = await db.courses.aggregate(category_pipeline).to_list(20)
-
-    # Recent signups (last 7 days)
-    seven_days_ago = (now - timedelta(days=7)).isoformat()
-    recent_signups = await db.users.count_documents(
-        {"created_at": {"$gte": seven_days_ago}}
-    )
 
+@api_router.get("/admin/uploads/orphans")
+async def get_orphaned_uploads(
+    grace_hours: Optional[float] = Query(None, ge=0),
+    admin: dict = Depends(require_admin),
+):
+    """Dry run of the orphaned-upload collector, with its last recorded run"""
     return {
-        "access_stats": access_stats,
-        "users_by_role": users_by_role,
-        "top_courses": top_courses,
-        "top_labs": top_labs,
-        "courses_by_category": courses_by_category,
-        "recent_signups": recent_signups,
+        "report": await collect_orphans(storage_service, grace_hours, dry_run=True),
+        "last_run": await last_report(),
     }
 
 
@@ -2372,10 +2460,11 @@ async def update_user_role(
         {
             "$set": {
                 "role": role_data.role,
-                "updated_at": datetime.now(timezone.utc).isoformat(),
+                "updated_at": datetime.now(timezone.utc),
             }
         },
     )
+    invalidate_user(user_id)
 
     updated_user = await db.users.find_one(
         {"id": user_id}, {"_id": 0, "password_hash": 0}
@@ -2384,8 +2473,13 @@ async def update_user_role(
 
 
 @api_router.get("/admin/courses")
-async def get_all_courses(admin: dict = Depends(require_admin)):
-    courses = await db.courses.find({}, {"_id": 0}).to_list(100)
+async def get_all_courses(
+    view: str = "summary",
+    fields: Optional[str] = None,
+    admin: dict = Depends(require_admin),
+):
+    projection = course_list_projection(view, fields)
+    courses = await db.courses.find({}, projection).to_list(100)
     return courses
 
 
@@ -2400,12 +2494,13 @@ async def admin_create_course(
         )
 
     course_id = str(uuid.uuid4())
-    now = datetime.now(timezone.utc).isoformat()
+    now = datetime.now(timezone.utc)
 
     course_doc = {
         "id": course_id,
         **course_data.model_dump(),
         "enrolled_count": 0,
+        "version": 1,
         "created_at": now,
         "updated_at": now,
         "created_by": admin["id"],
@@ -2414,6 +2509,7 @@ async def admin_create_course(
     await db.courses.insert_one(course_doc)
     if "_id" in course_doc:
         del course_doc["_id"]
+    await refresh_course_streams(course_id)
     return course_doc
 
 
@@ -2425,13 +2521,17 @@ async def admin_update_course(
     if not existing:
         raise HTTPException(status_code=404, detail="Course not found")
 
-    update_doc = {"updated_at": datetime.now(timezone.utc).isoformat()}
+    update_doc = {"updated_at": datetime.now(timezone.utc)}
 
     for field, value in course_data.model_dump(exclude_unset=True).items():
         if value is not None:
             update_doc[field] = value
 
-    await db.courses.update_one({"id": course_id}, {"$set": update_doc})
+    await db.courses.update_one(
+        {"id": course_id}, {"$set": update_doc, "$inc": {"version": 1}}
+    )
+    course_repository.invalidate(course_id)
+    await refresh_course_streams(course_id)
     updated = await db.courses.find_one({"id": course_id}, {"_id": 0})
     return updated
 
@@ -2439,6 +2539,7 @@ async def admin_update_course(
 @api_router.delete("/admin/courses/{course_id}")
 async def admin_delete_course(course_id: str, admin: dict = Depends(require_admin)):
     result = await db.courses.delete_one({"id": course_id})
+    course_repository.invalidate(course_id)
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Course not found")
     return {"message": "Course deleted successfully"}
@@ -2455,7 +2556,7 @@ async def admin_create_workshop(
     workshop_data: WorkshopCreate, admin: dict = Depends(require_admin)
 ):
     workshop_id = str(uuid.uuid4())
-    now = datetime.now(timezone.utc).isoformat()
+    now = datetime.now(timezone.utc)
 
     workshop_doc = {
         "id": workshop_id,
@@ -2492,7 +2593,7 @@ async def admin_create_lab(lab_data: LabCreate, admin: dict = Depends(require_ad
         raise HTTPException(status_code=400, detail="Lab with this slug already exists")
 
     lab_id = str(uuid.uuid4())
-    now = datetime.now(timezone.utc).isoformat()
+    now = datetime.now(timezone.utc)
 
     lab_doc = {
         "id": lab_id,
@@ -2562,13 +2663,33 @@ app.add_middleware(
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await progress_reconciler.stop()
+    await admin_stats.stop()
+    await access_log_archiver.stop()
+    await access_log_writer.stop()
+    password_hasher.shutdown()
+    await image_derivatives.stop()
+    await video_transcoder.stop()
+    await upload_collector.stop()
+    storage_service.shutdown()
     client.close()
 
 
+@app.on_event("startup")
+async def start_background_workers():
+    access_log_writer.start()
+    progress_reconciler.start()
+    admin_stats.start()
+    access_log_archiver.start()
+    image_derivatives.start()
+    video_transcoder.start(storage_service)
+    upload_collector.start(storage_service)
+
+
 # Seed initial data on startup
 @app.on_event("startup")
 async def seed_data():
-    now = datetime.now(timezone.utc).isoformat()
+    now = datetime.now(timezone.utc)
 
     # Get or create admin user
     admin_user = await db.users.find_one({"email": "admin@pluralskill.com"})
@@ -2577,7 +2698,7 @@ async def seed_data():
         admin_user = {
             "id": str(uuid.uuid4()),
             "email": "admin@pluralskill.com",
-            "password_hash": hash_password("admin123"),
+            "password_hash": await hash_password("admin123"),
             "first_name": "Admin",
             "last_name": "User",
             "bio": "Platform Administrator",
@@ -2599,7 +2720,7 @@ async def seed_data():
         trainer_user = {
             "id": str(uuid.uuid4()),
             "email": "trainer@pluralskill.com",
-            "password_hash": hash_password("trainer123"),
+            "password_hash": await hash_password("trainer123"),
             "first_name": "Sarah",
             "last_name": "Trainer",
             "bio": "Course Instructor",
@@ -3120,8 +3241,15 @@ async def seed_data():
         )
 
         # Access logs
-        await db.access_logs.create_index("timestamp")
         await db.access_logs.create_index("content_type")
+        await create_rollup_indexes(db)
+        await create_archive_indexes(db)
+        await create_upload_progress_indexes(db)
+        await create_upload_session_indexes(db)
+        await create_upload_intent_indexes(db)
+        await create_blob_indexes(db)
+        await create_image_indexes(db)
+        await create_transcode_indexes(db)
 
         logger.info("MongoDB indexes created successfully")
     except Exception as e:
@@ -0,0 +1,168 @@
+"""
+Fixtures for the storage and upload tests. These run without a server:
+MongoDB is replaced by mongomock-motor and S3 by moto.
+"""
+
+import copy
+import os
+
+import boto3
+import mongomock.collection
+import mongomock.filtering
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from moto import mock_aws
+
+# app.core.config reads these at import time
+os.environ.setdefault("JWT_SECRET", "test-secret")
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test")
+# moto's multipart checksums lack the "-<parts>" suffix botocore validates
+os.environ.setdefault("AWS_RESPONSE_CHECKSUM_VALIDATION", "when_required")
+
+from app.db.session import db  # noqa: E402
+from app.services.storage import StorageService  # noqa: E402
+
+BUCKET = "test-uploads"
+
+
+def _find_one_and_update(find_one_and_update):
+    # mongomock looks the updated document up again by _id, or by the
+    # original filter when the projection hides _id; the latter misses
+    # documents the update moved out of the filter
+    def wrapper(self, filter, update, projection=None, *args, **kwargs):
+        hide_id = isinstance(projection, dict) and projection.get("_id") == 0
+        if hide_id:
+            projection = {k: v for k, v in projection.items() if k != "_id"} or None
+        doc = find_one_and_update(self, filter, update, projection, *args, **kwargs)
+        if hide_id and doc is not None:
+            doc.pop("_id", None)
+        return doc
+
+    return wrapper
+
+
+def _matches(conditions: dict, element) -> bool:
+    return isinstance(element, dict) and mongomock.filtering.filter_applies(
+        conditions, element
+    )
+
+
+def _apply_positional(value, original, parts, operator, new, filters):
+    """
+    Apply one $set/$unset whose path has $[] or $[<identifier>] parts.
+    Filters are matched against the document as it was before the update.
+    """
+    part, rest = parts[0], parts[1:]
+    if part.startswith("$["):
+        name = part[2:-1]
+        for element, before in zip(value, original):
+            if not name or _matches(filters[name], before):
+                _apply_positional(element, before, rest, operator, new, filters)
+    elif not rest:
+        if operator == "$set":
+            value[part] = new
+        else:
+            value.pop(part, None)
+    elif part in value:
+        _apply_positional(value[part], original[part], rest, operator, new, filters)
+
+
+def _update_one(update_one):
+    # mongomock has no arrayFilters; apply the positional $set/$unset paths to
+    # the matched document here and write back the top-level fields they touch
+    def wrapper(self, filter, update, *args, array_filters=None, **kwargs):
+        if not array_filters:
+            return update_one(self, filter, update, *args, **kwargs)
+        filters = {}
+        for array_filter in array_filters:
+            for path, condition in array_filter.items():
+                name, _, field = path.partition(".")
+                filters.setdefault(name, {})[field] = condition
+        doc = self.find_one(filter)
+        if doc is None:
+            return update_one(self, filter, update, *args, **kwargs)
+        original = copy.deepcopy(doc)
+        rest, touched = {}, {}
+        for operator, fields in update.items():
+            if operator not in ("$set", "$unset"):
+                rest[operator] = fields
+                continue
+            for path, new in fields.items():
+                parts = path.split(".")
+                _apply_positional(doc, original, parts, operator, new, filters)
+                touched[parts[0]] = doc.get(parts[0])
+        rest.setdefault("$set", {}).update(touched)
+        return update_one(self, {"_id": doc["_id"]}, rest, *args, **kwargs)
+
+    return wrapper
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """app.db.session.db bound to an empty in-memory database"""
+    collection = mongomock.collection.Collection
+    monkeypatch.setattr(
+        collection,
+        "find_one_and_update",
+        _find_one_and_update(collection.find_one_and_update),
+    )
+    monkeypatch.setattr(collection, "update_one", _update_one(collection.update_one))
+    client, database = db.client, db.db
+    db.client = AsyncMongoMockClient(tz_aware=True)
+    db.db = db.client["test"]
+    yield db
+    db.client, db.db = client, database
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    """A moto S3 client with an empty bucket"""
+    monkeypatch.setenv("AWS_BUCKET_NAME", BUCKET)
+    monkeypatch.setenv("AWS_REGION", "us-east-1")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.delenv("AWS_S3_ENDPOINT_URL", raising=False)
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+@pytest.fixture
+def local_storage(tmp_path, monkeypatch, mongo):
+    monkeypatch.delenv("AWS_BUCKET_NAME", raising=False)
+    storage = StorageService(tmp_path / "uploads")
+    yield storage
+    storage.shutdown()
+
+
+@pytest.fixture
+def s3_storage(tmp_path, s3, mongo):
+    storage = StorageService(tmp_path / "uploads", s3_client=s3)
+    yield storage
+    storage.shutdown()
+
+
+@pytest.fixture(params=["local", "s3"])
+def storage(request):
+    """Runs a test once against local disk and once against S3"""
+    return request.getfixturevalue(f"{request.param}_storage")
+
+
+@pytest.fixture
+def stored_keys():
+    """Lists every key a storage holds, partial uploads excluded"""
+
+    def list_keys(storage):
+        if storage.s3_client:
+            listed = storage.s3_client.list_objects_v2(Bucket=storage.bucket_name)
+            return sorted(obj["Key"] for obj in listed.get("Contents", []))
+        root = storage.upload_dir
+        return sorted(
+            path.relative_to(root).as_posix()
+            for path in root.rglob("*")
+            if path.is_file() and not path.relative_to(root).as_posix().startswith(".")
+        )
+
+    return list_keys
@@ -0,0 +1,109 @@
+"""Buffered access-log writer tests"""
+
+import asyncio
+from datetime import datetime, timezone
+
+from app.db.session import db
+from app.services import analytics
+
+
+def _event(n: int) -> dict:
+    return {
+        "id": f"event-{n}",
+        "user_id": "user-1",
+        "content_type": "course",
+        "content_id": "course-1",
+        "action": "view",
+        "timestamp": datetime.now(timezone.utc),
+    }
+
+
+def _count() -> int:
+    return asyncio.run(db.access_logs.count_documents({}))
+
+
+def test_writes_in_batches(mongo):
+    writer = analytics.AccessLogWriter(queue_size=100, batch_size=3, flush_interval=5)
+
+    async def run():
+        writer.start()
+        for n in range(7):
+            assert writer.enqueue(_event(n))
+        # Two full batches go out without waiting for the interval
+        while writer.written < 6:
+            await asyncio.sleep(0.01)
+        assert writer.flushes == 2
+        # stop() flushes the partial batch
+        await writer.stop()
+
+    asyncio.run(run())
+    assert not writer.running
+    assert writer.stats() == {
+        "queued": 0,
+        "enqueued": 7,
+        "written": 7,
+        "dropped": 0,
+        "failed": 0,
+        "flushes": 3,
+    }
+    assert _count() == 7
+
+
+def test_flushes_after_interval(mongo):
+    writer = analytics.AccessLogWriter(
+        queue_size=100, batch_size=100, flush_interval=0.05
+    )
+
+    async def run():
+        writer.start()
+        writer.enqueue(_event(1))
+        await asyncio.sleep(0.2)
+        written = writer.written
+        await writer.stop()
+        return written
+
+    assert asyncio.run(run()) == 1
+    assert writer.flushes == 1
+
+
+def test_full_queue_drops(mongo):
+    """Events beyond the queue are counted and dropped, never awaited"""
+    writer = analytics.AccessLogWriter(queue_size=2, batch_size=10, flush_interval=5)
+
+    async def run():
+        writer.start()
+        accepted = [writer.enqueue(_event(n)) for n in range(3)]
+        await writer.stop()
+        return accepted
+
+    assert asyncio.run(run()) == [True, True, False]
+    assert writer.dropped == 1
+    assert _count() == 2
+
+
+def test_failed_flush_is_counted(mongo, monkeypatch):
+    writer = analytics.AccessLogWriter(queue_size=10, batch_size=10, flush_interval=5)
+
+    async def fail(*args, **kwargs):
+        raise RuntimeError("mongo down")
+
+    monkeypatch.setattr(type(db.access_logs), "insert_many", fail)
+
+    async def run():
+        writer.start()
+        writer.enqueue(_event(1))
+        writer.enqueue(_event(2))
+        await writer.stop()
+
+    asyncio.run(run())
+    assert writer.failed == 2
+    assert writer.written == 0
+
+
+def test_log_access_without_writer(mongo):
+    """Scripts and tests without the app lifespan write directly"""
+    assert not analytics.access_log_writer.running
+    asyncio.run(analytics.log_access("user-1", "lab", "lab-1", "view"))
+    log = asyncio.run(db.access_logs.find_one({}, {"_id": 0}))
+    assert log["content_id"] == "lab-1"
+    assert log["timestamp"].tzinfo is not None
@@ -0,0 +1,135 @@
+"""Access-log rollup tests"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.core.config import settings
+from app.db.session import db
+from app.services import analytics
+
+NOW = datetime(2026, 3, 10, 12, 30, tzinfo=timezone.utc)
+
+
+def _event(timestamp, content_id: str = "course-1", action: str = "view") -> dict:
+    return {
+        "content_type": "course",
+        "content_id": content_id,
+        "action": action,
+        "timestamp": timestamp,
+    }
+
+
+def _rollups(granularity: str) -> list:
+    return asyncio.run(
+        db.access_log_rollups.find(
+            {"granularity": granularity}, {"_id": 0, "granularity": 0}
+        )
+        .sort([("bucket", 1), ("content_id", 1)])
+        .to_list(None)
+    )
+
+
+def test_bucket_start():
+    assert analytics.bucket_start(NOW, "hour") == NOW.replace(minute=0)
+    assert analytics.bucket_start(NOW, "day") == datetime(
+        2026, 3, 10, tzinfo=timezone.utc
+    )
+
+
+def test_rollup_ops_count_per_key(mongo):
+    batch = [
+        _event(NOW),
+        _event(NOW + timedelta(minutes=10)),
+        _event(NOW + timedelta(hours=1)),
+        # ISO strings written before the timestamp migration still count
+        _event((NOW - timedelta(days=1)).isoformat()),
+    ]
+    ops = analytics.rollup_ops(batch)
+    # One upsert per distinct (granularity, bucket, content, action)
+    assert len(ops) == 5
+    asyncio.run(db.access_log_rollups.bulk_write(ops))
+
+    hour = NOW.replace(minute=0)
+    day = analytics.bucket_start(NOW, "day")
+    hourly = [(r["bucket"], r["count"]) for r in _rollups("hour")]
+    assert hourly == [
+        (hour - timedelta(days=1), 1),
+        (hour, 2),
+        (hour + timedelta(hours=1), 1),
+    ]
+    daily = [(r["bucket"], r["count"]) for r in _rollups("day")]
+    assert daily == [(day - timedelta(days=1), 1), (day, 3)]
+
+
+def test_record_rollups_increments(mongo):
+    asyncio.run(analytics.record_rollups([_event(NOW), _event(NOW, "course-2")]))
+    asyncio.run(analytics.record_rollups([_event(NOW)]))
+    hourly = _rollups("hour")
+    assert [(r["content_id"], r["count"]) for r in hourly] == [
+        ("course-1", 2),
+        ("course-2", 1),
+    ]
+    assert len(_rollups("day")) == 2
+    asyncio.run(analytics.record_rollups([]))
+
+
+def test_access_counts(mongo):
+    asyncio.run(
+        analytics.record_rollups(
+            [
+                _event(NOW),
+                _event(NOW - timedelta(hours=2), "course-2"),
+                _event(NOW, action="enroll"),
+                _event(NOW - timedelta(days=2)),
+            ]
+        )
+    )
+    counts = asyncio.run(analytics.access_counts(NOW - timedelta(hours=3)))
+    by_action = {row["_id"]["action"]: row["count"] for row in counts}
+    assert by_action == {"view": 2, "enroll": 1}
+
+
+def test_rebuild_rollups_replaces_closed_buckets(mongo, monkeypatch):
+    """
+    Counts are $set, not $inc, for buckets inside the raw-log retention that
+    are already closed. mongomock has no $dateTrunc, so the access_logs
+    aggregation is replaced by its result.
+    """
+    pipelines = []
+    collection = type(db.access_logs)
+    aggregate = collection.aggregate
+
+    def grouped(self, pipeline, **kwargs):
+        if self.name != "access_logs":
+            return aggregate(self, pipeline, **kwargs)
+        pipelines.append(pipeline)
+        granularity = "hour" if len(pipelines) == 1 else "day"
+        bucket = analytics.bucket_start(NOW - timedelta(days=1), granularity)
+
+        async def rows():
+            yield {
+                "_id": {
+                    "bucket": bucket,
+                    "content_type": "course",
+                    "content_id": "course-1",
+                    "action": "view",
+                },
+                "count": 7,
+            }
+
+        return rows()
+
+    monkeypatch.setattr(collection, "aggregate", grouped)
+    asyncio.run(analytics.record_rollups([_event(NOW - timedelta(days=1))] * 3))
+
+    assert asyncio.run(analytics.rebuild_rollups(before=NOW)) == 2
+    assert [r["count"] for r in _rollups("hour")] == [7]
+    assert [r["count"] for r in _rollups("day")] == [7]
+
+    window = pipelines[0][1]["$match"]["_ts"]
+    retained = NOW - timedelta(days=settings.ACCESS_LOG_RETENTION_DAYS - 1)
+    assert window == {
+        "$gte": analytics.bucket_start(retained, "hour"),
+        "$lt": analytics.bucket_start(NOW, "hour"),
+    }
+    assert pipelines[1][1]["$match"]["_ts"]["$lt"] == analytics.bucket_start(NOW, "day")
@@ -0,0 +1,105 @@
+"""Admin stats snapshot tests"""
+
+import asyncio
+from datetime import timedelta
+
+from app.db.session import db
+from app.services import admin_stats
+
+
+class Report:
+    """A report that counts its computations"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self) -> dict:
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return {"calls": self.calls}
+
+
+def _snapshot(interval: float = 60):
+    report = Report()
+    return report, admin_stats.StatsSnapshot({"stats": report}, interval=interval)
+
+
+class TestStatsSnapshot:
+    def test_computed_once(self):
+        report, snapshot = _snapshot()
+
+        async def twice():
+            return await snapshot.get("stats"), await snapshot.get("stats")
+
+        first, second = asyncio.run(twice())
+        assert first is second
+        assert first["calls"] == 1
+        assert "computed_at" in first
+
+    def test_concurrent_requests_share_a_computation(self):
+        report, snapshot = _snapshot()
+
+        async def burst():
+            return await asyncio.gather(*(snapshot.get("stats") for _ in range(5)))
+
+        assert all(s["calls"] == 1 for s in asyncio.run(burst()))
+        assert report.calls == 1
+
+    def test_refresh(self):
+        report, snapshot = _snapshot()
+
+        async def refresh():
+            await snapshot.get("stats")
+            return await snapshot.get("stats", refresh=True)
+
+        assert asyncio.run(refresh())["calls"] == 2
+
+    def test_stale(self):
+        """Without the refresh loop, a snapshot older than 2 intervals is redone"""
+        report, snapshot = _snapshot(interval=60)
+
+        async def later():
+            await snapshot.get("stats")
+            snapshot._computed["stats"] -= timedelta(seconds=119)
+            assert (await snapshot.get("stats"))["calls"] == 1
+            snapshot._computed["stats"] -= timedelta(seconds=2)
+            return await snapshot.get("stats")
+
+        assert asyncio.run(later())["calls"] == 2
+
+    def test_refresh_loop(self):
+        report, snapshot = _snapshot(interval=0.05)
+
+        async def run():
+            snapshot.start()
+            await asyncio.sleep(0.2)
+            await snapshot.stop()
+
+        asyncio.run(run())
+        assert report.calls >= 2
+        assert snapshot._task is None
+
+
+def test_compute_admin_stats(mongo):
+    async def insert():
+        await db.users.insert_many(
+            [{"role": "learner"}, {"role": "learner"}, {"role": "trainer"}]
+        )
+        await db.courses.insert_many(
+            [
+                {"is_published": True, "enrolled_count": 3},
+                {"is_published": False, "enrolled_count": 2},
+            ]
+        )
+        await db.labs.insert_one({"is_published": True, "completions_count": 4})
+
+    asyncio.run(insert())
+    stats = asyncio.run(admin_stats.compute_admin_stats())
+    assert stats["total_users"] == 3
+    assert stats["total_learners"] == 2
+    assert stats["total_trainers"] == 1
+    assert stats["total_courses"] == 2
+    assert stats["published_courses"] == 1
+    assert stats["total_enrollments"] == 5
+    assert stats["total_lab_completions"] == 4
+    assert stats["total_workshops"] == 0
@@ -0,0 +1,104 @@
+"""Per-worker course cache, validated against the stored version"""
+
+import asyncio
+
+import pytest
+
+from app.db.session import db
+from app.services.courses import CourseRepository, course_version
+
+COURSE = {
+    "id": "course-1",
+    "slug": "python",
+    "title": "Python",
+    "modules": [{"id": "m1"}],
+    "version": 1,
+}
+
+
+def _elsewhere(update: dict):
+    """A course write made through another worker"""
+    asyncio.run(db.courses.update_one({"id": "course-1"}, update))
+
+
+@pytest.fixture
+def repository(mongo):
+    asyncio.run(db.courses.insert_one(dict(COURSE)))
+    return CourseRepository(maxsize=10, ttl=300)
+
+
+def _by_id(repository):
+    return asyncio.run(repository.get_by_id("course-1"))
+
+
+def _by_slug(repository, slug: str = "python"):
+    return asyncio.run(repository.get_by_slug(slug))
+
+
+class TestCourseRepository:
+    def test_hit(self, repository):
+        assert _by_id(repository)["title"] == "Python"
+        assert _by_id(repository)["title"] == "Python"
+        assert repository.stats() == {
+            "size": 1,
+            "maxsize": 10,
+            "hits": 1,
+            "misses": 1,
+            "stale": 0,
+        }
+
+    def test_version_bump_elsewhere(self, repository):
+        """A course edited through another worker is never served stale"""
+        _by_id(repository)
+        _elsewhere({"$set": {"title": "Python 3"}, "$inc": {"version": 1}})
+        assert _by_id(repository)["title"] == "Python 3"
+        assert repository.stale == 1
+        assert _by_id(repository)["title"] == "Python 3"
+        assert repository.hits == 1
+
+    def test_deleted_elsewhere(self, repository):
+        _by_id(repository)
+        asyncio.run(db.courses.delete_one({"id": "course-1"}))
+        assert _by_id(repository) is None
+        assert len(repository._by_id) == 0
+
+    def test_missing(self, repository):
+        assert asyncio.run(repository.get_by_id("nope")) is None
+        assert _by_slug(repository, "nope") is None
+
+    def test_slug(self, repository):
+        assert _by_slug(repository)["id"] == "course-1"
+        assert _by_slug(repository)["id"] == "course-1"
+        assert repository.hits == 1
+
+    def test_slug_renamed_elsewhere(self, repository):
+        _by_slug(repository)
+        _elsewhere({"$set": {"slug": "python-3"}, "$inc": {"version": 1}})
+        assert _by_slug(repository) is None
+        assert _by_slug(repository, "python-3")["id"] == "course-1"
+
+    def test_invalidate(self, repository):
+        _by_slug(repository)
+        repository.invalidate("course-1")
+        assert len(repository._by_id) == 0
+        assert len(repository._slugs) == 0
+        _by_id(repository)
+        assert repository.misses == 2
+
+    def test_copies(self, repository):
+        """Callers may replace top-level keys without touching the cache"""
+        _by_id(repository)["title"] = "Changed"
+        assert _by_id(repository)["title"] == "Python"
+
+    def test_disabled(self, mongo):
+        asyncio.run(db.courses.insert_one(dict(COURSE)))
+        repository = CourseRepository(maxsize=0, ttl=300)
+        _by_id(repository)
+        _by_id(repository)
+        assert repository.misses == 2
+
+
+def test_course_version():
+    assert course_version({"version": 3, "updated_at": "t"}) == (3, "t")
+    # Documents from before `version` fall back to updated_at
+    assert course_version({"updated_at": "t"}) == (0, "t")
@@ -0,0 +1,103 @@
+"""Course list projections and per-module loading"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.endpoints import courses as endpoints
+from app.db.session import db
+from app.services import courses
+
+COURSE = {
+    "id": "course-1",
+    "title": "Python",
+    "is_published": True,
+    "created_at": "2026-01-01T00:00:00+00:00",
+    "modules": [
+        {"id": "m1", "title": "Basics", "items": [{"url": "/uploads/videos/a.mp4"}]},
+        {"id": "m2", "title": "Advanced", "items": []},
+    ],
+    "tests": [{"question": "?", "correct_answer": 1}],
+}
+
+
+@pytest.fixture
+def course(mongo):
+    asyncio.run(db.courses.insert_one(dict(COURSE)))
+    return mongo
+
+
+class TestCourseListProjection:
+    def test_summary(self):
+        projection = courses.course_list_projection()
+        assert projection == courses.COURSE_CARD_PROJECTION
+        assert projection is not courses.COURSE_CARD_PROJECTION
+        # Modules and quiz answers are reduced to counts
+        assert "modules" not in projection
+        assert "tests" not in projection
+        assert "module_count" in projection
+
+    def test_full(self):
+        assert courses.course_list_projection("full") == {"_id": 0}
+
+    def test_fields(self):
+        assert courses.course_list_projection(fields="title, level,,_id") == {
+            "_id": 0,
+            "id": 1,
+            "created_at": 1,
+            "title": 1,
+            "level": 1,
+        }
+
+    @pytest.mark.parametrize("fields", ["$where", "modules.items", "tests.$"])
+    def test_invalid_fields(self, fields):
+        with pytest.raises(HTTPException) as e:
+            courses.course_list_projection(fields=fields)
+        assert e.value.status_code == 400
+
+    def test_invalid_view(self):
+        with pytest.raises(HTTPException) as e:
+            courses.course_list_projection("detailed")
+        assert e.value.status_code == 400
+
+    def test_list_endpoint_fields(self, course):
+        response = asyncio.run(endpoints.get_courses(fields="title", user=None))
+        assert response["items"] == [
+            {
+                "id": "course-1",
+                "title": "Python",
+                "created_at": COURSE["created_at"],
+            }
+        ]
+
+
+class TestModules:
+    def test_single_module(self, course):
+        module = asyncio.run(courses.get_course_module("course-1", "m2"))
+        assert module == COURSE["modules"][1]
+
+    def test_missing_module(self, course):
+        assert asyncio.run(courses.get_course_module("course-1", "m3")) is None
+        assert asyncio.run(courses.get_course_module("course-2", "m1")) is None
+        with pytest.raises(HTTPException) as e:
+            asyncio.run(endpoints.get_course_module_detail("course-1", "m3"))
+        assert e.value.status_code == 404
+
+    def test_endpoint(self, course):
+        module = asyncio.run(endpoints.get_course_module_detail("course-1", "m1"))
+        assert module["items"] == [{"url": "/uploads/videos/a.mp4"}]
+
+    def test_outline_leaves_out_module_bodies(self):
+        """Item URLs and quiz answers are only served per module"""
+        assert "tests" not in courses.COURSE_OUTLINE_PROJECTION
+        summary = courses.COURSE_OUTLINE_PROJECTION["modules"]["$map"]["in"]
+        assert "items" not in summary
+        assert sorted(summary) == [
+            "description",
+            "duration_minutes",
+            "id",
+            "item_count",
+            "order",
+            "title",
+        ]
@@ -0,0 +1,71 @@
+"""Password hashing pool tests"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from fastapi import HTTPException
+
+from app.services import hashing
+
+
+@pytest.fixture
+def hasher():
+    hasher = hashing.PasswordHasher(workers=1, queue_depth=1)
+    yield hasher
+    hasher.shutdown()
+
+
+def test_hash_and_verify(hasher):
+    async def round_trip():
+        hashed = await hasher.hash("s3cret")
+        return (
+            hashed,
+            await hasher.verify("s3cret", hashed),
+            await hasher.verify("wrong", hashed),
+        )
+
+    hashed, right, wrong = asyncio.run(round_trip())
+    assert hashed.startswith("$2b$")
+    assert right is True
+    assert wrong is False
+    assert hasher.queue_length == 0
+
+
+def test_full_queue_is_rejected(hasher, monkeypatch):
+    """Calls beyond queue_depth get a 503 instead of waiting"""
+    release = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(hasher, "_get_executor", lambda: executor)
+    monkeypatch.setattr(hashing, "_hashpw", lambda password: release.wait(5))
+
+    async def burst():
+        first = asyncio.create_task(hasher.hash("one"))
+        await asyncio.sleep(0)
+        assert hasher.stats()["queue_length"] == 1
+        with pytest.raises(HTTPException) as e:
+            await hasher.hash("two")
+        release.set()
+        await first
+        return e.value
+
+    error = asyncio.run(burst())
+    executor.shutdown()
+    assert error.status_code == 503
+    assert error.headers == {"Retry-After": "1"}
+    assert hasher.queue_length == 0
+
+
+def test_broken_pool_is_recreated(hasher):
+    class Broken:
+        def submit(self, *args, **kwargs):
+            raise BrokenProcessPool("worker died")
+
+    hasher._executor = Broken()
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(hasher.verify("s3cret", "hash"))
+    assert e.value.status_code == 503
+    assert hasher._executor is None
+    assert hasher.queue_length == 0
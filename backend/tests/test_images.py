@@ -0,0 +1,116 @@
+"""Image derivative rendering and claim tests"""
+
+import asyncio
+import io
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from PIL import Image
+
+from app.db.session import db
+from app.services import images
+
+URL = "/uploads/images/logo.png"
+
+
+def _png(width: int, height: int, **info) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "red").save(buffer, "PNG", **info)
+    return buffer.getvalue()
+
+
+def _jpeg_with_exif(width: int, height: int) -> bytes:
+    exif = Image.Exif()
+    exif[0x0110] = "Camera"  # Model
+    exif[0x0112] = 6  # Orientation: rotated 90 degrees clockwise
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "red").save(buffer, "JPEG", exif=exif)
+    return buffer.getvalue()
+
+
+class TestRender:
+    def test_widths_and_formats(self):
+        source_width, renditions = images._render(
+            _png(400, 200), [100, 200], ["webp", "avif"]
+        )
+        assert source_width == 400
+        assert [(width, fmt) for width, fmt, _ in renditions] == [
+            (100, "webp"),
+            (100, "avif"),
+            (200, "webp"),
+            (200, "avif"),
+        ]
+        with Image.open(io.BytesIO(renditions[0][2])) as image:
+            assert image.format == "WEBP"
+            assert image.size == (100, 50)
+
+    def test_no_upscale(self):
+        """Widths above the original's are skipped, or it keeps its own"""
+        _, renditions = images._render(_png(150, 100), [100, 200], ["webp"])
+        assert [width for width, _, _ in renditions] == [100]
+
+        _, renditions = images._render(_png(80, 40), [100, 200], ["webp"])
+        assert [width for width, _, _ in renditions] == [80]
+
+    def test_metadata_stripped(self):
+        """EXIF orientation is applied, then no metadata is kept"""
+        source_width, renditions = images._render(
+            _jpeg_with_exif(200, 100), [50], ["webp"]
+        )
+        assert source_width == 100
+        with Image.open(io.BytesIO(renditions[0][2])) as image:
+            assert image.size == (50, 100)
+            assert not image.getexif()
+            assert "exif" not in image.info
+            assert "icc_profile" not in image.info
+
+    def test_too_many_pixels(self, monkeypatch):
+        """Rejected from the header, below where Pillow would raise itself"""
+        monkeypatch.setattr(images, "MAX_PIXELS", 100)
+        with pytest.raises(ValueError, match="12x12"):
+            images._render(_png(12, 12), [10], ["webp"])
+
+    def test_unsupported_format(self, monkeypatch):
+        monkeypatch.setattr(images.features, "check", lambda fmt: fmt == "webp")
+        _, renditions = images._render(_png(100, 100), [50], ["webp", "avif"])
+        assert [fmt for _, fmt, _ in renditions] == ["webp"]
+
+
+class TestClaim:
+    @pytest.fixture
+    def worker(self, mongo):
+        return images.ImageDerivativeWorker([100], ["webp"], workers=1, queue_size=1)
+
+    def _claim(self, worker) -> bool:
+        return asyncio.run(worker._claim(URL))
+
+    def _set(self, status: str, age: timedelta = timedelta(0)):
+        claimed_at = datetime.now(timezone.utc) - age
+        asyncio.run(
+            db.image_derivatives.update_one(
+                {"_id": URL}, {"$set": {"status": status, "claimed_at": claimed_at}}
+            )
+        )
+
+    def test_first_claim_inserts(self, worker):
+        assert self._claim(worker)
+        doc = asyncio.run(db.image_derivatives.find_one({"_id": URL}))
+        assert doc["status"] == "processing"
+        assert not self._claim(worker)
+
+    def test_failed_is_claimed_again(self, worker):
+        assert self._claim(worker)
+        self._set("failed")
+        assert self._claim(worker)
+
+    def test_done_is_not_claimed(self, worker):
+        assert self._claim(worker)
+        self._set("done", images.CLAIM_TIMEOUT * 2)
+        assert not self._claim(worker)
+
+    def test_abandoned_claim(self, worker):
+        assert self._claim(worker)
+        self._set("processing", images.CLAIM_TIMEOUT / 2)
+        assert not self._claim(worker)
+        self._set("processing", images.CLAIM_TIMEOUT + timedelta(seconds=1))
+        assert self._claim(worker)
@@ -0,0 +1,129 @@
+"""ingest_upload tests: streaming multipart uploads and their limits"""
+
+import asyncio
+import hashlib
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+
+from app.services.ingest import MULTIPART_OVERHEAD, UploadRule, ingest_upload
+
+BOUNDARY = "test-boundary"
+HEADERS = {"content-type": f"multipart/form-data; boundary={BOUNDARY}"}
+RULE = UploadRule("images", ["image/png"], 4096, "PNG")
+
+
+def _body(data: bytes, filename="logo.png", content_type="image/png", name="file"):
+    head = (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    )
+    return head.encode() + data + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+async def _chunks(body: bytes, size: int = 1024):
+    # No Content-Length: httpx sends an async iterable chunked
+    for start in range(0, len(body), size):
+        end = start + size
+        yield body[start:end]
+
+
+def _post(storage, content, headers=HEADERS) -> httpx.Response:
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        return await ingest_upload(request, storage, RULE)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            return await c.post("/upload", content=content, headers=headers)
+
+    return asyncio.run(run())
+
+
+class TestIngestUpload:
+    """Files within the limits are stored at their content address"""
+
+    def test_stores_by_content_hash(self, storage, stored_keys):
+        data = bytes(range(256)) * 8
+        response = _post(storage, _body(data))
+        assert response.status_code == 200
+
+        result = response.json()
+        digest = hashlib.sha256(data).hexdigest()
+        assert result["url"].endswith(f"images/{digest}.png")
+        assert result["size"] == len(data)
+        assert result["original_name"] == "logo.png"
+        assert stored_keys(storage) == [f"images/{digest}.png"]
+        assert storage.read_object(f"images/{digest}.png") == data
+
+    def test_duplicate_is_stored_once(self, storage, stored_keys):
+        data = bytes(range(256)) * 8
+        first = _post(storage, _body(data)).json()
+        second = _post(storage, _body(data, filename="copy.png")).json()
+
+        assert first["url"] == second["url"]
+        assert second["original_name"] == "copy.png"
+        assert len(stored_keys(storage)) == 1
+
+    def test_chunked_body(self, storage):
+        data = bytes(3000)
+        response = _post(storage, _chunks(_body(data)))
+        assert response.status_code == 200
+        assert response.json()["size"] == len(data)
+
+
+class TestIngestLimits:
+    """Oversized, mistyped and malformed uploads are rejected"""
+
+    def test_declared_length_over_limit(self, storage, stored_keys):
+        """Rejected on the Content-Length header alone"""
+        data = bytes(RULE.max_size + MULTIPART_OVERHEAD + 1)
+        response = _post(storage, _body(data))
+        assert response.status_code == 413
+        assert stored_keys(storage) == []
+
+    @pytest.mark.parametrize("size", [RULE.max_size + 1, 10 * RULE.max_size])
+    def test_streamed_file_over_limit(self, storage, stored_keys, size):
+        """Without a Content-Length the file is cut off at the limit"""
+        response = _post(storage, _chunks(_body(bytes(size))))
+        assert response.status_code == 413
+        assert "Max size" in response.json()["detail"]
+        assert stored_keys(storage) == []
+
+    def test_body_over_limit(self, storage, stored_keys):
+        """A body larger than its file could be is cut off too"""
+        body = _body(bytes(100)) + bytes(RULE.max_size + MULTIPART_OVERHEAD)
+        response = _post(storage, _chunks(body))
+        assert response.status_code == 413
+        assert stored_keys(storage) == []
+
+    def test_file_at_limit(self, storage):
+        response = _post(storage, _chunks(_body(bytes(RULE.max_size))))
+        assert response.status_code == 200
+
+    def test_wrong_type(self, storage, stored_keys):
+        response = _post(storage, _body(bytes(10), content_type="image/gif"))
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Invalid file type. Allowed: PNG"
+        assert stored_keys(storage) == []
+
+    def test_no_file(self, storage):
+        response = _post(storage, _body(bytes(10), name="other"))
+        assert response.status_code == 400
+        assert response.json()["detail"] == "No file uploaded"
+
+    def test_not_multipart(self, storage):
+        response = _post(storage, b"{}", headers={"content-type": "application/json"})
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Expected multipart/form-data"
+
+    def test_truncated_body(self, storage, stored_keys):
+        """A body that ends mid-file is not stored"""
+        response = _post(storage, _body(bytes(1000))[:-40])
+        assert response.status_code == 400
+        assert stored_keys(storage) == []
@@ -0,0 +1,141 @@
+"""Access-log archival and retention tests"""
+
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from app.core.config import settings
+from app.db.session import db
+from app.services import log_archive
+
+TODAY = datetime.now(timezone.utc).date()
+OLD = TODAY - timedelta(days=40)
+RECENT = TODAY - timedelta(days=5)
+
+
+def _at(day: date, hour: int) -> datetime:
+    return datetime(day.year, day.month, day.day, hour, tzinfo=timezone.utc)
+
+
+def _event(n: int, timestamp, user_id: str = "user-1") -> dict:
+    return {
+        "id": f"event-{n}",
+        "user_id": user_id,
+        "content_type": "course",
+        "content_id": "course-1",
+        "action": "view",
+        "timestamp": timestamp,
+    }
+
+
+def _manifest(day: date) -> dict:
+    return asyncio.run(db.access_log_archives.find_one({"day": day.isoformat()}))
+
+
+def _raw(day: date) -> int:
+    return asyncio.run(db.access_logs.count_documents(log_archive._day_query(day)))
+
+
+@pytest.fixture
+def logs(mongo, tmp_path, monkeypatch):
+    """Events on an old and a recent day, in both timestamp formats"""
+    monkeypatch.setattr(settings, "ACCESS_LOG_ARCHIVE_DIR", str(tmp_path / "archive"))
+    monkeypatch.setattr(settings, "ACCESS_LOG_RETENTION_DAYS", 30)
+
+    async def insert():
+        await log_archive.create_archive_indexes(db.db)
+        await db.access_logs.insert_many(
+            [
+                _event(1, _at(OLD, 1)),
+                _event(2, _at(OLD, 2), user_id="user-2"),
+                # Logged before timestamps became BSON dates
+                _event(3, _at(OLD, 3).isoformat()),
+                _event(4, _at(RECENT, 1)),
+                _event(5, _at(TODAY, 0)),
+            ]
+        )
+
+    asyncio.run(insert())
+    return tmp_path / "archive"
+
+
+class TestArchiveDay:
+    def test_export(self, logs):
+        assert asyncio.run(log_archive.archive_day(OLD, batch_size=2)) == 3
+        parts = sorted(p.name for p in log_archive.day_dir(OLD).iterdir())
+        assert parts == ["part-00000.parquet", "part-00001.parquet"]
+        manifest = _manifest(OLD)
+        assert manifest["status"] == "done"
+        assert manifest["count"] == 3
+        # Archiving never deletes; purging does, once the day is done
+        assert _raw(OLD) == 3
+
+    def test_done_once(self, logs):
+        asyncio.run(log_archive.archive_day(OLD))
+        assert asyncio.run(log_archive.archive_day(OLD)) is None
+
+    def test_claims(self, logs):
+        """A fresh claim is respected; one older than CLAIM_TIMEOUT is not"""
+        claimed_at = datetime.now(timezone.utc)
+        asyncio.run(
+            db.access_log_archives.insert_one(
+                {
+                    "day": OLD.isoformat(),
+                    "status": "in_progress",
+                    "claimed_at": claimed_at,
+                }
+            )
+        )
+        assert asyncio.run(log_archive.archive_day(OLD)) is None
+        asyncio.run(
+            db.access_log_archives.update_one(
+                {"day": OLD.isoformat()},
+                {"$set": {"claimed_at": claimed_at - log_archive.CLAIM_TIMEOUT * 2}},
+            )
+        )
+        assert asyncio.run(log_archive.archive_day(OLD)) == 3
+
+    def test_failure_releases_the_day(self, logs, monkeypatch):
+        def fail(*args):
+            raise OSError("disk full")
+
+        monkeypatch.setattr(log_archive, "_write_part", fail)
+        with pytest.raises(OSError):
+            asyncio.run(log_archive.archive_day(OLD))
+        assert _manifest(OLD) is None
+        assert not logs.exists() or not any(logs.rglob("*.tmp"))
+
+    def test_empty_day(self, logs):
+        empty = OLD - timedelta(days=1)
+        assert asyncio.run(log_archive.archive_day(empty)) == 0
+        assert _manifest(empty)["path"] is None
+
+
+class TestRetention:
+    def test_archive_closed_days_then_purge(self, logs):
+        archived = asyncio.run(log_archive.archive_closed_days())
+        assert archived == 4
+        # Days still within ARCHIVE_LAG are left for later
+        assert _manifest(TODAY) is None
+        assert _manifest(TODAY - timedelta(days=1)) is None
+        # Only archived days past the retention are purged
+        assert _raw(OLD) == 0
+        assert _raw(RECENT) == 1
+        assert _raw(TODAY) == 1
+
+    def test_unarchived_days_are_kept(self, logs):
+        assert asyncio.run(log_archive.purge_archived_days(30)) == 0
+        assert _raw(OLD) == 3
+
+    def test_read_archive(self, logs):
+        asyncio.run(log_archive.archive_closed_days())
+        start, end = _at(OLD, 0), _at(OLD, 3)
+        frame = log_archive.read_archived_access_logs(start, end)
+        assert list(frame["id"]) == ["event-1", "event-2"]
+        frame = log_archive.read_archived_access_logs(
+            start, end + timedelta(hours=1), user_id="user-1"
+        )
+        assert list(frame["id"]) == ["event-1", "event-3"]
+        nothing = log_archive.read_archived_access_logs(_at(TODAY, 0), _at(TODAY, 1))
+        assert nothing.empty
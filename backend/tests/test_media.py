@@ -0,0 +1,189 @@
+"""MediaFiles tests: byte ranges, conditional requests and signed URLs"""
+
+import asyncio
+import os
+
+import httpx
+import pytest
+
+from app.services.media import MediaFiles, sign_media_url
+from app.services.storage import IMMUTABLE_CACHE_CONTROL
+
+DATA = bytes(range(100))
+
+
+@pytest.fixture
+def media_dir(tmp_path):
+    (tmp_path / "videos").mkdir()
+    (tmp_path / "videos" / "clip.mp4").write_bytes(DATA)
+    (tmp_path / "assignments").mkdir()
+    (tmp_path / "assignments" / "essay.pdf").write_bytes(b"%PDF-1.4")
+    return tmp_path
+
+
+def _get(app, url: str, method: str = "GET", **headers: str) -> httpx.Response:
+    headers = {name.replace("_", "-"): value for name, value in headers.items()}
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            return await c.request(method, url, headers=headers)
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def media(media_dir):
+    # No X-Accel-Redirect prefix: the app sends the bytes itself
+    return MediaFiles(media_dir, accel_prefix="")
+
+
+class TestMediaFiles:
+    def test_whole_file(self, media):
+        response = _get(media, "/videos/clip.mp4")
+        assert response.status_code == 200
+        assert response.content == DATA
+        assert response.headers["content-type"] == "video/mp4"
+        assert response.headers["content-length"] == str(len(DATA))
+        assert response.headers["accept-ranges"] == "bytes"
+        assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+
+    def test_head(self, media):
+        response = _get(media, "/videos/clip.mp4", method="HEAD")
+        assert response.status_code == 200
+        assert response.content == b""
+        assert response.headers["content-length"] == str(len(DATA))
+
+    @pytest.mark.parametrize(
+        "method, path, status_code",
+        [
+            ("GET", "/videos/missing.mp4", 404),
+            ("GET", "/videos", 404),
+            ("GET", "/videos/%2e%2e/assignments/essay.pdf", 404),
+            ("GET", "/.partial/upload", 404),
+            ("POST", "/videos/clip.mp4", 405),
+        ],
+    )
+    def test_errors(self, media, method, path, status_code):
+        assert _get(media, path, method=method).status_code == status_code
+
+    def test_symlink_out_of_directory(self, media, media_dir, tmp_path_factory):
+        outside = tmp_path_factory.mktemp("outside") / "secret.txt"
+        outside.write_text("secret")
+        os.symlink(outside, media_dir / "videos" / "link.txt")
+        assert _get(media, "/videos/link.txt").status_code == 404
+
+
+class TestRanges:
+    @pytest.mark.parametrize(
+        "header, start, end",
+        [
+            ("bytes=10-19", 10, 19),
+            ("bytes=90-", 90, 99),
+            ("bytes=-5", 95, 99),
+            ("bytes=-500", 0, 99),
+            ("bytes=95-500", 95, 99),
+        ],
+    )
+    def test_single_range(self, media, header, start, end):
+        response = _get(media, "/videos/clip.mp4", range=header)
+        stop = end + 1
+        assert response.status_code == 206
+        assert response.content == DATA[start:stop]
+        assert response.headers["content-range"] == f"bytes {start}-{end}/100"
+        assert response.headers["content-length"] == str(end - start + 1)
+
+    @pytest.mark.parametrize("header", ["bytes=100-", "bytes=500-600", "bytes=-0"])
+    def test_unsatisfiable(self, media, header):
+        response = _get(media, "/videos/clip.mp4", range=header)
+        assert response.status_code == 416
+        assert response.headers["content-range"] == "bytes */100"
+
+    @pytest.mark.parametrize(
+        "header", ["bytes=0-1,5-6", "items=0-1", "bytes=abc", "bytes=20-10"]
+    )
+    def test_ignored_range(self, media, header):
+        """Ranges this server does not handle get the whole file"""
+        response = _get(media, "/videos/clip.mp4", range=header)
+        assert response.status_code == 200
+        assert response.content == DATA
+
+    def test_if_range(self, media):
+        etag = _get(media, "/videos/clip.mp4").headers["etag"]
+        response = _get(media, "/videos/clip.mp4", range="bytes=0-9", if_range=etag)
+        assert response.status_code == 206
+
+        response = _get(
+            media, "/videos/clip.mp4", range="bytes=0-9", if_range='"stale"'
+        )
+        assert response.status_code == 200
+        assert response.content == DATA
+
+
+class TestConditional:
+    def test_if_none_match(self, media):
+        etag = _get(media, "/videos/clip.mp4").headers["etag"]
+        response = _get(media, "/videos/clip.mp4", if_none_match=etag)
+        assert response.status_code == 304
+        assert response.content == b""
+
+        response = _get(media, "/videos/clip.mp4", if_none_match='"other"')
+        assert response.status_code == 200
+
+    def test_if_modified_since(self, media):
+        last_modified = _get(media, "/videos/clip.mp4").headers["last-modified"]
+        response = _get(media, "/videos/clip.mp4", if_modified_since=last_modified)
+        assert response.status_code == 304
+
+        old = "Mon, 01 Jan 2001 00:00:00 GMT"
+        response = _get(media, "/videos/clip.mp4", if_modified_since=old)
+        assert response.status_code == 200
+
+
+class TestSignedUrls:
+    """Private directories are only served for a signed, unexpired URL"""
+
+    def _path(self, url: str) -> str:
+        return url.removeprefix("/uploads")
+
+    def test_public_urls_unchanged(self):
+        assert sign_media_url("/uploads/videos/clip.mp4") == "/uploads/videos/clip.mp4"
+        assert sign_media_url("https://cdn.example.com/a.pdf").startswith("https://")
+        assert sign_media_url(None) is None
+
+    def test_signed(self, media):
+        url = sign_media_url("/uploads/assignments/essay.pdf")
+        assert "expires=" in url and "sig=" in url
+
+        response = _get(media, self._path(url))
+        assert response.status_code == 200
+        assert response.content == b"%PDF-1.4"
+        assert response.headers["content-disposition"] == "attachment"
+        assert response.headers["cache-control"].startswith("private, max-age=")
+
+    def test_unsigned(self, media):
+        response = _get(media, "/assignments/essay.pdf")
+        assert response.status_code == 403
+
+    def test_tampered(self, media):
+        url = sign_media_url("/uploads/assignments/essay.pdf")
+        tampered = url[:-1] + ("1" if url.endswith("0") else "0")
+        assert _get(media, self._path(tampered)).status_code == 403
+        other = url.replace("essay.pdf", "other.pdf")
+        (media.directory / "assignments" / "other.pdf").write_bytes(b"x")
+        assert _get(media, self._path(other)).status_code == 403
+
+    def test_expired(self, media):
+        url = sign_media_url("/uploads/assignments/essay.pdf", ttl=-10)
+        assert _get(media, self._path(url)).status_code == 403
+
+
+class TestAccelRedirect:
+    def test_offloads_to_nginx(self, media_dir):
+        media = MediaFiles(media_dir, accel_prefix="/protected-uploads")
+        response = _get(media, "/videos/clip.mp4", range="bytes=0-9")
+        assert response.status_code == 200
+        assert response.content == b""
+        assert (
+            response.headers["x-accel-redirect"] == "/protected-uploads/videos/clip.mp4"
+        )
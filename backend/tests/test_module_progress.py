@@ -0,0 +1,119 @@
+"""Module progress stored as a map keyed by module_id"""
+
+import asyncio
+
+import pytest
+
+from app.db.session import db
+from app.services import progress
+
+KEY = {"user_id": "learner-1", "course_id": "python"}
+TOTALS = {"modules": 2, "quiz": False, "assignments": 0}
+LEGACY = [
+    {"module_id": "m1", "completed": False, "time_spent_minutes": 5},
+    {"module_id": "m1", "completed": True, "time_spent_minutes": 10},
+    {"module_id": "m2", "completed": False, "time_spent_minutes": 0},
+    {"completed": True},
+]
+
+
+def _stored() -> dict:
+    return asyncio.run(db.course_progress.find_one(KEY))
+
+
+def _complete(module_id: str, minutes: int):
+    return asyncio.run(
+        progress.complete_module(
+            KEY["user_id"], KEY["course_id"], module_id, minutes, TOTALS
+        )
+    )
+
+
+class TestModulesProgressMap:
+    def test_map_is_returned_as_is(self):
+        modules = {"m1": {"module_id": "m1", "completed": True}}
+        assert progress.modules_progress_map({"modules_progress": modules}) is modules
+        assert progress.modules_progress_map({}) == {}
+
+    def test_legacy_list_is_merged(self):
+        """Duplicate entries of one module merge; entries without an id drop"""
+        merged = progress.modules_progress_map({"modules_progress": LEGACY})
+        assert sorted(merged) == ["m1", "m2"]
+        assert merged["m1"]["completed"] is True
+        assert merged["m1"]["time_spent_minutes"] == 15
+        assert progress.modules_progress_list({"modules_progress": LEGACY}) == list(
+            merged.values()
+        )
+
+
+class TestCompleteModule:
+    @pytest.fixture
+    def doc(self, mongo):
+        asyncio.run(
+            db.course_progress.insert_one(
+                {
+                    **KEY,
+                    "modules_progress": {},
+                    "completed_modules": 0,
+                    "quiz_passed": False,
+                    "graded_required_assignments": 0,
+                }
+            )
+        )
+        return mongo
+
+    def test_complete(self, doc):
+        counters = _complete("m1", 10)
+        assert counters["completed_modules"] == 1
+        assert counters["overall_progress"] == 50
+        module = _stored()["modules_progress"]["m1"]
+        assert module["completed"] is True
+        assert module["time_spent_minutes"] == 10
+
+    def test_repeat_adds_time_only(self, doc):
+        _complete("m1", 10)
+        counters = _complete("m1", 5)
+        assert counters["completed_modules"] == 1
+        assert _stored()["modules_progress"]["m1"]["time_spent_minutes"] == 15
+
+        counters = _complete("m2", 1)
+        assert counters["completed_modules"] == 2
+        assert counters["completed"] is True
+
+    def test_no_progress_doc(self, mongo):
+        assert _complete("m1", 10) is None
+
+
+class TestMigration:
+    @pytest.fixture
+    def legacy(self, mongo):
+        asyncio.run(
+            db.course_progress.insert_many(
+                [
+                    {**KEY, "modules_progress": LEGACY},
+                    {**KEY, "course_id": "docker", "modules_progress": {}},
+                ]
+            )
+        )
+        return mongo
+
+    def test_migrate(self, legacy):
+        assert asyncio.run(progress.migrate_modules_progress(batch_size=1)) == 1
+        modules = _stored()["modules_progress"]
+        assert modules == progress.modules_progress_map({"modules_progress": LEGACY})
+        assert asyncio.run(progress.migrate_modules_progress()) == 0
+
+    def test_convert_only_unchanged_list(self, legacy):
+        doc = _stored()
+        asyncio.run(
+            db.course_progress.update_one(
+                {"_id": doc["_id"]},
+                {"$push": {"modules_progress": {"module_id": "m3"}}},
+            )
+        )
+        assert not asyncio.run(progress.convert_modules_progress(doc))
+        assert isinstance(_stored()["modules_progress"], list)
+
+        assert asyncio.run(progress.convert_modules_progress(_stored()))
+        assert sorted(_stored()["modules_progress"]) == ["m1", "m2", "m3"]
+        assert not asyncio.run(progress.convert_modules_progress(_stored()))
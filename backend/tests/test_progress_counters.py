@@ -0,0 +1,218 @@
+"""Course progress counters: grading, reconciliation and its lease"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+from app.api.endpoints import assignments
+from app.db.session import db
+from app.models.assignment import GradeSubmission
+from app.services import progress
+from app.services.courses import course_repository
+
+COURSE_ID = "course-1"
+STUDENT_ID = "student-1"
+TRAINER = {"id": "trainer-1", "role": "trainer"}
+
+
+def _progress() -> dict:
+    return asyncio.run(
+        db.course_progress.find_one({"user_id": STUDENT_ID, "course_id": COURSE_ID})
+    )
+
+
+@pytest.fixture
+def course(mongo, monkeypatch):
+    """A course with one module, one required assignment and one submission"""
+    monkeypatch.setattr(server, "db", mongo.db)
+    course_repository.invalidate(COURSE_ID)
+
+    async def insert():
+        await db.courses.insert_one(
+            {"id": COURSE_ID, "title": "Python", "modules": [{"id": "m1"}]}
+        )
+        await db.assignments.insert_one(
+            {
+                "id": "a1",
+                "course_id": COURSE_ID,
+                "is_required": True,
+                "max_score": 100,
+                "created_by": TRAINER["id"],
+            }
+        )
+        await db.submissions.insert_one(
+            {"id": "s1", "assignment_id": "a1", "user_id": STUDENT_ID, "grade": None}
+        )
+        await db.course_progress.insert_one(
+            {
+                "user_id": STUDENT_ID,
+                "course_id": COURSE_ID,
+                "modules_progress": {"m1": {"completed": True}},
+                "completed_modules": 1,
+                "quiz_passed": False,
+                "graded_required_assignments": 0,
+                "overall_progress": 50.0,
+            }
+        )
+
+    asyncio.run(insert())
+    yield mongo
+    course_repository.invalidate(COURSE_ID)
+
+
+@pytest.fixture
+def interleaved(monkeypatch):
+    """Yield to the event loop after every find_one, as a real driver would"""
+    collection = type(db.submissions)
+    find_one = collection.find_one
+
+    async def read_then_yield(self, *args, **kwargs):
+        doc = await find_one(self, *args, **kwargs)
+        await asyncio.sleep(0)
+        return doc
+
+    monkeypatch.setattr(collection, "find_one", read_then_yield)
+
+
+@pytest.mark.parametrize(
+    "grade_submission", [assignments.grade_submission, server.grade_submission]
+)
+class TestGrading:
+    def _grade(self, grade_submission, grade: float):
+        data = GradeSubmission(grade=grade)
+        return grade_submission("s1", data, TRAINER)
+
+    def test_first_grade_counts(self, course, grade_submission):
+        graded = asyncio.run(self._grade(grade_submission, 80))
+        assert graded["grade"] == 80
+        assert _progress()["graded_required_assignments"] == 1
+        assert _progress()["overall_progress"] == 100
+
+    def test_regrade_does_not_count(self, course, grade_submission):
+        asyncio.run(self._grade(grade_submission, 80))
+        graded = asyncio.run(self._grade(grade_submission, 90))
+        assert graded["grade"] == 90
+        assert _progress()["graded_required_assignments"] == 1
+
+    def test_concurrent_first_grades(self, course, interleaved, grade_submission):
+        async def grade_twice():
+            return await asyncio.gather(
+                self._grade(grade_submission, 70), self._grade(grade_submission, 90)
+            )
+
+        asyncio.run(grade_twice())
+        assert _progress()["graded_required_assignments"] == 1
+
+
+class TestReconcile:
+    def test_repairs_drift(self, course):
+        asyncio.run(
+            db.course_progress.update_one(
+                {"user_id": STUDENT_ID}, {"$set": {"completed_modules": 5}}
+            )
+        )
+        course_doc = asyncio.run(
+            db.courses.find_one({"id": COURSE_ID}, progress.COURSE_PROGRESS_PROJECTION)
+        )
+        assert asyncio.run(progress.reconcile_course_progress(course_doc)) == 1
+        assert _progress()["completed_modules"] == 1
+        assert asyncio.run(progress.reconcile_course_progress(course_doc)) == 0
+
+
+class TestLease:
+    INTERVAL = 900
+
+    def _claim(self) -> bool:
+        return asyncio.run(progress._claim_run(self.INTERVAL))
+
+    def _set_lease(self, status: str, age: timedelta):
+        claimed_at = datetime.now(timezone.utc) - age
+        asyncio.run(
+            db.progress_reconciler.update_one(
+                {"_id": progress.LEASE_ID},
+                {"$set": {"status": status, "claimed_at": claimed_at}},
+            )
+        )
+
+    def test_one_worker_per_interval(self, mongo):
+        assert self._claim()
+        assert not self._claim()
+        self._set_lease("done", timedelta(seconds=self.INTERVAL / 2))
+        assert not self._claim()
+        self._set_lease("done", timedelta(seconds=self.INTERVAL + 1))
+        assert self._claim()
+
+    def test_dead_worker(self, mongo):
+        assert self._claim()
+        self._set_lease("running", progress.CLAIM_TIMEOUT / 2)
+        assert not self._claim()
+        self._set_lease("running", progress.CLAIM_TIMEOUT + timedelta(seconds=1))
+        assert self._claim()
+
+    def test_failed_run_releases_the_lease(self, mongo, monkeypatch):
+        async def fail():
+            raise RuntimeError("reconcile failed")
+
+        monkeypatch.setattr(progress, "reconcile_all_progress", fail)
+        reconciler = progress.ProgressReconciler(interval=self.INTERVAL)
+        assert self._claim()
+        with pytest.raises(RuntimeError):
+            asyncio.run(reconciler._reconcile())
+        lease = asyncio.run(db.progress_reconciler.find_one({"_id": progress.LEASE_ID}))
+        assert lease["status"] == "done"
+
+
+class TestUpdateProgressCounters:
+    TOTALS = {"modules": 1, "quiz": False, "assignments": 1}
+
+    def _update(self, update: dict):
+        return asyncio.run(
+            progress.update_progress_counters(
+                STUDENT_ID, COURSE_ID, update, self.TOTALS
+            )
+        )
+
+    def test_increment(self, course):
+        counters = self._update({"$inc": {"graded_required_assignments": 1}})
+        assert counters["graded_required_assignments"] == 1
+        assert counters["overall_progress"] == 100
+        assert counters["completed"] is True
+        stored = _progress()
+        assert stored["overall_progress"] == 100
+        assert stored["completed_at"] is not None
+
+    def test_legacy_doc_is_rebuilt(self, course):
+        """Docs without counters get them from a full evaluation"""
+        asyncio.run(
+            db.course_progress.update_one(
+                {"user_id": STUDENT_ID},
+                {"$unset": {field: "" for field in progress.COUNTER_FIELDS}},
+            )
+        )
+        counters = self._update({"$set": {"last_accessed": "now"}})
+        assert counters["completed_modules"] == 1
+        assert counters["graded_required_assignments"] == 0
+        stored = _progress()
+        assert stored["last_accessed"] == "now"
+        assert stored["completed_modules"] == 1
+        assert stored["overall_progress"] == 50
+
+    def test_no_progress_doc(self, course):
+        assert (
+            asyncio.run(
+                progress.update_progress_counters(
+                    "nobody", COURSE_ID, {"$inc": {"completed_modules": 1}}, self.TOTALS
+                )
+            )
+            is None
+        )
+
+    def test_progress_from_counters(self):
+        totals = {"modules": 4, "quiz": True, "assignments": 1}
+        doc = {"completed_modules": 9, "quiz_passed": True}
+        # Counters above the totals (e.g. after a module was removed) cap
+        assert progress.progress_from_counters(doc, totals) == 83.3
+        empty = {"modules": 0, "quiz": False, "assignments": 0}
+        assert progress.progress_from_counters(doc, empty) == 0
@@ -0,0 +1,232 @@
+"""Course progress evaluation tests"""
+
+import asyncio
+
+import mongomock.collection
+import pytest
+
+import server
+from app.db.session import db
+from app.services import progress
+
+USER_ID = "learner-1"
+
+
+def _course(course_id: str, modules: int, quiz: bool = False) -> dict:
+    return {
+        "id": course_id,
+        "title": course_id.title(),
+        "modules": [{"id": f"{course_id}-m{n}"} for n in range(modules)],
+        "tests": [{"id": "q1"}] if quiz else [],
+    }
+
+
+def _progress(course_id: str, completed: list, passed: bool = False) -> dict:
+    return {
+        "user_id": USER_ID,
+        "course_id": course_id,
+        "modules_progress": {m: {"completed": True} for m in completed},
+        "quiz_progress": {"passed": passed, "best_score": 90},
+    }
+
+
+def _insert(collection: str, *docs):
+    asyncio.run(db.db[collection].insert_many(list(docs)))
+
+
+@pytest.fixture
+def queries(monkeypatch):
+    """Counts the reads issued against MongoDB"""
+    counted = []
+    depth = [0]
+    collection = mongomock.collection.Collection
+    for name in ("find", "find_one", "distinct", "aggregate", "count_documents"):
+        method = getattr(collection, name)
+
+        def counting(self, *args, _method=method, _name=name, **kwargs):
+            # mongomock implements some reads on top of find()
+            if not depth[0]:
+                counted.append((self.name, _name))
+            depth[0] += 1
+            try:
+                return _method(self, *args, **kwargs)
+            finally:
+                depth[0] -= 1
+
+        monkeypatch.setattr(collection, name, counting)
+    return counted
+
+
+class TestEvaluateProgress:
+    def test_items(self):
+        course = _course("python", modules=3, quiz=True)
+        doc = _progress("python", ["python-m0", "python-m1"], passed=True)
+        evaluation = progress.evaluate_progress(course, doc, ["a1", "a2"], ["a1"])
+
+        # 2 modules + quiz + 1 assignment of 3 + 1 + 2 items
+        assert evaluation["progress"] == 66.7
+        assert evaluation["completed"] is False
+        assert evaluation["completed_modules"] == 2
+        assert evaluation["total_modules"] == 3
+        assert evaluation["quiz_passed"] is True
+        assert evaluation["quiz_score"] == 90
+        assert evaluation["graded_assignments"] == 1
+        assert evaluation["required_assignments"] == 2
+        assert evaluation["certificate_eligible"] is False
+
+    def test_complete(self):
+        course = _course("python", modules=1)
+        doc = _progress("python", ["python-m0"])
+        evaluation = progress.evaluate_progress(course, doc, ["a1"], ["a1", "other"])
+        assert evaluation["progress"] == 100
+        assert evaluation["completed"] is True
+        assert evaluation["certificate_eligible"] is True
+
+    def test_quiz_only_counts_when_the_course_has_one(self):
+        course = _course("python", modules=1)
+        doc = _progress("python", ["python-m0"], passed=False)
+        evaluation = progress.evaluate_progress(course, doc, [], [])
+        assert evaluation["progress"] == 100
+        assert evaluation["quiz_score"] == 0
+
+    def test_legacy_module_list(self):
+        course = _course("python", modules=2)
+        doc = {
+            "modules_progress": [
+                {"module_id": "python-m0", "completed": True},
+                {"module_id": "python-m1", "completed": False},
+            ]
+        }
+        evaluation = progress.evaluate_progress(course, doc, [], [])
+        assert evaluation["completed_modules"] == 1
+
+    def test_empty_course(self):
+        evaluation = progress.evaluate_progress(_course("empty", 0), {}, [], [])
+        assert evaluation["progress"] == 0
+        assert evaluation["completed"] is False
+
+
+class TestEvaluateCourseProgress:
+    @pytest.fixture
+    def course(self, mongo):
+        _insert("courses", _course("python", modules=2))
+        _insert("course_progress", _progress("python", ["python-m0"]))
+        _insert(
+            "assignments",
+            *(
+                {"id": f"a{n}", "course_id": "python", "is_required": n < 3}
+                for n in range(4)
+            ),
+        )
+        _insert(
+            "submissions",
+            {"assignment_id": "a0", "user_id": USER_ID, "grade": 80},
+            {"assignment_id": "a1", "user_id": USER_ID, "grade": None},
+            {"assignment_id": "a2", "user_id": "someone-else", "grade": 90},
+        )
+        return mongo
+
+    def test_evaluation(self, course):
+        evaluation = asyncio.run(progress.evaluate_course_progress(USER_ID, "python"))
+        # 1 of 2 modules and 1 of 3 required assignments
+        assert evaluation["progress"] == 40
+        assert evaluation["graded_assignments"] == 1
+        assert evaluation["required_assignments"] == 3
+        assert evaluation["course_title"] == "Python"
+
+    def test_fixed_number_of_queries(self, course, queries):
+        asyncio.run(progress.evaluate_course_progress(USER_ID, "python"))
+        assert sorted(queries) == [
+            ("assignments", "find"),
+            ("course_progress", "find"),
+            ("courses", "find"),
+            ("submissions", "distinct"),
+        ]
+
+    def test_missing(self, course):
+        assert (
+            asyncio.run(progress.evaluate_course_progress("nobody", "python")) is None
+        )
+        calculated = asyncio.run(progress.calculate_course_progress("nobody", "python"))
+        assert calculated == {"progress": 0, "completed": False}
+
+
+class TestEvaluateCoursesProgress:
+    """/my-courses evaluates every enrolled course in one pass"""
+
+    @pytest.fixture
+    def courses(self, mongo, monkeypatch):
+        monkeypatch.setattr(server, "db", mongo.db)
+        _insert(
+            "courses",
+            _course("python", modules=2),
+            _course("docker", modules=1, quiz=True),
+            _course("rust", modules=4),
+        )
+        _insert(
+            "course_progress",
+            _progress("python", ["python-m0", "python-m1"]),
+            _progress("docker", ["docker-m0"]),
+        )
+        _insert(
+            "assignments",
+            {"id": "a1", "course_id": "docker", "is_required": True},
+            {"id": "a2", "course_id": "python", "is_required": False},
+        )
+        _insert("submissions", {"assignment_id": "a1", "user_id": USER_ID, "grade": 1})
+        return mongo
+
+    def test_many_courses(self, courses, queries):
+        ids = ["python", "docker", "rust", "deleted"]
+        evaluations = asyncio.run(progress.evaluate_courses_progress(USER_ID, ids))
+
+        # Courses without a progress doc (or a course doc) are left out
+        assert sorted(evaluations) == ["docker", "python"]
+        assert evaluations["python"]["progress"] == 100
+        # 1 module and 1 assignment of 1 module, the quiz and 1 assignment
+        assert evaluations["docker"]["progress"] == 66.7
+        assert len(queries) == 4
+
+    def test_loaded_documents_are_not_read_again(self, courses, queries):
+        loaded = asyncio.run(
+            db.courses.find({}, progress.COURSE_PROGRESS_PROJECTION).to_list(None)
+        )
+        queries.clear()
+        evaluations = asyncio.run(
+            progress.evaluate_courses_progress(USER_ID, ["python"], courses=loaded)
+        )
+        assert evaluations["python"]["completed"] is True
+        assert ("courses", "find") not in queries
+
+    def test_my_courses(self, courses):
+        """Stored counters are used; docs without them are evaluated once"""
+        asyncio.run(
+            db.course_progress.update_one(
+                {"course_id": "docker"},
+                {
+                    "$set": {
+                        "completed_modules": 1,
+                        "quiz_passed": False,
+                        "graded_required_assignments": 0,
+                        "overall_progress": 33.3,
+                        "completed": False,
+                    }
+                },
+            )
+        )
+        user = {"id": USER_ID}
+        asyncio.run(
+            db.users.insert_one(
+                {"id": USER_ID, "enrolled_courses": ["python", "docker", "rust"]}
+            )
+        )
+        courses = asyncio.run(server.get_my_courses(user))
+
+        by_id = {course["id"]: course for course in courses}
+        assert by_id["python"]["progress"] == 100
+        assert by_id["python"]["completed"] is True
+        assert by_id["docker"]["progress"] == 33.3
+        assert by_id["rust"]["progress"] == 0
+        stored = asyncio.run(db.course_progress.find_one({"course_id": "python"}))
+        assert stored["completed_modules"] == 2
+        assert stored["overall_progress"] == 100
@@ -520,8 +520,10 @@ class TestCertificateGeneration:
         token = signup_response.json()["token"]
         headers = TestSetup.get_auth_header(token)
 
-        # Get a course with modules and quiz
-        courses = requests.get(f"{BASE_URL}/api/courses").json()
+        # Get a course with modules and quiz (list views only carry counts)
+        courses = requests.get(
+            f"{BASE_URL}/api/courses", params={"view": "full"}
+        ).json()
         course = next(
             (
                 c
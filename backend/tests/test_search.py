@@ -0,0 +1,82 @@
+"""Catalog search query and highlighting tests"""
+
+import asyncio
+
+from app.services import search
+
+
+def test_text_query():
+    assert search.text_query("python basics") == {"$text": {"$search": "python basics"}}
+
+
+def test_search_terms():
+    """Quoted phrases are split into words and negated words are dropped"""
+    terms = search.search_terms('"Machine Learning" python -java Python')
+    assert terms == ["machine", "learning", "python"]
+
+
+class TestHighlight:
+    def test_marks_word_prefixes(self):
+        snippet = search.highlight("Courses about course design", ["course"])
+        assert snippet == "<mark>Courses</mark> about <mark>course</mark> design"
+
+    def test_escapes_html(self):
+        snippet = search.highlight("<b>Python</b> & more", ["python"])
+        assert snippet == "&lt;b&gt;<mark>Python</mark>&lt;/b&gt; &amp; more"
+
+    def test_term_inside_a_word_does_not_match(self):
+        assert search.highlight("Jupyter notebooks", ["book"]) is None
+
+    def test_no_match(self):
+        assert search.highlight("Docker", ["python"]) is None
+        assert search.highlight("", ["python"]) is None
+        assert search.highlight("Python", []) is None
+
+    def test_window(self):
+        """A long text is cut around the first match, with ellipses"""
+        text = "x " * 100 + "python " + "y " * 100
+        snippet = search.highlight(text, ["python"], max_chars=40)
+        assert snippet.startswith("…")
+        assert snippet.endswith("…")
+        assert "<mark>python</mark>" in snippet
+        assert len(snippet.replace("<mark>", "").replace("</mark>", "")) == 42
+
+    def test_regex_characters_in_terms(self):
+        assert search.highlight("C++ basics", ["c++"]) == "<mark>C++</mark> basics"
+        assert search.highlight("a.b", ["a.b"]) == "<mark>a.b</mark>"
+
+
+def test_add_highlights():
+    items = [
+        {"title": "Python", "description": "Learn python"},
+        {"title": "Docker", "description": None},
+    ]
+    search.add_highlights(items, "python")
+    assert items[0]["highlights"] == {
+        "title": "<mark>Python</mark>",
+        "description": "Learn <mark>python</mark>",
+    }
+    assert items[1]["highlights"] == {}
+
+
+def test_create_text_indexes():
+    """One weighted, explicitly named text index per collection"""
+    created = {}
+
+    class Collection:
+        def __init__(self, name):
+            self.name = name
+
+        async def create_index(self, keys, **kwargs):
+            created[self.name] = (keys, kwargs)
+
+    class Database:
+        def __getitem__(self, name):
+            return Collection(name)
+
+    asyncio.run(search.create_text_indexes(Database()))
+    keys, options = created["courses"]
+    assert keys == [("title", "text"), ("category", "text"), ("description", "text")]
+    assert options["weights"] == search.TEXT_INDEX_WEIGHTS["courses"]
+    assert options["name"] == search.TEXT_INDEX_NAME
+    assert sorted(created) == ["courses", "labs", "workshops"]
@@ -0,0 +1,76 @@
+"""
+Uploads through server.py's storage class, whose results keep the original
+response keys (content_type rather than type)
+"""
+
+import asyncio
+
+import pytest
+
+import server
+from app.db.session import db
+from app.services import upload_sessions
+from app.services.transcode import video_transcoder
+from services.storage import StorageService
+
+USER = {"id": "trainer-1"}
+DATA = bytes(range(256)) * 64
+
+
+async def _body(data: bytes):
+    yield data
+
+
+@pytest.fixture
+def legacy_storage(tmp_path, monkeypatch, mongo):
+    monkeypatch.delenv("AWS_BUCKET_NAME", raising=False)
+    storage = StorageService(tmp_path / "uploads")
+    monkeypatch.setattr(server, "storage_service", storage)
+    yield storage
+    storage.shutdown()
+
+
+@pytest.fixture
+def transcoder(monkeypatch):
+    """The shared transcoder, accepting jobs without running ffmpeg"""
+    monkeypatch.setattr(video_transcoder, "heights", [360])
+    monkeypatch.setattr(video_transcoder, "_tasks", [None])
+    monkeypatch.setattr(video_transcoder, "_put", lambda storage, url: None)
+    return video_transcoder
+
+
+def _upload_video(storage) -> dict:
+    async def run():
+        status = await upload_sessions.create_session(
+            storage, USER, "video", "clip.mp4", "video/mp4", len(DATA)
+        )
+        session = await upload_sessions.get_session(status["id"], USER)
+        await upload_sessions.write_chunk(storage, session, 0, _body(DATA))
+        return await upload_sessions.complete_session(
+            storage, await upload_sessions.get_session(status["id"], USER)
+        )
+
+    return asyncio.run(run())
+
+
+class TestLegacyVideoUpload:
+    def test_result_keys(self, legacy_storage):
+        result = _upload_video(legacy_storage)
+        assert result["content_type"] == "video/mp4"
+        assert result["filename"] == "clip.mp4"
+        assert "type" not in result
+
+    def test_with_transcode(self, legacy_storage, transcoder):
+        """A completed upload is queued for HLS with its content type"""
+        result = _upload_video(legacy_storage)
+        response = asyncio.run(server._with_transcode(result))
+
+        assert response["url"] == result["url"]
+        assert response["transcode"]["status"] == "queued"
+        job = asyncio.run(db.video_transcodes.find_one({"_id": result["url"]}))
+        assert job["content_type"] == "video/mp4"
+
+    def test_with_transcode_unavailable(self, legacy_storage):
+        """Without ffmpeg the upload still succeeds, untranscoded"""
+        result = _upload_video(legacy_storage)
+        assert asyncio.run(server._with_transcode(result)) == result
@@ -0,0 +1,124 @@
+"""
+StorageService tests: uploads, deletes and upload progress, each run
+against local disk and against S3 (moto)
+"""
+
+import asyncio
+import hashlib
+import io
+
+from starlette.datastructures import Headers, UploadFile
+
+from app.services.storage import MB, load_progress
+
+
+def _upload_file(data: bytes, filename: str, content_type: str) -> UploadFile:
+    headers = Headers({"content-type": content_type})
+    return UploadFile(io.BytesIO(data), filename=filename, headers=headers)
+
+
+class TestUploadFile:
+    """Buffered uploads through upload_file"""
+
+    def test_upload_and_delete(self, storage, stored_keys):
+        """The file is stored under its directory and delete_file removes it"""
+        data = b"\x89PNG" + bytes(1000)
+        file = _upload_file(data, "logo.png", "image/png")
+        result = asyncio.run(storage.upload_file(file, "images"))
+
+        assert result["original_name"] == "logo.png"
+        assert result["size"] == len(data)
+        assert result["type"] == "image/png"
+        assert result["filename"].endswith(".png")
+        key = storage.url_key(result["url"])
+        assert key == f"images/{result['filename']}"
+        assert stored_keys(storage) == [key]
+        assert storage.read_object(key) == data
+
+        asyncio.run(storage.delete_file(result["url"]))
+        assert stored_keys(storage) == []
+
+    def test_s3_content_type(self, s3_storage):
+        """S3 objects keep the uploaded content type"""
+        file = _upload_file(b"%PDF-1.4", "notes.pdf", "application/pdf")
+        result = asyncio.run(s3_storage.upload_file(file, "documents"))
+
+        assert result["url"].startswith("https://test-uploads.s3.us-east-1.")
+        head = s3_storage.s3_client.head_object(
+            Bucket=s3_storage.bucket_name, Key=s3_storage.url_key(result["url"])
+        )
+        assert head["ContentType"] == "application/pdf"
+
+    def test_delete_ignores_foreign_urls(self, storage, stored_keys):
+        """URLs this storage did not issue are left alone"""
+        file = _upload_file(b"data", "a.png", "image/png")
+        asyncio.run(storage.upload_file(file, "images"))
+
+        asyncio.run(storage.delete_file("https://example.com/images/a.png"))
+        asyncio.run(storage.delete_file(""))
+        assert len(stored_keys(storage)) == 1
+
+    def test_progress_is_saved(self, storage):
+        """Progress of an upload with an id is readable once it finishes"""
+        data = bytes(3 * MB)
+        file = _upload_file(data, "clip.mp4", "video/mp4")
+        asyncio.run(storage.upload_file(file, "videos", upload_id="u1:clip"))
+
+        progress = asyncio.run(load_progress("u1:clip"))
+        assert progress["status"] == "done"
+        assert progress["percent"] == 100.0
+        assert progress["transferred"] == len(data)
+        assert asyncio.run(load_progress("u1:other")) is None
+
+
+class TestUploadWriter:
+    """Streamed uploads through open_upload"""
+
+    def _stream(self, storage, data: bytes, step: int) -> dict:
+        async def run():
+            writer = await storage.open_upload(
+                "videos", "clip.mp4", "video/mp4", "u1:stream", len(data)
+            )
+            for start in range(0, len(data), step):
+                end = start + step
+                await writer.write(data[start:end])
+            result = await writer.close()
+            assert writer.sha256.hexdigest() == hashlib.sha256(data).hexdigest()
+            return result
+
+        return asyncio.run(run())
+
+    def test_small_stream(self, storage):
+        """A file smaller than one part is stored in one write"""
+        data = bytes(range(256)) * 40
+        result = self._stream(storage, data, 1000)
+
+        assert result["size"] == len(data)
+        assert storage.read_object(storage.url_key(result["url"])) == data
+
+    def test_multipart_stream(self, storage):
+        """A file larger than one part is stored as a multipart upload in S3"""
+        data = bytes(range(256)) * (45 * 1024)
+        result = self._stream(storage, data, 1 * MB)
+
+        assert result["size"] == len(data)
+        assert storage.read_object(storage.url_key(result["url"])) == data
+        progress = asyncio.run(load_progress("u1:stream"))
+        assert progress["status"] == "done"
+        assert progress["size"] == len(data)
+
+    def test_abort_discards(self, storage, stored_keys):
+        """Nothing is left behind by an aborted upload"""
+
+        async def run():
+            writer = await storage.open_upload("videos", "clip.mp4", "video/mp4")
+            await writer.write(bytes(6 * MB))
+            await writer.abort()
+
+        asyncio.run(run())
+        assert stored_keys(storage) == []
+        if storage.s3_client:
+            uploads = storage.s3_client.list_multipart_uploads(
+                Bucket=storage.bucket_name
+            )
+            assert uploads.get("Uploads", []) == []
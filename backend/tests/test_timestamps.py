@@ -0,0 +1,116 @@
+"""BSON timestamp helpers and the ISO-string migration"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pydantic import BaseModel
+
+from app.core.timestamps import Timestamp, as_utc, isoformat
+from app.db import migrations
+from app.db.session import db
+
+WHEN = datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+
+
+class TestHelpers:
+    def test_as_utc(self):
+        assert as_utc("2026-01-02T03:04:05+00:00") == WHEN
+        assert as_utc("2026-01-02T05:04:05+02:00") == WHEN
+        # Naive values, from strings or BSON, are UTC
+        assert as_utc("2026-01-02T03:04:05") == WHEN
+        assert as_utc(WHEN.replace(tzinfo=None)) == WHEN
+        assert as_utc(None) is None
+        assert as_utc("") is None
+
+    def test_json_keeps_iso_strings(self):
+        class Doc(BaseModel):
+            created_at: Timestamp
+
+        doc = Doc(created_at="2026-01-02T03:04:05+00:00")
+        assert doc.model_dump() == {"created_at": WHEN}
+        assert doc.model_dump_json() == '{"created_at":"2026-01-02T03:04:05+00:00"}'
+        assert isoformat(WHEN.replace(tzinfo=None)) == "2026-01-02T03:04:05+00:00"
+
+
+class TestTimestampUpdates:
+    def test_strings_become_dates(self):
+        doc = {
+            "created_at": WHEN.isoformat(),
+            "updated_at": WHEN,
+            "reset_token_expires": "not a date",
+        }
+        assert migrations.timestamp_updates("users", doc) == {"created_at": WHEN}
+
+    def test_nested_course_progress(self):
+        doc = {
+            "started_at": WHEN.isoformat(),
+            "quiz_progress": {
+                "attempts": [{"submitted_at": WHEN.isoformat()}, {"submitted_at": WHEN}]
+            },
+            "modules_progress": {
+                "m1": {"completed_at": WHEN.isoformat()},
+                "m2": None,
+            },
+        }
+        assert migrations.timestamp_updates("course_progress", doc) == {
+            "started_at": WHEN,
+            "quiz_progress.attempts.0.submitted_at": WHEN,
+            "modules_progress.m1.completed_at": WHEN,
+        }
+
+
+class TestMigrateTimestamps:
+    @pytest.fixture
+    def legacy(self, mongo):
+        users = [
+            {"_id": n, "created_at": (WHEN + timedelta(days=n)).isoformat()}
+            for n in range(5)
+        ]
+        users.append({"_id": 5, "created_at": WHEN})
+
+        async def insert():
+            await db.users.insert_many(users)
+            await db.courses.insert_one({"_id": 1, "created_at": WHEN.isoformat()})
+
+        asyncio.run(insert())
+        return mongo.db
+
+    def _migrate(self, database, **kwargs):
+        return asyncio.run(migrations.migrate_timestamps(database, **kwargs))
+
+    def _created(self, database) -> list:
+        docs = asyncio.run(database.users.find().sort("_id", 1).to_list(None))
+        return [doc["created_at"] for doc in docs]
+
+    def test_migrate(self, legacy):
+        counts = self._migrate(legacy, batch_size=2, collections=["users", "courses"])
+        assert counts == {"users": 5, "courses": 1}
+        assert self._created(legacy) == [WHEN + timedelta(days=n) for n in range(5)] + [
+            WHEN
+        ]
+        state = asyncio.run(
+            legacy.migrations.find_one({"_id": migrations.MIGRATION_ID})
+        )
+        assert sorted(state["done"]) == ["courses", "users"]
+        assert state["last_ids"] == {}
+
+    def test_done_collections_are_skipped(self, legacy):
+        self._migrate(legacy, collections=["users"])
+        asyncio.run(legacy.users.insert_one({"_id": 9, "created_at": WHEN.isoformat()}))
+        assert self._migrate(legacy, collections=["users"]) == {}
+
+        asyncio.run(migrations.reset_timestamp_migration(legacy))
+        assert self._migrate(legacy, collections=["users"]) == {"users": 1}
+
+    def test_resumes_after_checkpoint(self, legacy):
+        """An interrupted run continues after the last checkpointed _id"""
+        asyncio.run(
+            legacy.migrations.insert_one(
+                {"_id": migrations.MIGRATION_ID, "last_ids": {"users": 2}}
+            )
+        )
+        assert self._migrate(legacy, collections=["users"]) == {"users": 2}
+        created = self._created(legacy)
+        assert all(isinstance(value, str) for value in created[:3])
+        assert created[3:] == [WHEN + timedelta(days=3), WHEN + timedelta(days=4), WHEN]
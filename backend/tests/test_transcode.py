@@ -0,0 +1,257 @@
+"""Video transcoder tests: rendition ladder, ffmpeg arguments and job claims"""
+
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+from app.db.session import db
+from app.services import transcode
+
+URL = "/uploads/videos/clip.mp4"
+SOURCE = Path("/tmp/source.mp4")
+
+
+def _transcoder(ffprobe: str = "ffprobe", slots: int = 1) -> transcode.VideoTranscoder:
+    return transcode.VideoTranscoder(
+        heights=[360, 720, 1080],
+        segment_seconds=6,
+        workers=1,
+        slots=slots,
+        queue_size=5,
+        timeout=60,
+        ffmpeg="ffmpeg",
+        ffprobe=ffprobe,
+    )
+
+
+def _value(args: list, flag: str) -> str:
+    return args[args.index(flag) + 1]
+
+
+class TestLadder:
+    @pytest.mark.parametrize(
+        "source_height, ladder",
+        [
+            (1080, [(360, 800), (720, 2800), (1080, 5000)]),
+            (2160, [(360, 800), (720, 2800), (1080, 5000)]),
+            (720, [(360, 800), (720, 2800)]),
+            (721, [(360, 800), (720, 2800)]),
+            (480, [(360, 800), (480, 1400)]),
+            (481, [(360, 800), (480, 1400)]),
+            (200, [(200, 400)]),
+        ],
+    )
+    def test_never_upscales(self, source_height, ladder):
+        assert _transcoder()._ladder(source_height) == ladder
+
+
+class TestFfmpegArgs:
+    def test_input_is_locked_down(self):
+        args = _transcoder()._hls_args(SOURCE, "mov", [(360, 800)], True)
+        assert _value(args, "-protocol_whitelist") == "file"
+        assert _value(args, "-f") == "mov"
+        assert _value(args, "-i") == f"file:{SOURCE}"
+
+    def test_renditions(self):
+        ladder = [(360, 800), (720, 2800)]
+        args = _transcoder()._hls_args(SOURCE, "matroska", ladder, True)
+
+        filters = _value(args, "-filter_complex")
+        assert (
+            filters == "[0:v]split=2[s0][s1];[s0]scale=-2:360[v0];[s1]scale=-2:720[v1]"
+        )
+        assert _value(args, "-b:v:0") == "800k"
+        assert _value(args, "-maxrate:v:1") == "2996k"
+        assert _value(args, "-bufsize:v:1") == "4200k"
+        assert args.count("0:a:0") == 2
+        assert _value(args, "-var_stream_map") == "v:0,a:0 v:1,a:1"
+        assert _value(args, "-master_pl_name") == transcode.MASTER_PLAYLIST
+        assert _value(args, "-hls_time") == "6"
+        assert args[-1] == "v%v/index.m3u8"
+
+    def test_without_audio(self):
+        args = _transcoder()._hls_args(SOURCE, "mov", [(360, 800)], False)
+        assert "0:a:0" not in args
+        assert "-c:a" not in args
+        assert _value(args, "-var_stream_map") == "v:0"
+
+    def test_poster(self):
+        poster = Path("/tmp/poster.jpg")
+        args = _transcoder()._poster_args(SOURCE, "mov", 1080, 0.5, poster)
+        assert _value(args, "-ss") == "0.25"
+        assert _value(args, "-f") == "mov"
+        assert _value(args, "-vf") == "scale=-2:720"
+        assert args[-1] == str(poster)
+
+
+@pytest.fixture
+def ffprobe(tmp_path):
+    """An ffprobe stand-in that prints whatever probe.json holds"""
+    output = tmp_path / "probe.json"
+    script = tmp_path / "ffprobe"
+    script.write_text(f"#!/bin/sh\ncat '{output}'\n")
+    script.chmod(0o755)
+
+    def probe(format_name: str, streams: list, duration: str = "12.5"):
+        info = {"format": {"format_name": format_name, "duration": duration}}
+        output.write_text(json.dumps({**info, "streams": streams}))
+        transcoder = _transcoder(ffprobe=str(script))
+        return asyncio.run(transcoder._probe(SOURCE, "mov"))
+
+    return probe
+
+
+VIDEO = {"codec_type": "video", "height": 1080}
+AUDIO = {"codec_type": "audio"}
+
+
+class TestProbe:
+    def test_video(self, ffprobe):
+        assert ffprobe(transcode.FORMAT_NAMES["mov"], [VIDEO, AUDIO]) == (
+            1080,
+            True,
+            12.5,
+        )
+        assert ffprobe(transcode.FORMAT_NAMES["mov"], [VIDEO]) == (1080, False, 12.5)
+
+    @pytest.mark.parametrize(
+        "format_name", [transcode.FORMAT_NAMES["matroska"], "hls", None]
+    )
+    def test_container_must_match(self, ffprobe, format_name):
+        with pytest.raises(transcode.TranscodeError, match="Unexpected container"):
+            ffprobe(format_name, [VIDEO, AUDIO])
+
+    def test_no_video_stream(self, ffprobe):
+        with pytest.raises(transcode.TranscodeError, match="No video stream"):
+            ffprobe(transcode.FORMAT_NAMES["mov"], [AUDIO])
+
+
+def _insert_job(status: str = "queued", claimed_at=None):
+    job = {"_id": URL, "status": status, "content_type": "video/mp4"}
+    if claimed_at:
+        job["claimed_at"] = claimed_at
+    asyncio.run(db.video_transcodes.insert_one(job))
+
+
+class TestClaim:
+    def test_claims_queued_job_once(self, mongo):
+        _insert_job()
+        transcoder = _transcoder()
+        claimed = asyncio.run(transcoder._claim(URL))
+        assert claimed["content_type"] == "video/mp4"
+        assert asyncio.run(transcoder._claim(URL)) is None
+
+        job = asyncio.run(db.video_transcodes.find_one({"_id": URL}))
+        assert job["status"] == "processing"
+
+    def test_reclaims_abandoned_job(self, mongo):
+        long_ago = datetime.now(timezone.utc) - timedelta(days=1)
+        _insert_job("processing", claimed_at=long_ago)
+        assert asyncio.run(_transcoder()._claim(URL)) is not None
+
+    def test_running_job(self, mongo):
+        _insert_job("processing", claimed_at=datetime.now(timezone.utc))
+        assert asyncio.run(_transcoder()._claim(URL)) is None
+
+    @pytest.mark.parametrize("status", ["done", "failed"])
+    def test_finished_job(self, mongo, status):
+        _insert_job(status)
+        assert asyncio.run(_transcoder()._claim(URL)) is None
+
+
+class TestSlots:
+    """ffmpeg runs are capped across every worker, not per process"""
+
+    def test_slots_are_shared(self, mongo):
+        # Two transcoders stand for two API workers
+        first, second = _transcoder(slots=2), _transcoder(slots=2)
+        tokens = [
+            asyncio.run(first._claim_slot("/uploads/videos/a.mp4")),
+            asyncio.run(second._claim_slot("/uploads/videos/b.mp4")),
+        ]
+        assert all(tokens)
+        assert asyncio.run(first._claim_slot("/uploads/videos/c.mp4")) is None
+
+        asyncio.run(second._release_slot(tokens[1]))
+        assert asyncio.run(first._claim_slot("/uploads/videos/c.mp4"))
+
+    def test_abandoned_slot(self, mongo):
+        transcoder = _transcoder()
+        assert asyncio.run(transcoder._claim_slot(URL))
+        long_ago = datetime.now(timezone.utc) - timedelta(days=1)
+        asyncio.run(
+            db.transcode_slots.update_one({}, {"$set": {"claimed_at": long_ago}})
+        )
+        assert asyncio.run(transcoder._claim_slot(URL))
+
+    def test_release_leaves_other_leases(self, mongo):
+        """A lease taken over from a dead worker is not released by it"""
+        transcoder = _transcoder()
+        stale = asyncio.run(transcoder._claim_slot(URL))
+        long_ago = datetime.now(timezone.utc) - timedelta(days=1)
+        asyncio.run(
+            db.transcode_slots.update_one({}, {"$set": {"claimed_at": long_ago}})
+        )
+        assert asyncio.run(transcoder._claim_slot(URL))
+
+        asyncio.run(transcoder._release_slot(stale))
+        assert asyncio.run(transcoder._claim_slot(URL)) is None
+
+    def test_transcode_releases_slot(self, mongo, local_storage):
+        """The slot is freed whether or not the job ran"""
+        transcoder = _transcoder()
+        _insert_job("done")
+        assert asyncio.run(transcoder.transcode(local_storage, URL)) is None
+        assert asyncio.run(transcoder._claim_slot(URL))
+
+
+def _course(course_id: str, urls: list) -> dict:
+    items = [{"id": f"item-{i}", "url": url} for i, url in enumerate(urls)]
+    return {"id": course_id, "version": 1, "modules": [{"items": items}]}
+
+
+def _items(course_id: str) -> list:
+    course = asyncio.run(db.courses.find_one({"id": course_id}))
+    return course["modules"][0]["items"]
+
+
+class TestSetItemStreams:
+    JOB = {
+        "status": "done",
+        "manifest_url": "/uploads/videos/hls/clip/master.m3u8",
+        "poster_url": "/uploads/videos/hls/clip/poster.jpg",
+    }
+
+    def test_points_items_at_renditions(self, mongo):
+        asyncio.run(db.courses.insert_one(_course("c1", [URL, "/uploads/other.mp4"])))
+        asyncio.run(db.courses.insert_one(_course("c2", ["/uploads/other.mp4"])))
+        asyncio.run(transcode._set_item_streams({}, URL, self.JOB))
+
+        playing, other = _items("c1")
+        assert playing["hls_url"] == self.JOB["manifest_url"]
+        assert playing["poster_url"] == self.JOB["poster_url"]
+        assert "hls_url" not in other
+        course = asyncio.run(db.courses.find_one({"id": "c1"}))
+        assert course["version"] == 2
+        untouched = asyncio.run(db.courses.find_one({"id": "c2"}))
+        assert untouched["version"] == 1
+
+    def test_clears_unfinished(self, mongo):
+        asyncio.run(db.courses.insert_one(_course("c1", [URL])))
+        asyncio.run(transcode._set_item_streams({}, URL, self.JOB))
+        asyncio.run(transcode._set_item_streams({}, URL, {"status": "failed"}))
+
+        (item,) = _items("c1")
+        assert "hls_url" not in item
+        assert "poster_url" not in item
+
+    def test_limited_to_query(self, mongo):
+        asyncio.run(db.courses.insert_one(_course("c1", [URL])))
+        asyncio.run(db.courses.insert_one(_course("c2", [URL])))
+        asyncio.run(transcode._set_item_streams({"id": "c2"}, URL, self.JOB))
+
+        assert "hls_url" not in _items("c1")[0]
+        assert _items("c2")[0]["hls_url"] == self.JOB["manifest_url"]
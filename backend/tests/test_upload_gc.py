@@ -0,0 +1,164 @@
+"""Orphaned-upload collector tests, on a temporary upload directory"""
+
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.db.session import db
+from app.services import upload_gc
+from app.services.transcode import hls_prefix
+from app.services.upload_gc import collect_orphans
+
+DAY = 24 * 60 * 60
+
+
+def _write(storage, key: str, age: float = 2 * DAY):
+    path = storage.upload_dir / key
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"data")
+    modified = time.time() - age
+    os.utime(path, (modified, modified))
+
+
+def _insert(collection: str, doc: dict):
+    asyncio.run(db.db[collection].insert_one(doc))
+
+
+def _collect(storage, dry_run: bool, grace_hours: float = 24) -> dict:
+    return asyncio.run(collect_orphans(storage, grace_hours, dry_run=dry_run))
+
+
+@pytest.fixture
+def uploads(local_storage):
+    """A course video with its HLS renditions, a submission and orphans"""
+    storage = local_storage
+    _write(storage, "videos/intro.mp4")
+    _write(storage, f"{hls_prefix('videos/intro.mp4')}/720p/index.m3u8")
+    _write(storage, "images/thumb.png")
+    _write(storage, "assignments/essay.pdf")
+    _write(storage, "images/orphan.png")
+    _write(storage, "documents/orphan.pdf")
+    _write(storage, "assignments/replaced.pdf")
+    _write(storage, "images/fresh.png", age=60)
+    _write(storage, ".partial/session-1")
+    _write(storage, "videos/.hidden.mp4")
+
+    _insert(
+        "courses",
+        {
+            "thumbnail_url": "/uploads/images/thumb.png",
+            "modules": [{"items": [{"url": "/uploads/videos/intro.mp4"}]}],
+        },
+    )
+    _insert("submissions", {"file_url": "/uploads/assignments/essay.pdf"})
+    _insert("video_transcodes", {"_id": "/uploads/videos/intro.mp4"})
+    return storage
+
+
+ORPHANS = [
+    "/uploads/assignments/replaced.pdf",
+    "/uploads/documents/orphan.pdf",
+    "/uploads/images/orphan.png",
+]
+
+
+class TestCollectOrphans:
+    def test_dry_run(self, uploads, stored_keys):
+        before = stored_keys(uploads)
+        report = _collect(uploads, dry_run=True)
+
+        assert report["dry_run"] is True
+        assert report["backend"] == "local"
+        assert report["scanned"] == 8
+        assert report["orphans"] == 3
+        assert report["orphan_bytes"] == 12
+        assert report["deleted"] == 0
+        assert sorted(report["sample"]) == ORPHANS
+        assert stored_keys(uploads) == before
+
+    def test_delete(self, uploads, stored_keys):
+        report = _collect(uploads, dry_run=False)
+
+        assert report["deleted"] == 3
+        assert report["failed"] == 0
+        remaining = stored_keys(uploads)
+        for url in ORPHANS:
+            assert uploads.url_key(url) not in remaining
+        assert "videos/intro.mp4" in remaining
+        assert f"{hls_prefix('videos/intro.mp4')}/720p/index.m3u8" in remaining
+        assert "images/fresh.png" in remaining
+        # Dotted paths belong to upload sessions
+        assert (uploads.upload_dir / ".partial" / "session-1").exists()
+        assert (uploads.upload_dir / "videos" / ".hidden.mp4").exists()
+
+        assert _collect(uploads, dry_run=False)["orphans"] == 0
+
+    def test_grace_period(self, uploads):
+        report = _collect(uploads, dry_run=True, grace_hours=72)
+        assert report["orphans"] == 0
+
+    def test_in_flight_uploads(self, uploads):
+        """Files of unfinished sessions and intents are kept"""
+        _insert("upload_sessions", {"key": "images/orphan.png"})
+        _insert("upload_intents", {"result": {"url": "/uploads/documents/orphan.pdf"}})
+        report = _collect(uploads, dry_run=True)
+        assert report["sample"] == ["/uploads/assignments/replaced.pdf"]
+
+    def test_recently_deduplicated_blob(self, uploads):
+        """A blob referenced within the grace period may not be saved yet"""
+        now = datetime.now(timezone.utc)
+        _insert("blobs", {"_id": "images/orphan.png", "referenced_at": now})
+        _insert(
+            "blobs",
+            {"_id": "documents/orphan.pdf", "referenced_at": now - timedelta(days=2)},
+        )
+        report = _collect(uploads, dry_run=False)
+
+        assert report["deleted"] == 2
+        assert (uploads.upload_dir / "images" / "orphan.png").exists()
+        blobs = asyncio.run(db.blobs.find({}, {"_id": 1}).to_list(None))
+        assert blobs == [{"_id": "images/orphan.png"}]
+
+    def test_deduplicated_during_collection(self, uploads, monkeypatch):
+        """A blob touched after its references were read keeps its file"""
+        old = datetime.now(timezone.utc) - timedelta(days=2)
+        _insert("blobs", {"_id": "images/orphan.png", "referenced_at": old})
+        _insert("blobs", {"_id": "documents/orphan.pdf", "referenced_at": old})
+        referenced_urls = upload_gc.referenced_urls
+
+        async def then_deduplicate(*args):
+            urls = await referenced_urls(*args)
+            await db.blobs.update_one(
+                {"_id": "images/orphan.png"},
+                {"$set": {"referenced_at": datetime.now(timezone.utc)}},
+            )
+            return urls
+
+        monkeypatch.setattr(upload_gc, "referenced_urls", then_deduplicate)
+        report = _collect(uploads, dry_run=False)
+
+        assert report["orphans"] == 3
+        assert report["deleted"] == 2
+        assert (uploads.upload_dir / "images" / "orphan.png").exists()
+        assert not (uploads.upload_dir / "documents" / "orphan.pdf").exists()
+        blobs = asyncio.run(db.blobs.find({}, {"_id": 1}).to_list(None))
+        assert blobs == [{"_id": "images/orphan.png"}]
+
+    def test_s3(self, s3_storage, stored_keys):
+        """Objects in the bucket are matched by their S3 URL"""
+        s3_storage.write_object("images/kept.png", b"data", "image/png")
+        s3_storage.write_object("images/orphan.png", b"data", "image/png")
+        s3_storage.write_object("other/unrelated.txt", b"data", "text/plain")
+        # A local file with the same key as a referenced object is not kept
+        _write(s3_storage, "images/kept.png")
+        _insert("courses", {"thumbnail_url": s3_storage.key_url("images/kept.png")})
+
+        report = _collect(s3_storage, dry_run=False, grace_hours=0)
+
+        assert report["backend"] == "s3"
+        assert report["deleted"] == 2
+        assert stored_keys(s3_storage) == ["images/kept.png", "other/unrelated.txt"]
+        assert not (s3_storage.upload_dir / "images" / "kept.png").exists()
@@ -0,0 +1,167 @@
+"""Direct-to-S3 upload intent tests, against moto"""
+
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import requests
+from fastapi import HTTPException
+
+from app.db.session import db
+from app.services import upload_intents
+from app.services.upload_intents import complete_intent, create_intent
+
+USER = {"id": "user-1"}
+DATA = bytes(range(256)) * 100
+
+
+def _create(storage, size=len(DATA), content_type="image/png", sha256=None) -> dict:
+    return asyncio.run(
+        create_intent(storage, USER, "image", "logo.png", content_type, size, sha256)
+    )
+
+
+def _complete(storage, intent_id: str, user=USER) -> dict:
+    return asyncio.run(complete_intent(storage, user, intent_id))
+
+
+def _status(intent_id: str) -> str:
+    intent = asyncio.run(db.upload_intents.find_one({"id": intent_id}))
+    return intent["status"]
+
+
+def _post(intent: dict, data: bytes = DATA) -> requests.Response:
+    post = intent["post"]
+    return requests.post(
+        post["url"], data=post["fields"], files={"file": ("logo.png", data)}
+    )
+
+
+def _put(intent: dict, data: bytes = DATA) -> requests.Response:
+    put = intent["put"]
+    return requests.put(put["url"], data=data, headers=put["headers"])
+
+
+class TestCreateIntent:
+    def test_local_storage_falls_back(self, local_storage):
+        """Without a bucket the client is sent to the upload endpoint"""
+        intent = _create(local_storage)
+        assert intent == {"mode": "local", "method": "POST", "url": "/api/upload/image"}
+
+    def test_presigned_targets(self, s3_storage):
+        intent = _create(s3_storage)
+        assert intent["mode"] == "s3"
+        assert intent["key"].startswith("images/")
+        assert intent["post"]["fields"]["Content-Type"] == "image/png"
+        assert intent["put"]["headers"] == {"Content-Type": "image/png"}
+        assert _status(intent["id"]) == "pending"
+
+    def test_rejects_too_large(self, s3_storage):
+        with pytest.raises(HTTPException) as e:
+            _create(s3_storage, size=11 * 1024 * 1024)
+        assert e.value.status_code == 413
+
+
+class TestCompleteIntent:
+    """complete() checks the uploaded object with a HEAD request"""
+
+    def test_not_uploaded_yet(self, s3_storage):
+        intent = _create(s3_storage)
+        with pytest.raises(HTTPException) as e:
+            _complete(s3_storage, intent["id"])
+        assert e.value.status_code == 409
+        assert e.value.detail == "File has not been uploaded"
+        # Still pending, so the client can upload and try again
+        assert _status(intent["id"]) == "pending"
+
+        assert _post(intent).status_code == 204
+        assert _complete(s3_storage, intent["id"])["size"] == len(DATA)
+
+    def test_post_upload(self, s3_storage):
+        intent = _create(s3_storage)
+        assert _post(intent).status_code == 204
+
+        result = _complete(s3_storage, intent["id"])
+        assert result["size"] == len(DATA)
+        assert result["type"] == "image/png"
+        assert s3_storage.read_object(s3_storage.url_key(result["url"])) == DATA
+        assert _status(intent["id"]) == "complete"
+        # Completing again returns the first result
+        assert _complete(s3_storage, intent["id"]) == result
+
+    def test_put_upload_with_checksum(self, s3_storage, stored_keys):
+        """A declared SHA-256 makes the upload content-addressed"""
+        digest = hashlib.sha256(DATA).hexdigest()
+        intent = _create(s3_storage, sha256=digest)
+        assert _put(intent).status_code == 200
+
+        result = _complete(s3_storage, intent["id"])
+        assert result["url"].endswith(f"images/{digest}.png")
+        assert stored_keys(s3_storage) == [f"images/{digest}.png"]
+
+        # The same bytes declared again need no upload at all
+        again = _create(s3_storage, sha256=digest)
+        assert again["mode"] == "complete"
+        assert again["result"]["url"] == result["url"]
+
+    def test_wrong_size_is_deleted(self, s3_storage, stored_keys):
+        intent = _create(s3_storage)
+        assert _put(intent, DATA + b"extra").status_code == 200
+
+        with pytest.raises(HTTPException) as e:
+            _complete(s3_storage, intent["id"])
+        assert e.value.status_code == 400
+        assert e.value.detail == f"Uploaded {len(DATA) + 5} bytes, expected {len(DATA)}"
+        assert stored_keys(s3_storage) == []
+        assert _status(intent["id"]) == "rejected"
+
+        # A rejected intent stays rejected
+        with pytest.raises(HTTPException) as e:
+            _complete(s3_storage, intent["id"])
+        assert e.value.status_code == 400
+
+    def test_wrong_type_is_deleted(self, s3_storage, stored_keys):
+        intent = _create(s3_storage)
+        # The presigned PUT is signed for image/png; write the object directly
+        s3_storage.write_object(intent["key"], DATA, "image/gif")
+
+        with pytest.raises(HTTPException) as e:
+            _complete(s3_storage, intent["id"])
+        assert e.value.status_code == 400
+        assert e.value.detail == "Uploaded type image/gif, expected image/png"
+        assert stored_keys(s3_storage) == []
+
+    def _completing(self, intent: dict, age: timedelta):
+        claimed_at = datetime.now(timezone.utc) - age
+        asyncio.run(
+            db.upload_intents.update_one(
+                {"id": intent["id"]},
+                {"$set": {"status": "completing", "claimed_at": claimed_at}},
+            )
+        )
+
+    def test_already_completing(self, s3_storage):
+        """Only one request registers the object"""
+        intent = _create(s3_storage)
+        assert _post(intent).status_code == 204
+        self._completing(intent, timedelta(0))
+        with pytest.raises(HTTPException) as e:
+            _complete(s3_storage, intent["id"])
+        assert e.value.status_code == 409
+        assert e.value.detail == "Upload is already completing"
+
+    def test_abandoned_completion(self, s3_storage):
+        """A completion whose worker died is taken over after the lease"""
+        intent = _create(s3_storage)
+        assert _post(intent).status_code == 204
+        self._completing(intent, upload_intents.COMPLETE_LEASE + timedelta(seconds=1))
+        result = _complete(s3_storage, intent["id"])
+        assert result["size"] == len(DATA)
+        assert _status(intent["id"]) == "complete"
+
+    def test_other_users_intent(self, s3_storage):
+        intent = _create(s3_storage)
+        with pytest.raises(HTTPException) as e:
+            _complete(s3_storage, intent["id"], user={"id": "user-2"})
+        assert e.value.status_code == 404
@@ -0,0 +1,202 @@
+"""Resumable upload session tests, on local disk and on S3 (moto)"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.services import upload_sessions
+
+USER = {"id": "user-1"}
+
+
+async def _body(data: bytes, size: int = 64 * 1024):
+    for start in range(0, len(data), size):
+        end = start + size
+        yield data[start:end]
+
+
+def _video(chunks: float) -> bytes:
+    size = int(upload_sessions._chunk_size() * chunks)
+    return bytes(range(256)) * (size // 256) + bytes(size % 256)
+
+
+def _create(storage, data: bytes) -> dict:
+    return asyncio.run(
+        upload_sessions.create_session(
+            storage, USER, "video", "clip.mp4", "video/mp4", len(data)
+        )
+    )
+
+
+def _write(storage, session_id: str, offset: int, data: bytes) -> dict:
+    async def run():
+        session = await upload_sessions.get_session(session_id, USER)
+        return await upload_sessions.write_chunk(storage, session, offset, _body(data))
+
+    return asyncio.run(run())
+
+
+def _complete(storage, session_id: str) -> dict:
+    async def run():
+        return await upload_sessions.complete_session(
+            storage, await upload_sessions.get_session(session_id, USER)
+        )
+
+    return asyncio.run(run())
+
+
+def _upload(storage, session_id: str, data: bytes, chunk_size: int):
+    for offset in range(0, len(data), chunk_size):
+        end = offset + chunk_size
+        _write(storage, session_id, offset, data[offset:end])
+
+
+class TestSessionCreate:
+    def test_rejects_wrong_type(self, storage):
+        with pytest.raises(HTTPException) as e:
+            asyncio.run(
+                upload_sessions.create_session(
+                    storage, USER, "video", "a.gif", "image/gif", 10
+                )
+            )
+        assert e.value.status_code == 400
+
+    def test_rejects_too_large(self, storage):
+        with pytest.raises(HTTPException) as e:
+            asyncio.run(
+                upload_sessions.create_session(
+                    storage, USER, "image", "a.png", "image/png", 11 * 1024 * 1024
+                )
+            )
+        assert e.value.status_code == 413
+
+    def test_other_users_session(self, storage):
+        status = _create(storage, bytes(10))
+        with pytest.raises(HTTPException) as e:
+            asyncio.run(upload_sessions.get_session(status["id"], {"id": "user-2"}))
+        assert e.value.status_code == 404
+
+
+class TestSessionChunks:
+    """Chunks are accepted in order, at exactly the chunk size"""
+
+    def test_upload_and_complete(self, storage, stored_keys):
+        data = _video(2.5)
+        status = _create(storage, data)
+        assert status["offset"] == 0
+
+        _upload(storage, status["id"], data, status["chunk_size"])
+        session = asyncio.run(upload_sessions.get_session(status["id"], USER))
+        assert session["received"] == len(data)
+
+        result = _complete(storage, status["id"])
+        assert result["size"] == len(data)
+        assert result["original_name"] == "clip.mp4"
+        assert stored_keys(storage) == [storage.url_key(result["url"])]
+        assert storage.read_object(storage.url_key(result["url"])) == data
+
+        # Completing again returns the first result
+        assert _complete(storage, status["id"]) == result
+
+    def test_out_of_order_chunk(self, storage):
+        data = _video(2.5)
+        status = _create(storage, data)
+        chunk_size = status["chunk_size"]
+
+        with pytest.raises(HTTPException) as e:
+            chunk = data[chunk_size:][:chunk_size]
+            _write(storage, status["id"], chunk_size, chunk)
+        assert e.value.status_code == 409
+        assert e.value.detail == f"Expected offset 0, got {chunk_size}"
+
+    def test_wrong_chunk_size(self, storage):
+        data = _video(1.5)
+        status = _create(storage, data)
+
+        with pytest.raises(HTTPException) as e:
+            _write(storage, status["id"], 0, data[:1000])
+        assert e.value.status_code == 400
+
+        with pytest.raises(HTTPException) as e:
+            _write(storage, status["id"], 0, data)
+        assert e.value.status_code == 413
+
+        session = asyncio.run(upload_sessions.get_session(status["id"], USER))
+        assert session["received"] == 0
+        assert session["writing"] is None
+
+    def test_stale_chunk_is_rejected(self, storage):
+        """
+        A replayed chunk that passed the offset check against an old copy
+        of the session must not overwrite bytes that were already accepted
+        """
+        data = _video(1.5)
+        status = _create(storage, data)
+        chunk_size = status["chunk_size"]
+        stale = asyncio.run(upload_sessions.get_session(status["id"], USER))
+
+        _write(storage, status["id"], 0, data[:chunk_size])
+        with pytest.raises(HTTPException) as e:
+            asyncio.run(
+                upload_sessions.write_chunk(storage, stale, 0, _body(bytes(chunk_size)))
+            )
+        assert e.value.status_code == 409
+        assert e.value.detail == "Chunk already received or being written"
+
+        _write(storage, status["id"], chunk_size, data[chunk_size:])
+        result = _complete(storage, status["id"])
+        assert storage.read_object(storage.url_key(result["url"])) == data
+
+    def test_chunk_during_completion(self, storage):
+        data = _video(0.5)
+        status = _create(storage, data)
+        _write(storage, status["id"], 0, data)
+        _complete(storage, status["id"])
+
+        with pytest.raises(HTTPException) as e:
+            _write(storage, status["id"], len(data), b"x")
+        assert e.value.status_code == 409
+
+    def test_complete_before_all_bytes(self, storage):
+        data = _video(1.5)
+        status = _create(storage, data)
+        _write(storage, status["id"], 0, data[: status["chunk_size"]])
+
+        with pytest.raises(HTTPException) as e:
+            _complete(storage, status["id"])
+        assert e.value.status_code == 409
+        assert e.value.detail.startswith("Upload incomplete")
+
+    def test_abort(self, storage, stored_keys):
+        data = _video(1.5)
+        status = _create(storage, data)
+        _write(storage, status["id"], 0, data[: status["chunk_size"]])
+
+        asyncio.run(
+            upload_sessions.abort_session(
+                storage, asyncio.run(upload_sessions.get_session(status["id"], USER))
+            )
+        )
+        assert stored_keys(storage) == []
+        if storage.s3_client:
+            uploads = storage.s3_client.list_multipart_uploads(
+                Bucket=storage.bucket_name
+            )
+            assert uploads.get("Uploads", []) == []
+        else:
+            assert list((storage.upload_dir / ".partial").iterdir()) == []
+        with pytest.raises(HTTPException) as e:
+            asyncio.run(upload_sessions.get_session(status["id"], USER))
+        assert e.value.status_code == 404
+
+    def test_s3_part_checksums(self, s3_storage):
+        """Every part's checksum is kept for the completed object"""
+        data = _video(1.5)
+        status = _create(s3_storage, data)
+        _upload(s3_storage, status["id"], data, status["chunk_size"])
+
+        session = asyncio.run(upload_sessions.get_session(status["id"], USER))
+        assert sorted(session["part_checksums"]) == ["1", "2"]
+        result = _complete(s3_storage, status["id"])
+        assert s3_storage.hash_object(s3_storage.url_key(result["url"]))
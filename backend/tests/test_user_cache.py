@@ -0,0 +1,174 @@
+"""
+Per-worker principal cache: what may be served from it, and what views
+must read from MongoDB because another worker may have changed it
+"""
+
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from app.core import security
+from app.core.cache import TTLCache
+from app.db.session import db
+
+USER_ID = "learner-1"
+
+
+@pytest.fixture
+def users(mongo, monkeypatch):
+    """A learner, a course and a lab, with an empty principal cache"""
+    monkeypatch.setattr(security, "user_cache", TTLCache(maxsize=10, ttl=300))
+    # server.py binds its own handle to the database at import time
+    monkeypatch.setattr(server, "db", mongo.db)
+    now = datetime.now(timezone.utc)
+    user = {
+        "id": USER_ID,
+        "email": "learner@example.com",
+        "first_name": "Ada",
+        "last_name": "Learner",
+        "role": "learner",
+        "password_hash": "x",
+        "enrolled_courses": [],
+        "completed_labs": [],
+        "created_at": now,
+    }
+    course = {
+        "id": "course-1",
+        "slug": "python",
+        "title": "Python",
+        "is_published": True,
+        "modules": [],
+        "version": 1,
+        "enrolled_count": 0,
+    }
+    lab = {"id": "lab-1", "slug": "docker", "title": "Docker"}
+
+    async def insert():
+        await db.users.insert_one(user)
+        await db.courses.insert_one(course)
+        await db.labs.insert_one(lab)
+
+    asyncio.run(insert())
+    return mongo
+
+
+def _principal() -> dict:
+    return asyncio.run(security.load_user(USER_ID))
+
+
+def _elsewhere(update: dict):
+    """A write made by another worker: this worker's cache is not cleared"""
+    asyncio.run(db.users.update_one({"id": USER_ID}, update))
+
+
+class TestLoadUser:
+    def test_served_from_cache(self, users):
+        assert _principal()["role"] == "learner"
+        _elsewhere({"$set": {"role": "trainer"}})
+        assert _principal()["role"] == "learner"
+
+        security.invalidate_user(USER_ID)
+        assert _principal()["role"] == "trainer"
+
+    def test_copies(self, users):
+        """Callers may modify the principal without touching the cache"""
+        _principal()["role"] = "admin"
+        assert _principal()["role"] == "learner"
+
+    def test_missing_user(self, users):
+        assert asyncio.run(security.load_user("nobody")) is None
+
+
+class TestMemberships:
+    def test_is_enrolled_confirms_a_miss(self, users):
+        user = _principal()
+        assert not asyncio.run(security.is_enrolled(user, "course-1"))
+        _elsewhere({"$push": {"enrolled_courses": "course-1"}})
+        assert asyncio.run(security.is_enrolled(_principal(), "course-1"))
+
+    def test_load_memberships_is_fresh(self, users):
+        _principal()
+        _elsewhere(
+            {"$push": {"enrolled_courses": "course-1", "completed_labs": "lab-1"}}
+        )
+        assert asyncio.run(security.load_memberships(USER_ID)) == {
+            "enrolled_courses": ["course-1"],
+            "completed_labs": ["lab-1"],
+        }
+        assert asyncio.run(security.load_memberships("nobody")) == {
+            "enrolled_courses": [],
+            "completed_labs": [],
+        }
+
+
+class TestServerViews:
+    """Enrolled on another worker: every view here must already show it"""
+
+    @pytest.fixture
+    def enrolled_elsewhere(self, users):
+        user = _principal()
+        _elsewhere(
+            {"$push": {"enrolled_courses": "course-1", "completed_labs": "lab-1"}}
+        )
+        return user
+
+    def test_course_page(self, enrolled_elsewhere):
+        course = asyncio.run(server.get_course_by_slug("python", enrolled_elsewhere))
+        assert course["is_enrolled"] is True
+
+    def test_course_outline(self, enrolled_elsewhere, monkeypatch):
+        async def outline(query):
+            # mongomock cannot evaluate the outline's $size projection
+            return await db.courses.find_one(query, {"_id": 0})
+
+        monkeypatch.setattr(server, "get_course_outline", outline)
+        course = asyncio.run(
+            server.get_course_outline_by_slug("python", enrolled_elsewhere)
+        )
+        assert course["is_enrolled"] is True
+
+    def test_my_courses(self, enrolled_elsewhere):
+        courses = asyncio.run(server.get_my_courses(enrolled_elsewhere))
+        assert [course["id"] for course in courses] == ["course-1"]
+
+    def test_lab_page(self, enrolled_elsewhere):
+        lab = asyncio.run(server.get_lab_by_slug("docker", enrolled_elsewhere))
+        assert lab["is_completed"] is True
+
+    def test_me(self, enrolled_elsewhere):
+        me = asyncio.run(server.get_me(enrolled_elsewhere))
+        assert me["enrolled_courses"] == ["course-1"]
+        assert me["completed_labs"] == ["lab-1"]
+
+    def test_anonymous(self, users):
+        course = asyncio.run(server.get_course_by_slug("python", None))
+        assert course["is_enrolled"] is False
+
+
+class TestEnroll:
+    def _enroll(self, user: dict) -> dict:
+        request = server.EnrollRequest(course_id="course-1")
+        return asyncio.run(server.enroll_in_course(request, user))
+
+    def test_enroll_once(self, users):
+        user = _principal()
+        assert self._enroll(user)["course_id"] == "course-1"
+        with pytest.raises(HTTPException) as e:
+            # The stale principal still lists no enrollments
+            self._enroll(user)
+        assert e.value.status_code == 400
+
+        stored = asyncio.run(db.users.find_one({"id": USER_ID}))
+        assert stored["enrolled_courses"] == ["course-1"]
+        course = asyncio.run(db.courses.find_one({"id": "course-1"}))
+        assert course["enrolled_count"] == 1
+        progress = asyncio.run(db.course_progress.count_documents({}))
+        assert progress == 1
+
+    def test_enroll_invalidates_this_worker(self, users):
+        user = _principal()
+        self._enroll(user)
+        assert _principal()["enrolled_courses"] == ["course-1"]
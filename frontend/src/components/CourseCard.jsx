@@ -3,6 +3,7 @@ import { Link } from 'react-router-dom';
 import { Card, CardContent } from '@/components/ui/card';
 import { Badge } from '@/components/ui/badge';
 import { Clock, Users, BookOpen, ArrowRight } from 'lucide-react';
+import ResponsiveImage from '@/components/ResponsiveImage';
 
 const CourseCard = ({ course }) => {
   const getLevelColor = (level) => {
@@ -22,8 +23,10 @@ const CourseCard = ({ course }) => {
     <Link to={`/courses/${course.slug}`} data-testid={`course-card-${course.slug}`}>
       <Card className="group h-full overflow-hidden bg-white border border-slate-100 shadow-sm hover:shadow-xl hover:border-primary/20 transition-all duration-300 hover:-translate-y-1">
         <div className="relative overflow-hidden">
-          <img
+          <ResponsiveImage
             src={course.thumbnail_url}
+            derivatives={course.thumbnail_derivatives}
+            sizes="(min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw"
             alt={course.title}
             className="w-full h-48 object-cover transition-transform duration-500 group-hover:scale-105"
           />
@@ -54,7 +57,7 @@ const CourseCard = ({ course }) => {
               </span>
               <span className="flex items-center gap-1">
                 <BookOpen className="w-3.5 h-3.5" />
-                {course.modules?.length || 0} modules
+                {course.module_count ?? course.modules?.length ?? 0} modules
               </span>
               <span className="flex items-center gap-1">
                 <Users className="w-3.5 h-3.5" />
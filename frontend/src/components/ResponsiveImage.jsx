@@ -0,0 +1,27 @@
+import React from 'react';
+
+// Serves the resized AVIF/WebP renditions the API lists for an uploaded
+// image, falling back to the original for browsers (or images) without them.
+const srcSet = (derivatives, format) =>
+  derivatives
+    .filter((d) => d.format === format)
+    .map((d) => `${d.url} ${d.width}w`)
+    .join(', ');
+
+const ResponsiveImage = ({ src, derivatives, sizes, alt, className }) => {
+  if (!derivatives || derivatives.length === 0) {
+    return <img src={src} alt={alt} className={className} loading="lazy" />;
+  }
+
+  return (
+    <picture>
+      {['avif', 'webp'].map((format) => {
+        const set = srcSet(derivatives, format);
+        return set ? <source key={format} type={`image/${format}`} srcSet={set} sizes={sizes} /> : null;
+      })}
+      <img src={src} alt={alt} className={className} loading="lazy" />
+    </picture>
+  );
+};
+
+export default ResponsiveImage;
@@ -0,0 +1,27 @@
+import React from 'react';
+
+// Plays an uploaded video. Transcoded videos carry an HLS manifest, streamed
+// at the bitrate the connection allows where the browser plays HLS natively
+// (Safari, iOS, Android); elsewhere the original upload is played.
+const canPlayHls = () =>
+  typeof document !== 'undefined' &&
+  document.createElement('video').canPlayType('application/vnd.apple.mpegurl') !== '';
+
+const VideoPlayer = ({ src, hlsSrc, poster, title, className }) => {
+  const source = hlsSrc && canPlayHls() ? hlsSrc : src;
+
+  return (
+    <video
+      key={source}
+      src={source}
+      poster={poster || undefined}
+      title={title}
+      className={className}
+      controls
+      playsInline
+      preload="metadata"
+    />
+  );
+};
+
+export default VideoPlayer;
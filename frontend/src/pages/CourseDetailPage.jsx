@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useParams, useNavigate, Link } from 'react-router-dom';
 import { useAuth } from '@/context/AuthContext';
-import { getCourseBySlug, enrollInCourse } from '@/services/api';
+import { getCourseOutline, getCourseModule, enrollInCourse } from '@/services/api';
 import { Button } from '@/components/ui/button';
 import { Badge } from '@/components/ui/badge';
 import { Card, CardContent } from '@/components/ui/card';
@@ -20,11 +20,13 @@ const CourseDetailPage = () => {
   const [course, setCourse] = useState(null);
   const [loading, setLoading] = useState(true);
   const [enrolling, setEnrolling] = useState(false);
+  // Module items are loaded when a module is first expanded
+  const [moduleItems, setModuleItems] = useState({});
 
   useEffect(() => {
     const fetchCourse = async () => {
       try {
-        const data = await getCourseBySlug(slug);
+        const data = await getCourseOutline(slug);
         setCourse(data);
       } catch (error) {
         console.error('Failed to fetch course:', error);
@@ -38,6 +40,17 @@ const CourseDetailPage = () => {
     fetchCourse();
   }, [slug, navigate]);
 
+  const loadModuleItems = async (module) => {
+    if (!module || moduleItems[module.id] !== undefined) return;
+    try {
+      const data = await getCourseModule(course.id, module.id);
+      setModuleItems(prev => ({ ...prev, [module.id]: data.items || [] }));
+    } catch (error) {
+      console.error('Failed to fetch module:', error);
+      setModuleItems(prev => ({ ...prev, [module.id]: [] }));
+    }
+  };
+
   const handleEnroll = async () => {
     if (!isAuthenticated) {
       navigate(`/login?redirect=${encodeURIComponent(location.pathname)}`);
@@ -134,7 +147,7 @@ const CourseDetailPage = () => {
                 </span>
                 <span className="flex items-center gap-2">
                   <BookOpen className="w-5 h-5" />
-                  {course.modules?.length || 0} modules
+                  {course.module_count ?? course.modules?.length ?? 0} modules
                 </span>
                 <span className="flex items-center gap-2">
                   <Users className="w-5 h-5" />
@@ -227,7 +240,12 @@ const CourseDetailPage = () => {
             {course.modules?.length > 0 && (
               <section>
                 <h2 className="font-heading font-semibold text-2xl mb-6">Course Syllabus</h2>
-                <Accordion type="single" collapsible className="space-y-3">
+                <Accordion
+                  type="single"
+                  collapsible
+                  className="space-y-3"
+                  onValueChange={(value) => value && loadModuleItems(course.modules[Number(value.split('-')[1])])}
+                >
                   {course.modules.map((module, index) => (
                     <AccordionItem
                       key={index}
@@ -251,7 +269,12 @@ const CourseDetailPage = () => {
                       <AccordionContent className="pb-4">
                         <div className="space-y-2">
                           <p className="px-6 text-sm text-muted-foreground mb-3">{module.description}</p>
-                          {module.items?.map((item, itemIndex) => (
+                          {moduleItems[module.id] === undefined && module.item_count > 0 && (
+                            <div className="flex justify-center py-2">
+                              <Loader2 className="w-4 h-4 animate-spin text-muted-foreground" />
+                            </div>
+                          )}
+                          {moduleItems[module.id]?.map((item, itemIndex) => (
                             <div
                               key={itemIndex}
                               className="flex items-center gap-3 px-6 py-2 hover:bg-slate-50 transition-colors cursor-pointer"
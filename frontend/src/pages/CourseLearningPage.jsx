@@ -14,6 +14,7 @@ import { RadioGroup, RadioGroupItem } from '@/components/ui/radio-group';
 import { Label } from '@/components/ui/label';
 import { Input } from '@/components/ui/input';
 import { Textarea } from '@/components/ui/textarea';
+import VideoPlayer from '@/components/VideoPlayer';
 import {
   Dialog,
   DialogContent,
@@ -349,7 +350,17 @@ const CourseLearningPage = () => {
                     </CardHeader>
                     <CardContent className="space-y-6">
                       {/* Content Player */}
-                      {selectedItem.type === 'video' && selectedItem.url ? (
+                      {selectedItem.type === 'video' && selectedItem.hls_url ? (
+                        <div className="aspect-video bg-slate-900 rounded-lg overflow-hidden">
+                          <VideoPlayer
+                            src={selectedItem.url}
+                            hlsSrc={selectedItem.hls_url}
+                            poster={selectedItem.poster_url}
+                            title={selectedItem.title}
+                            className="w-full h-full"
+                          />
+                        </div>
+                      ) : selectedItem.type === 'video' && selectedItem.url ? (
                         <div className="aspect-video bg-slate-900 rounded-lg overflow-hidden">
                           <iframe
                             src={selectedItem.url} // Using iframe for embed URL, or video tag if direct file
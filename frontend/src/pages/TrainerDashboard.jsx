@@ -3,6 +3,7 @@ import { useNavigate } from 'react-router-dom';
 import { useAuth } from '@/context/AuthContext';
 import { 
   getTrainerCourses, createTrainerCourse, updateTrainerCourse, deleteTrainerCourse,
+  getCourseBySlug,
   getTrainerLabs, createTrainerLab, updateTrainerLab, deleteTrainerLab,
   getWorkshops, createTrainerWorkshop, deleteTrainerWorkshop,
   uploadImage, uploadVideo
@@ -195,8 +196,15 @@ const TrainerDashboard = () => {
     }
   };
 
-  const openCourseDialog = (course = null) => {
+  const openCourseDialog = async (course = null) => {
     if (course) {
+      // The course list only carries card fields; load modules and tests to edit
+      try {
+        course = await getCourseBySlug(course.slug);
+      } catch (error) {
+        toast.error('Failed to load course');
+        return;
+      }
       setEditingCourse(course);
       setCourseForm({
         title: course.title, slug: course.slug, description: course.description,
@@ -511,10 +519,10 @@ const TrainerDashboard = () => {
                             </div>
                           </TableCell>
                           <TableCell>
-                            <Badge variant="outline">{course.modules?.length || 0} modules</Badge>
+                            <Badge variant="outline">{course.module_count ?? course.modules?.length ?? 0} modules</Badge>
                           </TableCell>
                           <TableCell>
-                            <Badge variant="outline">{course.tests?.length || 0} questions</Badge>
+                            <Badge variant="outline">{course.test_count ?? course.tests?.length ?? 0} questions</Badge>
                           </TableCell>
                           <TableCell>
                             <Badge variant={course.is_published ? 'default' : 'secondary'}>
@@ -12,6 +12,7 @@ import {
     Play, CheckCircle2, Loader2, ExternalLink
 } from 'lucide-react';
 import SEOHead from '@/components/SEOHead';
+import ResponsiveImage from '@/components/ResponsiveImage';
 
 const WorkshopsPage = () => {
     const navigate = useNavigate();
@@ -163,8 +164,10 @@ const WorkshopCard = ({ workshop, isUpcoming, onRegister, registering, isAuthent
         <Card className="overflow-hidden hover:shadow-lg transition-shadow duration-300 flex flex-col">
             {workshop.image_url && (
                 <div className="aspect-video overflow-hidden">
-                    <img
+                    <ResponsiveImage
                         src={workshop.image_url}
+                        derivatives={workshop.image_derivatives}
+                        sizes="(min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw"
                         alt={workshop.title}
                         className="w-full h-full object-cover transition-transform duration-300 hover:scale-105"
                     />
@@ -81,6 +81,21 @@ export const getCourseBySlug = async (slug) => {
   return response.data;
 };
 
+// Course page data with module summaries (titles, item counts, durations)
+export const getCourseOutline = async (slug) => {
+  const response = await axios.get(`${API_URL}/courses/${slug}/outline`, {
+    headers: getAuthHeader()
+  });
+  return response.data;
+};
+
+export const getCourseModule = async (courseId, moduleId) => {
+  const response = await axios.get(`${API_URL}/courses/${courseId}/modules/${moduleId}`, {
+    headers: getAuthHeader()
+  });
+  return response.data;
+};
+
 export const enrollInCourse = async (courseId) => {
   const response = await axios.post(
     `${API_URL}/courses/enroll`,
@@ -259,22 +274,95 @@ export const uploadImage = async (file, onProgress) => {
   return response.data;
 };
 
-export const uploadVideo = async (file, onProgress) => {
+// Videos go through a resumable upload session: the file is sent in
+// chunk_size pieces, and a failed chunk is retried from the offset the
+// server reports instead of restarting the whole file.
+const CHUNK_RETRIES = 5;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Files the server already stores (same SHA-256) complete without being
+// sent again. Hashing reads the whole file into memory, so big files skip it.
+const HASH_MAX_BYTES = 200 * 1024 * 1024;
+
+const sha256Hex = async (file) => {
+  if (!window.crypto?.subtle || file.size > HASH_MAX_BYTES) return undefined;
+  const digest = await window.crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+  return Array.from(new Uint8Array(digest), (b) => b.toString(16).padStart(2, '0')).join('');
+};
+
+// With S3 configured the file goes straight to the bucket through a
+// presigned POST and the API only checks and registers it afterwards;
+// returns null when the server stores uploads locally.
+const uploadDirect = async (kind, file, onProgress, sha256) => {
+  const headers = getAuthHeader();
+  const { data: intent } = await axios.post(`${API_URL}/upload/intents`, {
+    kind,
+    filename: file.name,
+    content_type: file.type,
+    size: file.size,
+    sha256
+  }, { headers });
+  if (intent.mode === 'complete') return intent.result;
+  if (intent.mode !== 's3') return null;
+
   const formData = new FormData();
+  Object.entries(intent.post.fields).forEach(([name, value]) => formData.append(name, value));
   formData.append('file', file);
-
-  const response = await axios.post(`${API_URL}/upload/video`, formData, {
-    headers: {
-      ...getAuthHeader(),
-      'Content-Type': 'multipart/form-data'
-    },
+  await axios.post(intent.post.url, formData, {
     onUploadProgress: (progressEvent) => {
-      if (onProgress) {
-        const percent = Math.round((progressEvent.loaded * 100) / progressEvent.total);
-        onProgress(percent);
-      }
+      if (onProgress) onProgress(Math.round((progressEvent.loaded * 100) / progressEvent.total));
     }
   });
+  const response = await axios.post(`${API_URL}/upload/intents/${intent.id}/complete`, null, { headers });
+  return response.data;
+};
+
+export const uploadVideo = async (file, onProgress) => {
+  const sha256 = await sha256Hex(file);
+  const direct = await uploadDirect('video', file, onProgress, sha256);
+  if (direct) return direct;
+
+  const headers = getAuthHeader();
+  const { data: session } = await axios.post(`${API_URL}/upload/sessions`, {
+    kind: 'video',
+    filename: file.name,
+    content_type: file.type,
+    size: file.size,
+    sha256
+  }, { headers });
+
+  let offset = session.offset;
+  let failures = 0;
+  while (offset < file.size) {
+    const chunk = file.slice(offset, offset + session.chunk_size);
+    const chunkStart = offset;
+    try {
+      const response = await axios.put(`${API_URL}/upload/sessions/${session.id}`, chunk, {
+        params: { offset },
+        headers: { ...headers, 'Content-Type': 'application/octet-stream' },
+        onUploadProgress: (progressEvent) => {
+          if (onProgress) {
+            onProgress(Math.round(((chunkStart + progressEvent.loaded) * 100) / file.size));
+          }
+        }
+      });
+      offset = response.data.offset;
+      failures = 0;
+    } catch (error) {
+      failures += 1;
+      if (failures > CHUNK_RETRIES || (error.response && error.response.status < 409)) {
+        throw error;
+      }
+      await sleep(1000 * failures);
+      // Resume from wherever the server got to
+      const { data: status } = await axios.get(`${API_URL}/upload/sessions/${session.id}`, { headers });
+      offset = status.offset;
+    }
+  }
+
+  const response = await axios.post(`${API_URL}/upload/sessions/${session.id}/complete`, null, { headers });
+  if (onProgress) onProgress(100);
   return response.data;
 };
 